@@ -0,0 +1,126 @@
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, exists, insert, select
+from database import SessionLocal
+from jobs import in_window, parse_window
+from models.cart import CartItem
+from models.product import Product, ProductArchive
+
+# Configuración del archivador de productos retirados (variables de entorno)
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+# Días que un producto borrado sigue en products antes de archivarlo
+ARCHIVE_RETENTION_DAYS = float(os.getenv("ARCHIVE_RETENTION_DAYS", "7"))
+# Horas de baja actividad (hora local del servidor, "inicio-fin"); vacío = a cualquier hora
+ARCHIVE_WINDOW = os.getenv("ARCHIVE_WINDOW", "2-6")
+# Líneas de carrito borradas por transacción y pausa entre lotes (deja pasar al tráfico)
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_PAUSE_SECONDS = float(os.getenv("ARCHIVE_PAUSE_SECONDS", "0.2"))
+# Productos retirados que se procesan por ronda y cada cuánto se comprueba si hay trabajo
+ARCHIVE_PRODUCTS_PER_RUN = int(os.getenv("ARCHIVE_PRODUCTS_PER_RUN", "50"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "600"))
+
+
+def retired_products(db, cutoff, limit):
+    """Ids de productos borrados antes de cutoff (índice parcial idx_products_deleted_at)"""
+    return list(db.execute(
+        select(Product.id)
+        .where(Product.deleted_at.isnot(None), Product.deleted_at <= cutoff)
+        .order_by(Product.deleted_at, Product.id)
+        .limit(limit)
+    ).scalars())
+
+
+def purge_cart_items(db, product_ids, batch_size):
+    """
+    Borra un lote de líneas de carrito de los productos dados y lo confirma.
+    SKIP LOCKED: las líneas que un usuario está tocando se dejan para el
+    siguiente lote en vez de esperar su bloqueo (y varias réplicas no chocan).
+    """
+    batch = (
+        select(CartItem.id)
+        .where(CartItem.product_id.in_(product_ids))
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    result = db.execute(delete(CartItem).where(CartItem.id.in_(batch.scalar_subquery())))
+    db.commit()
+    return result.rowcount
+
+
+def move_products(db, product_ids):
+    """
+    Mueve a products_archive los productos retirados que ya no tienen líneas
+    de carrito: el DELETE no dispara ningún ON DELETE CASCADE costoso.
+    """
+    products = Product.__table__
+    rows = db.execute(
+        delete(products)
+        .where(
+            products.c.id.in_(product_ids),
+            products.c.deleted_at.isnot(None),
+            ~exists().where(CartItem.product_id == products.c.id),
+        )
+        .returning(
+            products.c.id, products.c.name, products.c.description, products.c.price,
+            products.c.stock, products.c.image_url, products.c.created_at, products.c.deleted_at,
+        )
+    ).mappings().all()
+    if rows:
+        db.execute(insert(ProductArchive), [dict(row) for row in rows])
+    db.commit()
+    return len(rows)
+
+
+def archive_retired(now=None, should_continue=lambda: True, pause=time.sleep):
+    """
+    Una ronda del archivador: para hasta ARCHIVE_PRODUCTS_PER_RUN productos
+    retirados hace más de ARCHIVE_RETENTION_DAYS borra sus líneas de carrito en
+    lotes de ARCHIVE_BATCH_SIZE y después los mueve a products_archive.
+    should_continue se consulta entre lotes (fin de la ventana o apagado).
+    """
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=ARCHIVE_RETENTION_DAYS)
+    totals = {"cart_items": 0, "products": 0}
+    db = SessionLocal()
+    try:
+        product_ids = retired_products(db, cutoff, ARCHIVE_PRODUCTS_PER_RUN)
+        db.commit()
+        while product_ids and should_continue():
+            deleted = purge_cart_items(db, product_ids, ARCHIVE_BATCH_SIZE)
+            totals["cart_items"] += deleted
+            if deleted < ARCHIVE_BATCH_SIZE:
+                # Sin más líneas (o solo bloqueadas): se archiva lo que ya quedó libre
+                totals["products"] += move_products(db, product_ids)
+                break
+            pause(ARCHIVE_PAUSE_SECONDS)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return totals
+
+
+def archive_all(should_continue=lambda: True, pause=time.sleep):
+    """Rondas seguidas mientras se archiven productos y should_continue lo permita"""
+    totals = {"cart_items": 0, "products": 0}
+    while should_continue():
+        result = archive_retired(should_continue=should_continue, pause=pause)
+        totals = {key: totals[key] + result[key] for key in totals}
+        if not result["products"]:
+            break
+    return totals
+
+
+if __name__ == "__main__":
+    # Ejecución manual o desde cron: python archiver.py [--ignore-window]
+    parser = argparse.ArgumentParser(description="Archiva los productos retirados y sus líneas de carrito")
+    parser.add_argument("--ignore-window", action="store_true", help="no esperar a la ventana de baja actividad")
+    args = parser.parse_args()
+    import models.user  # noqa: F401  (Cart se relaciona con User por nombre)
+    window = None if args.ignore_window else parse_window(ARCHIVE_WINDOW)
+    if not in_window(window):
+        parser.exit(0, f"Fuera de la ventana ARCHIVE_WINDOW={ARCHIVE_WINDOW}\n")
+    totals = archive_all(should_continue=lambda: in_window(window))
+    print(f"Líneas de carrito borradas: {totals['cart_items']}, productos archivados: {totals['products']}")
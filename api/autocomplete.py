@@ -0,0 +1,358 @@
+import heapq
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from sqlalchemy import func, select
+from database import SessionLocal
+from models.analytics import CartActivityDaily
+from models.product import Product, active_product
+from textsearch.folding import MAX_KEY_CHARS, name_keys, search_prefix
+
+# Configuración del autocompletado de nombres de producto (variables de entorno)
+AUTOCOMPLETE_ENABLED = os.getenv("AUTOCOMPLETE_ENABLED", "true").lower() == "true"
+# Máximo de sugerencias por consulta (también las que se precalculan por prefijo)
+AUTOCOMPLETE_MAX_RESULTS = int(os.getenv("AUTOCOMPLETE_MAX_RESULTS", "10"))
+# Orden de las sugerencias: "popularity" (unidades añadidas a carritos en los
+# últimos AUTOCOMPLETE_POPULARITY_DAYS días, luego stock) o "stock"
+AUTOCOMPLETE_RANK = os.getenv("AUTOCOMPLETE_RANK", "popularity")
+AUTOCOMPLETE_POPULARITY_DAYS = int(os.getenv("AUTOCOMPLETE_POPULARITY_DAYS", "30"))
+# Prefijos con más claves que esto guardan sus sugerencias precalculadas; el
+# resto se ordena al consultar (como mucho este número de claves)
+AUTOCOMPLETE_SCAN_LIMIT = int(os.getenv("AUTOCOMPLETE_SCAN_LIMIT", "64"))
+# Caracteres indexados por clave (AUTOCOMPLETE_MAX_KEY_CHARS, ver textsearch/folding.py:
+# la webapp filtra el catálogo con el mismo criterio)
+AUTOCOMPLETE_MAX_KEY_CHARS = MAX_KEY_CHARS
+# Reconstrucción completa (popularidad al día y red de seguridad si se pierde un cambio)
+AUTOCOMPLETE_REBUILD_SECONDS = float(os.getenv("AUTOCOMPLETE_REBUILD_SECONDS", "600"))
+
+# Byte que no aparece en UTF-8: clave + HIGH acota el rango de un prefijo
+HIGH = b"\xff"
+
+
+class PackedKeys:
+    """
+    Secuencia ordenada de claves (bytes UTF-8) sin un objeto por clave: todas
+    van seguidas en un buffer y dos arrays guardan dónde empieza y cuánto mide
+    cada una. bisect funciona sobre ella como sobre una lista. El buffer solo
+    crece: insertar añade al final y borrar solo quita la posición; lo que dejan
+    las claves borradas se recupera al reconstruir el índice.
+    """
+
+    def __init__(self, keys=()):
+        keys = list(keys)
+        self.buffer = bytearray(b"".join(keys))
+        self.lengths = array("H", map(len, keys))
+        self.starts = array("I", accumulate(self.lengths, initial=0))
+        self.starts.pop()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, position):
+        start = self.starts[position]
+        return bytes(self.buffer[start:start + self.lengths[position]])
+
+    def __delitem__(self, position):
+        del self.starts[position]
+        del self.lengths[position]
+
+    def insert(self, position, key):
+        self.starts.insert(position, len(self.buffer))
+        self.lengths.insert(position, len(key))
+        self.buffer += key
+
+
+class AutocompleteIndex:
+    """
+    Índice de prefijos en memoria sobre los nombres de producto.
+
+    Compacto: las claves (nombre plegado desde cada palabra, en UTF-8) ordenadas
+    y empaquetadas en PackedKeys, con el id de producto en un array paralelo; un
+    prefijo es un rango que se localiza con bisect. Las claves de un producto
+    no se guardan: se recalculan de su nombre al cambiarlo. Los prefijos con
+    muchas claves (los cortos) guardan sus mejores N productos ya ordenados; se
+    calculan de abajo arriba a partir de los de sus hijos, así que mantenerlos
+    al cambiar un producto solo toca los prefijos de sus claves. Una consulta es un acceso a diccionario o una
+    ordenación de como mucho scan_limit claves.
+    """
+
+    def __init__(self, max_results=AUTOCOMPLETE_MAX_RESULTS, scan_limit=AUTOCOMPLETE_SCAN_LIMIT,
+                 max_key_chars=AUTOCOMPLETE_MAX_KEY_CHARS, rank_by=AUTOCOMPLETE_RANK):
+        self.max_results = max_results
+        self.scan_limit = max(scan_limit, max_results)
+        self.max_key_chars = max_key_chars
+        self.rank_by = rank_by
+        self.lock = threading.Lock()
+        self.keys = PackedKeys()
+        self.ids = array("l")
+        self.names = {}
+        self.stock = {}
+        self.popularity = {}
+        self.rank = {}
+        self.top = {}
+        # Cambios recibidos durante una reconstrucción (se reaplican al terminar)
+        self.pending = None
+        self.built_at = None
+
+    def rank_of(self, product_id):
+        popularity = self.popularity.get(product_id, 0)
+        stock = max(self.stock.get(product_id, 0), 0)
+        ranking = (stock, popularity) if self.rank_by == "stock" else (popularity, stock)
+        # A igualdad, primero los productos más antiguos
+        return ranking + (-product_id,)
+
+    def keys_of(self, name):
+        return tuple(key.encode() for key in name_keys(name, self.max_key_chars))
+
+    def best(self, product_ids):
+        return tuple(heapq.nlargest(self.max_results, set(product_ids), key=self.rank.__getitem__))
+
+    def entry(self, key, product_id):
+        """Posición de (key, product_id): las claves iguales son contiguas y ordenadas por id"""
+        lo = bisect_left(self.keys, key)
+        return bisect_left(self.ids, product_id, lo, bisect_right(self.keys, key, lo))
+
+    def span(self, prefix, lo=0, hi=None):
+        hi = len(self.keys) if hi is None else hi
+        start = bisect_left(self.keys, prefix, lo, hi)
+        return start, bisect_left(self.keys, prefix + HIGH, start, hi)
+
+    def ranked(self, lo, hi, depth):
+        """
+        Mejores productos del rango [lo, hi), cuyas claves comparten depth
+        caracteres: los precalculados de cada hijo grande y las claves de los
+        hijos pequeños (el top de un prefijo siempre está en la unión de los de sus hijos).
+        """
+        if hi - lo <= self.scan_limit:
+            return self.best(self.ids[lo:hi])
+        candidates = []
+        position = lo
+        while position < hi:
+            key = self.keys[position]
+            if len(key) == depth:
+                candidates.append(self.ids[position])
+                position += 1
+                continue
+            child = key[:depth + 1]
+            _, end = self.span(child, position, hi)
+            cached = self.top.get(child) if end - position > self.scan_limit else None
+            candidates.extend(cached if cached is not None else self.ids[position:end])
+            position = end
+        return self.best(candidates)
+
+    def build_top(self, lo, hi, depth):
+        """Precalcula los prefijos grandes bajo [lo, hi) (hijos antes que padres)"""
+        if hi - lo <= self.scan_limit:
+            return
+        position = lo
+        while position < hi:
+            key = self.keys[position]
+            if len(key) == depth:
+                position += 1
+                continue
+            _, end = self.span(key[:depth + 1], position, hi)
+            self.build_top(position, end, depth + 1)
+            position = end
+        if depth > 0:
+            self.top[self.keys[lo][:depth]] = self.ranked(lo, hi, depth)
+
+    def unaffected(self, cached, product_ids):
+        """El top cacheado sigue valiendo: no contiene ninguno de los productos y ninguno lo supera"""
+        if cached is None or len(cached) < self.max_results or cached[-1] not in self.rank:
+            return False
+        floor = self.rank[cached[-1]]
+        return all(
+            product_id not in cached and (product_id not in self.rank or self.rank[product_id] < floor)
+            for product_id in product_ids
+        )
+
+    def refresh_paths(self, keys, product_ids):
+        """Recalcula los prefijos precalculados de estas claves, del más largo al más corto"""
+        # El rango de un prefijo está dentro del de su padre: se busca solo ahí, y bajo
+        # un rango pequeño todos son pequeños (basta con el del padre, sin más bisect)
+        bounds = {}
+        for key in keys:
+            lo, hi = 0, len(self.keys)
+            for length in range(1, len(key) + 1):
+                prefix = key[:length]
+                if hi - lo > self.scan_limit:
+                    lo, hi = bounds.get(prefix) or self.span(prefix, lo, hi)
+                bounds[prefix] = (lo, hi)
+        for prefix in sorted(bounds, key=len, reverse=True):
+            lo, hi = bounds[prefix]
+            if hi - lo <= self.scan_limit:
+                self.top.pop(prefix, None)
+            elif not self.unaffected(self.top.get(prefix), product_ids):
+                self.top[prefix] = self.ranked(lo, hi, len(prefix))
+
+    def apply(self, changes):
+        """
+        Aplica cambios [(product_id, name, stock)]: name None conserva el nombre
+        (solo cambia el stock) y stock None retira el producto del índice.
+        """
+        touched = set()
+        changed = set()
+        for product_id, name, stock in changes:
+            old_name = self.names.get(product_id)
+            old_keys = self.keys_of(old_name) if old_name is not None else ()
+            if stock is None:
+                new_keys = ()
+            elif name is None:
+                if product_id not in self.names:
+                    continue
+                new_keys = old_keys
+            else:
+                new_keys = self.keys_of(name)
+            if new_keys != old_keys:
+                for key in old_keys:
+                    position = self.entry(key, product_id)
+                    del self.keys[position]
+                    del self.ids[position]
+                for key in new_keys:
+                    position = self.entry(key, product_id)
+                    self.keys.insert(position, key)
+                    self.ids.insert(position, product_id)
+            touched.update(old_keys)
+            touched.update(new_keys)
+            changed.add(product_id)
+            if stock is None:
+                for mapping in (self.names, self.stock, self.rank):
+                    mapping.pop(product_id, None)
+            else:
+                if name is not None:
+                    self.names[product_id] = name
+                self.stock[product_id] = stock
+                self.rank[product_id] = self.rank_of(product_id)
+        self.refresh_paths(touched, changed)
+
+    def update(self, changes):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.extend(changes)
+            self.apply(changes)
+
+    def put(self, product_id, name, stock):
+        self.update([(product_id, name, stock)])
+
+    def remove(self, product_ids):
+        self.update([(product_id, None, None) for product_id in product_ids])
+
+    def suggest(self, query, limit):
+        """[(id, nombre)] de los productos cuyo nombre tiene una palabra que empieza por query"""
+        prefix = search_prefix(query, self.max_key_chars).encode()
+        if not prefix:
+            return []
+        with self.lock:
+            product_ids = self.top.get(prefix)
+            if product_ids is None:
+                lo, hi = self.span(prefix)
+                product_ids = self.best(self.ids[lo:hi])
+            return [(product_id, self.names[product_id]) for product_id in product_ids[:limit]]
+
+    def load(self, products, popularity):
+        """Reconstruye todo a partir de [(id, nombre, stock)] y {id: popularidad}"""
+        self.popularity = popularity
+        self.names = {product_id: name for product_id, name, _ in products}
+        self.stock = {product_id: stock for product_id, _, stock in products}
+        self.rank = {product_id: self.rank_of(product_id) for product_id in self.names}
+        entries = sorted((key, product_id) for product_id, name, _ in products for key in self.keys_of(name))
+        self.keys = PackedKeys(key for key, _ in entries)
+        self.ids = array("l", (product_id for _, product_id in entries))
+        del entries
+        self.top = {}
+        self.build_top(0, len(self.keys), 0)
+
+    def replace(self, products, popularity):
+        """Sustituye el índice por uno nuevo y reaplica los cambios llegados mientras tanto"""
+        fresh = AutocompleteIndex(self.max_results, self.scan_limit, self.max_key_chars, self.rank_by)
+        fresh.load(products, popularity)
+        with self.lock:
+            pending, self.pending = self.pending or [], None
+            for name in ("keys", "ids", "names", "stock", "popularity", "rank", "top"):
+                setattr(self, name, getattr(fresh, name))
+            self.built_at = datetime.now(timezone.utc)
+            if pending:
+                self.apply(pending)
+
+    def stats(self):
+        with self.lock:
+            return {"products": len(self.names), "keys": len(self.keys), "key_bytes": len(self.keys.buffer),
+                    "cached_prefixes": len(self.top),
+                    "built_at": self.built_at.isoformat() if self.built_at else None}
+
+
+index = AutocompleteIndex()
+
+
+def load_catalog(db):
+    """Productos activos [(id, nombre, stock)] y popularidad reciente {id: unidades añadidas}"""
+    products = db.execute(select(Product.id, Product.name, Product.stock).where(active_product)).all()
+    since = datetime.now(timezone.utc).date() - timedelta(days=AUTOCOMPLETE_POPULARITY_DAYS)
+    popularity = dict(db.execute(
+        select(CartActivityDaily.product_id, func.sum(CartActivityDaily.quantity_added))
+        .where(CartActivityDaily.day >= since)
+        .group_by(CartActivityDaily.product_id)
+    ).all())
+    return [tuple(row) for row in products], {product_id: int(total or 0) for product_id, total in popularity.items()}
+
+
+def rebuild_index(should_continue=lambda: True, pause=time.sleep):
+    """Reconstruye el índice desde products (y la popularidad de los rollups)"""
+    with index.lock:
+        index.pending = []
+    try:
+        db = SessionLocal()
+        try:
+            products, popularity = load_catalog(db)
+        finally:
+            db.close()
+        index.replace(products, popularity)
+    finally:
+        with index.lock:
+            index.pending = None
+    return {"products": len(products)}
+
+
+# Llamadas desde las rutas que escriben productos, tras el commit: el cambio se ve
+# al instante en este proceso (las demás réplicas lo reciben por refresh_products)
+def product_saved(product_id, name, stock):
+    if AUTOCOMPLETE_ENABLED:
+        index.put(product_id, name, stock)
+
+
+def stock_changed(stock_by_id):
+    if AUTOCOMPLETE_ENABLED:
+        index.update([(product_id, None, stock) for product_id, stock in stock_by_id.items()])
+
+
+def products_removed(product_ids):
+    if AUTOCOMPLETE_ENABLED:
+        index.remove(product_ids)
+
+
+def refresh_products(message, session_factory):
+    """
+    Aplica una notificación de cambios en products (de este u otro proceso):
+    relee los productos indicados, o todo el índice si no se sabe cuáles.
+    """
+    if message.get("table") not in ("products", "*"):
+        return
+    ids = message.get("ids")
+    if ids is None:
+        rebuild_index()
+        return
+    db = session_factory()
+    try:
+        rows = {row.id: row for row in db.execute(
+            select(Product.id, Product.name, Product.stock).where(Product.id.in_(ids), active_product)
+        )}
+    finally:
+        db.close()
+    index.update([
+        (product_id, rows[product_id].name, rows[product_id].stock) if product_id in rows else (product_id, None, None)
+        for product_id in ids
+    ])
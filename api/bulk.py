@@ -0,0 +1,29 @@
+import os
+from sqlalchemy import bindparam, cast, literal_column, select, text
+
+# Máximo de filas por operación masiva del panel de administración
+ADMIN_BULK_MAX_ITEMS = int(os.getenv("ADMIN_BULK_MAX_ITEMS", "5000"))
+
+
+def values_subquery(name, columns, rows):
+    """
+    Filas literales (VALUES ...) como subconsulta con nombre y columnas, para
+    usar en UPDATE ... FROM. PostgreSQL y SQLite llaman column1..N a las
+    columnas de VALUES; se renombran en un SELECT porque SQLite no admite la
+    lista de alias "AS v (id, ...)" que genera sqlalchemy.values().
+    """
+    params = []
+    tuples = []
+    for index, row in enumerate(rows):
+        names = []
+        for column, value in zip(columns, row):
+            key = f"{name}_{column.name}_{index}"
+            params.append(bindparam(key, value, type_=column.type))
+            names.append(f":{key}")
+        tuples.append(f"({', '.join(names)})")
+    literal_rows = text(f"(VALUES {', '.join(tuples)}) AS literal_rows").bindparams(*params)
+    # CAST explícito: en PostgreSQL una columna con solo NULL se tiparía como text
+    return select(*[
+        cast(literal_column(f"literal_rows.column{position}"), column.type).label(column.name)
+        for position, column in enumerate(columns, 1)
+    ]).select_from(literal_rows).subquery(name)
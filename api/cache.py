@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Configuración de las cachés en proceso (variables de entorno)
+# Pueden durar mucho: las escrituras las invalidan vía LISTEN/NOTIFY (ver invalidation.py).
+# CACHE_TTL_SECONDS=0 las desactiva.
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+
+class TTLCache:
+    """
+    Caché LRU con expiración. Cada entrada declara de qué filas de su tabla
+    depende (ids) o, con ids=None, que depende de toda la tabla (listados).
+    Con table=None no depende de las invalidaciones: el TTL (corto) acota
+    cuánto puede estar obsoleta y funciona aunque no haya listener.
+    """
+
+    def __init__(self, name, table, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.name = name
+        self.table = table
+        self.ttl_only = table is None
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expira, valor, ids)
+        self.by_id = {}               # id -> claves que dependen de esa fila
+        self.whole_table = set()      # claves que dependen de toda la tabla
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "flushes": 0}
+        registry.register(self)
+
+    def enabled(self):
+        return (registry.active or self.ttl_only) and self.ttl > 0
+
+    def get(self, key):
+        if not self.enabled():
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def current_generation(self):
+        """Tomar antes de consultar la base de datos y pasar a set()"""
+        return self.generation
+
+    def set(self, key, value, ids=None, generation=None):
+        if not self.enabled():
+            return
+        with self.lock:
+            # Si hubo una invalidación mientras se cargaba el valor, este puede estar obsoleto
+            if generation is not None and generation != self.generation:
+                return
+            self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, value, ids)
+            if ids is None:
+                self.whole_table.add(key)
+            else:
+                for row_id in ids:
+                    self.by_id.setdefault(row_id, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, ids=None):
+        """Invalida las entradas de esas filas (y los listados); ids=None vacía la caché"""
+        with self.lock:
+            self.generation += 1
+            if ids is None:
+                self._clear()
+                return
+            self.stats["invalidations"] += 1
+            keys = set(self.whole_table)
+            for row_id in ids:
+                keys |= self.by_id.get(row_id, set())
+            for key in keys:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self._clear()
+
+    def _clear(self):
+        self.stats["flushes"] += 1
+        self.entries.clear()
+        self.by_id.clear()
+        self.whole_table.clear()
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        ids = entry[2]
+        if ids is None:
+            self.whole_table.discard(key)
+            return
+        for row_id in ids:
+            keys = self.by_id.get(row_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_id[row_id]
+
+
+class CacheRegistry:
+    """
+    Todas las cachés del proceso. Solo están activas mientras el listener de
+    invalidaciones está conectado: sin él no hay forma de saber qué cambió.
+    """
+
+    def __init__(self):
+        self.caches = []
+        self.active = False
+
+    def register(self, cache):
+        self.caches.append(cache)
+
+    def invalidate(self, table, ids=None):
+        for cache in self.caches:
+            if cache.table == table:
+                cache.invalidate(ids)
+
+    def flush_all(self):
+        for cache in self.caches:
+            cache.clear()
+
+    def set_active(self, active):
+        # Al conectar o desconectar se pudo perder cualquier notificación
+        self.flush_all()
+        self.active = active
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "caches": {
+                cache.name: dict(cache.stats, entries=len(cache.entries)) for cache in self.caches
+            },
+        }
+
+
+registry = CacheRegistry()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, select
+from database import SessionLocal
+from jobs import in_window, parse_window
+from models.cart import Cart, CartItem
+
+# Configuración de la caducidad de carritos abandonados (variables de entorno)
+CART_EXPIRY_ENABLED = os.getenv("CART_EXPIRY_ENABLED", "true").lower() == "true"
+# Días sin cambios en sus items tras los que un carrito se borra
+CART_TTL_DAYS = float(os.getenv("CART_TTL_DAYS", "30"))
+# Horas en que corre la tarea ("inicio-fin", hora local); vacío = a cualquier hora
+CART_EXPIRY_WINDOW = os.getenv("CART_EXPIRY_WINDOW", "2-6")
+# Carritos borrados por transacción y pausa entre lotes
+CART_EXPIRY_BATCH_SIZE = int(os.getenv("CART_EXPIRY_BATCH_SIZE", "500"))
+CART_EXPIRY_PAUSE_SECONDS = float(os.getenv("CART_EXPIRY_PAUSE_SECONDS", "0.2"))
+CART_EXPIRY_INTERVAL_SECONDS = float(os.getenv("CART_EXPIRY_INTERVAL_SECONDS", "900"))
+
+
+def expire_batch(db, cutoff, batch_size):
+    """
+    Borra un lote de carritos sin cambios desde cutoff (y sus items) y lo
+    confirma. SKIP LOCKED: un carrito que una petición está modificando queda
+    bloqueado por ella y se salta, así la tarea nunca espera al tráfico.
+    Devuelve (carritos, items) borrados.
+    """
+    cart_ids = list(db.execute(
+        select(Cart.id)
+        .where(Cart.updated_at < cutoff)
+        .order_by(Cart.updated_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars())
+    if not cart_ids:
+        db.commit()
+        return 0, 0
+    # Los items se borran explícitamente: no depende del ON DELETE CASCADE y se cuentan
+    items = db.execute(delete(CartItem).where(CartItem.cart_id.in_(cart_ids))).rowcount
+    carts = db.execute(delete(Cart).where(Cart.id.in_(cart_ids))).rowcount
+    db.commit()
+    return carts, items
+
+
+def expire_carts(now=None, should_continue=lambda: True, pause=time.sleep):
+    """Borra por lotes los carritos inactivos más de CART_TTL_DAYS; devuelve los contadores"""
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=CART_TTL_DAYS)
+    totals = {"carts": 0, "cart_items": 0, "batches": 0}
+    db = SessionLocal()
+    try:
+        while should_continue():
+            carts, items = expire_batch(db, cutoff, CART_EXPIRY_BATCH_SIZE)
+            if carts:
+                totals["carts"] += carts
+                totals["cart_items"] += items
+                totals["batches"] += 1
+            if carts < CART_EXPIRY_BATCH_SIZE:
+                break
+            pause(CART_EXPIRY_PAUSE_SECONDS)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return totals
+
+
+if __name__ == "__main__":
+    # Ejecución manual o desde cron: python cart_expiry.py [--ignore-window]
+    parser = argparse.ArgumentParser(description="Borra los carritos abandonados")
+    parser.add_argument("--ignore-window", action="store_true", help="no esperar a la ventana CART_EXPIRY_WINDOW")
+    args = parser.parse_args()
+    import models.user  # noqa: F401  (Cart se relaciona con User por nombre)
+    window = None if args.ignore_window else parse_window(CART_EXPIRY_WINDOW)
+    if not in_window(window):
+        parser.exit(0, f"Fuera de la ventana CART_EXPIRY_WINDOW={CART_EXPIRY_WINDOW}\n")
+    start = time.perf_counter()
+    totals = expire_carts(should_continue=lambda: in_window(window))
+    print(f"Carritos borrados: {totals['carts']}, items: {totals['cart_items']}, "
+          f"lotes: {totals['batches']}, {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.orm.exc import StaleDataError
+from models.product import Product
+
+# Control de concurrencia optimista: Product y User llevan una columna version que
+# SQLAlchemy incrementa en cada UPDATE (version_id_col) y comprueba en el WHERE.
+
+
+def etag(version) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(value):
+    """Versión esperada de una cabecera If-Match ("3", W/"3" o 3); None si no hay o es *"""
+    if value is None:
+        return None
+    value = value.strip()
+    if value == "*":
+        return None
+    if value.startswith("W/"):
+        value = value[2:]
+    value = value.strip('"')
+    if not value.isdigit():
+        raise HTTPException(status_code=400, detail="Cabecera If-Match inválida")
+    return int(value)
+
+
+def conflict(current_version=None):
+    headers = {"ETag": etag(current_version)} if current_version is not None else None
+    return HTTPException(
+        status_code=409,
+        detail="El recurso fue modificado por otra petición; vuelve a leerlo y reintenta",
+        headers=headers,
+    )
+
+
+def check_version(if_match, row):
+    """409 si el cliente editó una versión distinta de la actual; devuelve la esperada (o None)"""
+    expected = parse_if_match(if_match)
+    if expected is not None and expected != row.version:
+        raise conflict(row.version)
+    return expected
+
+
+@contextmanager
+def versioned(db):
+    """Convierte un choque de versiones (escritura concurrente) dentro del bloque en 409"""
+    try:
+        yield
+    except StaleDataError:
+        db.rollback()
+        raise conflict()
+
+
+def commit_versioned(db):
+    with versioned(db):
+        db.commit()
+
+
+def add_stock(db, product_id: int, delta: int, expected_version=None):
+    """
+    stock = stock + delta en una sola sentencia: los deltas concurrentes se suman
+    sin leer la fila ni bloquearla entre peticiones. Nunca deja el stock negativo.
+    Con expected_version (If-Match) el UPDATE exige además esa versión: una
+    escritura concurrente entre la lectura y el UPDATE da 409.
+    """
+    conditions = [Product.id == product_id, Product.stock + delta >= 0]
+    if expected_version is not None:
+        conditions.append(Product.version == expected_version)
+    result = db.execute(
+        update(Product)
+        .where(*conditions)
+        .values(stock=Product.stock + delta, version=Product.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        if expected_version is not None:
+            current = db.execute(select(Product.version).where(Product.id == product_id)).scalar()
+            if current != expected_version:
+                raise conflict(current)
+        raise HTTPException(status_code=409, detail="Stock insuficiente")
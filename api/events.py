@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+from collections import deque
+
+# Configuración del stream de eventos (variables de entorno)
+SSE_BUFFER_SIZE = int(os.getenv("SSE_BUFFER_SIZE", "1000"))
+SSE_CLIENT_QUEUE = int(os.getenv("SSE_CLIENT_QUEUE", "100"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", "3000"))
+
+
+class Subscriber:
+    """Cola acotada de un cliente; si se llena, se corta su stream y reanuda al reconectar"""
+
+    def __init__(self, last_seq):
+        self.pending = deque()
+        self.last_seq = last_seq
+        self.wakeup = asyncio.Event()
+        self.overflowed = False
+        self.closed = False
+
+    def offer(self, item):
+        if item[0] <= self.last_seq:
+            return  # ya enviado como parte del backlog
+        if self.overflowed:
+            # Tras el primer evento perdido no se encola nada más: el stream acaba en
+            # el último evento entregado en orden y el cliente reanuda desde ahí
+            return
+        if len(self.pending) >= SSE_CLIENT_QUEUE:
+            self.overflowed = True
+        else:
+            self.pending.append(item)
+            self.last_seq = item[0]
+        self.wakeup.set()
+
+
+class Broadcaster:
+    """
+    Difunde eventos a todos los clientes SSE del proceso. Publicar es seguro
+    desde cualquier hilo; los clientes se atienden en el bucle de eventos.
+    Los últimos SSE_BUFFER_SIZE eventos se guardan para reanudar con
+    Last-Event-ID. Los ids vienen de la notificación que originó el evento
+    (secuencia compartida en PostgreSQL), así que son los mismos en todas las
+    réplicas y se puede reanudar en otra; un id que no está en el buffer
+    (demasiado antiguo o anterior al arranque de la réplica) recibe un evento
+    "reset" (el cliente debe recargar). seq es solo el orden local de entrega.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.buffer = deque(maxlen=SSE_BUFFER_SIZE)
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.loop = None
+
+    def attach(self, loop):
+        self.loop = loop
+
+    def publish(self, event, data, event_id=""):
+        """event_id vacío: evento local sin id compartido (el cliente olvida su Last-Event-ID)"""
+        with self.lock:
+            self.seq += 1
+            item = (self.seq, event_id, event, json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str))
+            self.buffer.append(item)
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._fanout, item)
+
+    def _fanout(self, item):
+        for subscriber in list(self.subscribers):
+            subscriber.offer(item)
+
+    def subscribe(self, last_event_id=None):
+        """Registra un cliente y devuelve (subscriber, backlog) (llamar desde el bucle de eventos)"""
+        with self.lock:
+            current = self.seq
+            backlog = []
+            if last_event_id:
+                seq = next((item[0] for item in self.buffer if item[1] == last_event_id), None)
+                if seq is not None:
+                    backlog = [item for item in self.buffer if item[0] > seq]
+                else:
+                    backlog = [(current, "", "reset", "{}")]
+            subscriber = Subscriber(current)
+        self.subscribers.add(subscriber)
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def close(self):
+        for subscriber in list(self.subscribers):
+            subscriber.closed = True
+            subscriber.wakeup.set()
+
+
+def format_event(item):
+    seq, event_id, event, data = item
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+async def stream(broadcaster, last_event_id=None):
+    """Generador del cuerpo text/event-stream de un cliente"""
+    subscriber, backlog = broadcaster.subscribe(last_event_id)
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        for item in backlog:
+            yield format_event(item)
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.wakeup.wait(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ": keepalive\n\n"
+                continue
+            subscriber.wakeup.clear()
+            while subscriber.pending:
+                yield format_event(subscriber.pending.popleft())
+            if subscriber.overflowed or subscriber.closed:
+                # Cliente lento (o apagado): se corta y al reconectar reanuda desde el buffer
+                return
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+product_events = Broadcaster()
+
+
+def publish_product_changes(message, session_factory):
+    """
+    Traduce una notificación de invalidación de products en eventos con los
+    valores actuales (una consulta por notificación y proceso, no por cliente).
+    Los ids son "<seq de la notificación>-<n>": todas las réplicas reciben las
+    notificaciones en el mismo orden (el de commit) y generan los mismos ids.
+    Las notificaciones locales (RESYNC del listener) no traen seq y su reset va sin id.
+    """
+    from models.product import Product, active_product
+
+    if message.get("table") not in ("products", "*"):
+        return
+    seq = message.get("seq")
+    event_ids = (f"{seq}-{n}" if seq is not None else "" for n in itertools.count())
+    ids = message.get("ids")
+    if ids is None:
+        # Cambio masivo o reconexión del listener: no se sabe qué cambió
+        product_events.publish("reset", {}, next(event_ids))
+        return
+    if message.get("op") == "DELETE":
+        for product_id in ids:
+            product_events.publish("product.deleted", {"id": product_id}, next(event_ids))
+        return
+
+    db = session_factory()
+    try:
+        rows = db.query(Product.id, Product.name, Product.price, Product.stock, Product.version).filter(Product.id.in_(ids), active_product).all()
+    finally:
+        db.close()
+    found = {row.id: row for row in rows}
+    event = "product.created" if message.get("op") == "INSERT" else "product.updated"
+    for product_id in ids:
+        row = found.get(product_id)
+        if row is None:
+            product_events.publish("product.deleted", {"id": product_id}, next(event_ids))
+        else:
+            product_events.publish(event, {
+                "id": row.id,
+                "name": row.name,
+                "price": str(row.price),
+                "stock": row.stock,
+                "version": row.version,
+            }, next(event_ids))
@@ -0,0 +1,44 @@
+from fastapi import HTTPException
+
+
+def _identity(value):
+    return value
+
+
+class FieldSet:
+    """
+    Campos seleccionables con ?fields=a,b,c para un modelo. Solo se piden a
+    la base de datos las columnas solicitadas (el id siempre se incluye) y
+    cada valor se formatea con la función indicada para su campo.
+    """
+
+    def __init__(self, model, formatters):
+        self.model = model
+        # nombre del campo -> función de formato (None = valor tal cual)
+        self.formatters = {name: fmt or _identity for name, fmt in formatters.items()}
+        self.all = tuple(self.formatters)
+
+    def parse(self, fields):
+        """Valida ?fields= y devuelve la tupla de campos en orden canónico"""
+        if not fields:
+            return self.all
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested - set(self.formatters)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Campos no válidos: {', '.join(sorted(unknown))}. Disponibles: {', '.join(self.all)}"
+            )
+        requested.add("id")
+        return tuple(name for name in self.all if name in requested)
+
+    def columns(self, names):
+        return [getattr(self.model, name) for name in names]
+
+    def query(self, db, names):
+        """Consulta que selecciona solo las columnas pedidas (filas, no instancias del ORM)"""
+        return db.query(*self.columns(names))
+
+    def to_dict(self, row, names):
+        formatters = self.formatters
+        return {name: formatters[name](value) for name, value in zip(names, row)}
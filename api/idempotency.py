@@ -0,0 +1,279 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from database import OuterTransaction, SessionLocal, shared_session
+from models.idempotency import IdempotencyKey
+
+# Configuración de las claves de idempotencia (variables de entorno)
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# Cuánto se guarda la respuesta de una clave para repetirla
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# Plazo tras el que una petición original sin terminar se da por abandonada
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+# Cuánto espera un duplicado a que termine la original antes de responder 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_PURGE_SECONDS = float(os.getenv("IDEMPOTENCY_PURGE_SECONDS", "60"))
+IDEMPOTENCY_MAX_KEY_LENGTH = 255
+
+# Escrituras que aceptan Idempotency-Key
+PROTECTED_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+PROTECTED_PREFIXES = ("/api/v1/carts", "/api/v1/admin/products")
+# Los lotes no aceptan la cabecera (400): cada sub-petición lleva la suya
+BATCH_PATH = "/api/v1/batch"
+# Cabeceras de la respuesta original que se repiten
+STORED_HEADERS = ("content-type", "location", "etag")
+# Respuestas que no se guardan: la misma clave se puede reintentar
+TRANSIENT_STATUS = {409, 429}
+
+logger = logging.getLogger("api.idempotency")
+
+CLAIMED, REPLAY, IN_FLIGHT, MISMATCH = "claimed", "replay", "in_flight", "mismatch"
+
+# Originales en curso en este proceso: sus duplicados esperan al evento en vez de sondear
+_inflight = {}
+_last_purge = 0.0
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def claim(record_key, fingerprint, shared=None):
+    """
+    Registra la petición original; si la clave ya existe devuelve (estado, fila).
+    Con shared (sesión de un lote transaccional) la reclamación va en un
+    SAVEPOINT de la transacción del lote y se confirma o revierte con ella.
+    """
+    now = _utcnow()
+    db = shared or SessionLocal()
+    try:
+        # Una entrada caducada (o de un original abandonado) ya no cuenta
+        db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.key == record_key, IdempotencyKey.expires_at <= now
+        ))
+        claim_key = insert(IdempotencyKey).values(
+            key=record_key,
+            fingerprint=fingerprint,
+            expires_at=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        )
+        try:
+            if shared is None:
+                db.execute(claim_key)
+                db.commit()
+            else:
+                with db.begin_nested():
+                    db.execute(claim_key)
+            return CLAIMED, None
+        except IntegrityError:
+            if shared is None:
+                db.rollback()
+        row = db.execute(select(
+            IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.headers, IdempotencyKey.body
+        ).where(IdempotencyKey.key == record_key)).first()
+    finally:
+        if shared is None:
+            db.close()
+
+    if row is None:
+        return IN_FLIGHT, None  # se liberó entre medias: el siguiente intento la reclama
+    if row.fingerprint != fingerprint:
+        return MISMATCH, None
+    if row.status_code is None:
+        return IN_FLIGHT, None
+    return REPLAY, row
+
+
+def release(record_key):
+    """Borra la reclamación de una original que falló, para que un reintento la ejecute"""
+    db = SessionLocal()
+    try:
+        db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.key == record_key, IdempotencyKey.status_code.is_(None)
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def purge_expired(limit=1000):
+    """Borra un lote de claves caducadas"""
+    db = SessionLocal()
+    try:
+        expired = select(IdempotencyKey.key).where(IdempotencyKey.expires_at <= _utcnow()).limit(limit)
+        result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.key.in_(expired)))
+        db.commit()
+        return result.rowcount
+    except Exception:
+        logger.exception("Error al purgar claves de idempotencia")
+        return 0
+    finally:
+        db.close()
+
+
+def store(db, record_key, status_code, headers, body):
+    """Guarda la respuesta de la original en la sesión db (sin confirmar la transacción exterior)"""
+    db.execute(update(IdempotencyKey).where(IdempotencyKey.key == record_key).values(
+        status_code=status_code,
+        headers=json.dumps(headers),
+        body=body,
+        expires_at=_utcnow() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    ))
+    db.commit()
+
+
+class _Transaction(OuterTransaction):
+    """
+    Transacción exterior compartida por el manejador y la respuesta guardada.
+    Los commit del manejador solo liberan un SAVEPOINT (como en los lotes): el
+    efecto de la petición y su respuesta se confirman juntos o no se confirman.
+    """
+
+    def save(self, record_key, status_code, headers, body):
+        store(self.db, record_key, status_code, headers, body)
+        self.commit()
+
+
+def replay(row):
+    headers = json.loads(row.headers or "{}")
+    headers["Idempotent-Replayed"] = "true"
+    return Response(content=row.body or b"", status_code=row.status_code, headers=headers)
+
+
+def _purge_in_background():
+    global _last_purge
+    if time.monotonic() - _last_purge < IDEMPOTENCY_PURGE_SECONDS:
+        return
+    _last_purge = time.monotonic()
+    asyncio.ensure_future(run_in_threadpool(purge_expired))
+
+
+def _storable(response):
+    return response.status_code < 500 and response.status_code not in TRANSIENT_STATUS
+
+
+def _stored_headers(response):
+    return {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+
+
+async def _execute(request, call_next, record_key):
+    event = _inflight[record_key] = asyncio.Event()
+    tx = None
+    stored = False
+    try:
+        tx = await run_in_threadpool(_Transaction)
+        token = shared_session.set(tx.db)
+        try:
+            response = await call_next(request)
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        finally:
+            shared_session.reset(token)
+
+        if _storable(response):
+            await run_in_threadpool(tx.save, record_key, response.status_code, _stored_headers(response), body)
+            stored = True
+        return Response(content=body, status_code=response.status_code, headers=dict(response.headers))
+    finally:
+        if tx is not None:
+            await run_in_threadpool(tx.close)
+        if not stored:
+            await run_in_threadpool(release, record_key)
+        del _inflight[record_key]
+        event.set()
+        _purge_in_background()
+
+
+async def _execute_shared(request, call_next, record_key, db):
+    """
+    Original dentro de un lote transaccional: el manejador ya usa la sesión del
+    lote y la respuesta se guarda en ella. No hace falta liberar la clave si no
+    se guarda: esas respuestas (5xx, 409, 429) hacen fallar el lote, que revierte
+    también la reclamación.
+    """
+    response = await call_next(request)
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    if _storable(response):
+        await run_in_threadpool(store, db, record_key, response.status_code, _stored_headers(response), body)
+    return Response(content=body, status_code=response.status_code, headers=dict(response.headers))
+
+
+async def handle(request, call_next):
+    """
+    Ejecuta una sola vez cada escritura con Idempotency-Key: las repeticiones
+    reciben la respuesta guardada y los duplicados concurrentes esperan a la
+    original (hasta IDEMPOTENCY_WAIT_SECONDS; después 409 con Retry-After).
+    En /api/v1/batch la clave va en cada sub-petición, no en el lote.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is not None and request.url.path.rstrip("/") == BATCH_PATH:
+        return JSONResponse(status_code=400, content={
+            "detail": "Idempotency-Key no se admite en el lote: envíala en las cabeceras de cada sub-petición"
+        })
+    if (key is None or request.method not in PROTECTED_METHODS
+            or not request.url.path.startswith(PROTECTED_PREFIXES)):
+        return await call_next(request)
+    if not key or len(key) > IDEMPOTENCY_MAX_KEY_LENGTH:
+        return JSONResponse(status_code=400, content={"detail": "Idempotency-Key inválida"})
+
+    body = await request.body()
+    # El receive original ya está consumido: call_next recibe una petición nueva
+    # sobre el mismo scope cuyo receive repite el cuerpo
+    receive = request.receive
+    body_sent = False
+
+    async def replay_body():
+        nonlocal body_sent
+        if body_sent:
+            return await receive()
+        body_sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    request = Request(request.scope, receive=replay_body)
+
+    # La clave vale por credenciales, método y ruta; la huella detecta reutilizaciones con otro cuerpo
+    scope = "\n".join([request.headers.get("Authorization", ""), request.method, request.url.path, key])
+    record_key = hashlib.sha256(scope.encode()).hexdigest()
+    fingerprint = hashlib.sha256(request.url.query.encode() + b"\n" + body).hexdigest()
+
+    shared = shared_session.get()
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        outcome, row = await run_in_threadpool(claim, record_key, fingerprint, shared)
+        if outcome == CLAIMED:
+            if shared is not None:
+                return await _execute_shared(request, call_next, record_key, shared)
+            return await _execute(request, call_next, record_key)
+        if outcome == REPLAY:
+            return replay(row)
+        if outcome == MISMATCH:
+            return JSONResponse(status_code=422, content={
+                "detail": "La Idempotency-Key ya se usó con otra petición"
+            })
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return JSONResponse(
+                status_code=409,
+                content={"detail": "Hay una petición en curso con la misma Idempotency-Key"},
+                headers={"Retry-After": "1"},
+            )
+        event = _inflight.get(record_key)
+        if event is not None:
+            # Original en este proceso: se despierta en cuanto termina
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            # Original en otro proceso o réplica: sondeo con espera creciente
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
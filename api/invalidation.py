@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import select
+import threading
+from cache import registry
+
+# Canal de NOTIFY (ver notify_cache_invalidation en database/schema.sql)
+CACHE_CHANNEL = os.getenv("CACHE_CHANNEL", "cache_invalidation")
+# Cada cuánto se comprueba que la conexión sigue viva si no llegan notificaciones
+LISTEN_HEARTBEAT_SECONDS = float(os.getenv("LISTEN_HEARTBEAT_SECONDS", "5"))
+LISTEN_RECONNECT_MAX_SECONDS = float(os.getenv("LISTEN_RECONNECT_MAX_SECONDS", "30"))
+
+logger = logging.getLogger("api.cache")
+
+# Funciones que además reciben cada notificación (p. ej. el stream de eventos de productos)
+handlers = []
+
+
+def on_notification(handler):
+    handlers.append(handler)
+    return handler
+
+
+def dispatch_handlers(message):
+    for handler in handlers:
+        try:
+            handler(message)
+        except Exception:
+            logger.exception("Error en un manejador de notificaciones")
+
+
+def apply_notification(payload):
+    """Aplica una notificación {"table", "op", "ids", "seq"} a las cachés del proceso"""
+    try:
+        message = json.loads(payload)
+        table = message["table"]
+    except (ValueError, KeyError, TypeError):
+        # No se sabe qué cambió: lo seguro es vaciar todo
+        logger.warning("Notificación de invalidación inválida", extra={"fields": {"payload": payload[:200]}})
+        registry.flush_all()
+        dispatch_handlers({"table": "*", "op": "RESYNC", "ids": None})
+        return
+    registry.invalidate(table, message.get("ids"))
+    dispatch_handlers(message)
+
+
+class InvalidationListener:
+    """
+    Hilo con una conexión dedicada que escucha el canal de invalidaciones.
+    Mientras está desconectado las cachés quedan vacías y desactivadas; al
+    reconectar se vacían otra vez porque pudieron perderse notificaciones.
+    """
+
+    def __init__(self, engine):
+        self.connect_args = engine.url.translate_connect_args(username="user", database="dbname")
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout=LISTEN_HEARTBEAT_SECONDS + 1)
+
+    def _run(self):
+        import psycopg2
+
+        delay = 1.0
+        connected_before = False
+        while not self.stopping.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.connect_args)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CACHE_CHANNEL}")
+                # Escuchando: todo cambio posterior llegará como notificación
+                registry.set_active(True)
+                if connected_before:
+                    # Tras un corte pudieron perderse cambios
+                    dispatch_handlers({"table": "*", "op": "RESYNC", "ids": None})
+                connected_before = True
+                logger.info("Escuchando invalidaciones de caché", extra={"fields": {"channel": CACHE_CHANNEL}})
+                delay = 1.0
+                self._listen(conn)
+            except psycopg2.Error as exc:
+                if registry.active:
+                    logger.warning("Listener de invalidaciones desconectado", extra={"fields": {"error": str(exc)[:200]}})
+                registry.set_active(False)
+            finally:
+                if conn is not None:
+                    conn.close()
+            # Reintento con espera exponencial
+            self.stopping.wait(delay)
+            delay = min(delay * 2, LISTEN_RECONNECT_MAX_SECONDS)
+        registry.set_active(False)
+
+    def _listen(self, conn):
+        while not self.stopping.is_set():
+            readable, _, _ = select.select([conn], [], [], LISTEN_HEARTBEAT_SECONDS)
+            if not readable:
+                # Sin tráfico: una consulta trivial detecta conexiones caídas
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+            conn.poll()
+            while conn.notifies:
+                apply_notification(conn.notifies.pop(0).payload)
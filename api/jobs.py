@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger("api.jobs")
+
+
+def parse_window(value):
+    """"2-6" -> (2, 6); None si no hay ventana"""
+    if not value or not value.strip():
+        return None
+    start, _, end = value.partition("-")
+    return int(start) % 24, int(end) % 24
+
+
+def in_window(window, now=None):
+    if window is None:
+        return True
+    hour = (now or datetime.now()).hour
+    start, end = window
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end  # ventana que cruza la medianoche, p. ej. "22-4"
+
+
+class PeriodicJob:
+    """
+    Hilo que ejecuta run(should_continue, pause) cada interval segundos,
+    solo dentro de la ventana de horas indicada. run trabaja por lotes cortos,
+    consulta should_continue entre lotes (fin de la ventana o apagado) y
+    devuelve un diccionario de contadores, que se registra con su duración.
+    Con run_at_start la primera ejecución es al arrancar, sin esperar interval.
+    """
+
+    def __init__(self, name, run, interval, window=None, run_at_start=False):
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self.window = parse_window(window)
+        self.run_at_start = run_at_start
+        self.stopping = threading.Event()
+        self.thread = None
+        self.stats = {"runs": 0, "errors": 0, "last_started_at": None, "last_duration_ms": None,
+                      "last_result": None, "last_error": None, "totals": {}}
+        registry.register(self)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+    def should_continue(self):
+        return not self.stopping.is_set() and in_window(self.window)
+
+    def run_once(self):
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        try:
+            result = self.run(should_continue=self.should_continue, pause=self.stopping.wait)
+        except Exception as exc:
+            self.stats["errors"] += 1
+            self.stats["last_error"] = str(exc)[:200]
+            logger.exception("Error en una tarea periódica", extra={"fields": {"job": self.name}})
+            return None
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        totals = self.stats["totals"]
+        for key, value in result.items():
+            totals[key] = totals.get(key, 0) + value
+        self.stats.update(runs=self.stats["runs"] + 1, last_started_at=started_at.isoformat(),
+                          last_duration_ms=duration_ms, last_result=result)
+        if any(result.values()):
+            logger.info("Tarea periódica completada", extra={"fields": dict(result, job=self.name, duration_ms=duration_ms)})
+        return result
+
+    def _run(self):
+        if self.run_at_start and self.should_continue():
+            self.run_once()
+        while not self.stopping.wait(self.interval):
+            if self.should_continue():
+                self.run_once()
+
+
+class JobRegistry:
+    """Tareas periódicas del proceso (estado en GET /api/v1/admin/jobs)"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def register(self, job):
+        self.jobs.append(job)
+
+    def stats(self):
+        return {job.name: dict(job.stats, window=job.window, running=job.thread is not None) for job in self.jobs}
+
+
+registry = JobRegistry()
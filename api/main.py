@@ -1,9 +1,34 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import asyncio
+import logging
+import time
+from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, SessionLocal, engine
+from invalidation import InvalidationListener, on_notification
+from events import product_events, publish_product_changes
+from jobs import PeriodicJob, registry as job_registry
+from archiver import ARCHIVE_ENABLED, ARCHIVE_INTERVAL_SECONDS, ARCHIVE_WINDOW, archive_all
+from cart_expiry import CART_EXPIRY_ENABLED, CART_EXPIRY_INTERVAL_SECONDS, CART_EXPIRY_WINDOW, expire_carts
+from rollups import ROLLUP_ENABLED, ROLLUP_INTERVAL_SECONDS, roll_up
+from recommender import RECOMMENDER_ENABLED, RECOMMENDER_REBUILD_SECONDS, rebuild_index
+import autocomplete
+from observability.logs import setup_logging, request_id_var
+from observability.tracing import current_span, setup_tracing, start_trace
+from observability import profiling
+import idempotency
 from routes import users, products, carts
 from routes.admin import router as admin_router 
+from routes.profiling import router as profiling_router
+from routes.batch import router as batch_router
+from routes.events import router as events_router
+from routes.stats import router as stats_router
+
+# Configurar logging estructurado (JSON, cola en segundo plano)
+setup_logging("api")
+setup_tracing("api")
+access_logger = logging.getLogger("api.access")
 
 # Crear la instancia de FastAPI
 app = FastAPI(title="Tienda Virtual API", version="1.0.0")
@@ -17,11 +42,127 @@ app.add_middleware(
     allow_headers=["*"],  # Permitir todos los encabezados
 )
 
+def is_admin_token(authorization):
+    db = SessionLocal()
+    try:
+        user = users.get_user_from_authorization(authorization, db)
+        return bool(user and user.is_admin)
+    finally:
+        db.close()
+
+# Idempotency-Key en las escrituras de carritos y productos (ver idempotency.py).
+# Es el middleware más interno: la transacción que abre envuelve solo al manejador.
+@app.middleware("http")
+async def idempotency_keys(request: Request, call_next):
+    return await idempotency.handle(request, call_next)
+
+# Perfilar con cProfile las peticiones de administradores que envían "X-Profile: 1".
+# Se perfila el hilo del bucle de eventos: las dependencias síncronas (get_db) corren en
+# el threadpool y no aparecen, y otras peticiones concurrentes pueden colarse en el perfil.
+@app.middleware("http")
+async def request_profile(request: Request, call_next):
+    if request.headers.get(profiling.PROFILE_HEADER) != "1":
+        return await call_next(request)
+    if not await run_in_threadpool(is_admin_token, request.headers.get("Authorization")):
+        return await call_next(request)
+
+    profiler = profiling.request_profiles.start()
+    if profiler is None:
+        response = await call_next(request)
+        response.headers["X-Profile-Status"] = "busy"
+        return response
+    profile_id = request_id_var.get() or f"{time.time():.6f}"
+    try:
+        response = await call_next(request)
+    finally:
+        profiling.request_profiles.finish(profiler, profile_id, f"{request.method} {request.url.path}")
+    response.headers["X-Profile-ID"] = profile_id
+    return response
+
+# Asignar un request id y un span raíz a cada petición y registrar el acceso
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    root_span = start_trace(
+        f"{request.method} {request.url.path}",
+        traceparent=request.headers.get("traceparent"),
+        request_id=request.headers.get("X-Request-ID"),
+        attributes={"service.route": request.url.path},
+    )
+    request_id = request.headers.get("X-Request-ID") or root_span.trace_id
+    token = request_id_var.set(request_id)
+    span_token = current_span.set(root_span)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        root_span.attributes["http.status_code"] = status_code
+        root_span.finish()
+        access_logger.info("request", extra={"fields": {
+            "method": request.method,
+            "path": request.url.path,
+            "status": status_code,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            "trace_id": root_span.trace_id,
+        }})
+        current_span.reset(span_token)
+        request_id_var.reset(token)
+
+# Invalidación de cachés entre procesos y réplicas (solo con PostgreSQL)
+invalidation_listener = InvalidationListener(engine) if engine.dialect.name == "postgresql" else None
+
+# Las mismas notificaciones alimentan el stream SSE de cambios de productos
+on_notification(lambda message: publish_product_changes(message, SessionLocal))
+# y mantienen al día el autocompletado con los cambios hechos en otras réplicas
+if autocomplete.AUTOCOMPLETE_ENABLED:
+    on_notification(lambda message: autocomplete.refresh_products(message, SessionLocal))
+
+# Tareas periódicas en segundo plano (estado en GET /api/v1/admin/jobs):
+# retirada de productos borrados (archiver.py), caducidad de carritos (cart_expiry.py)
+# rollups de actividad de carritos (rollups.py) y los índices en memoria de
+# recomendaciones (recommender.py) y autocompletado (autocomplete.py), que se
+# construyen al arrancar
+if ARCHIVE_ENABLED:
+    PeriodicJob("product-archiver", archive_all, ARCHIVE_INTERVAL_SECONDS, ARCHIVE_WINDOW)
+if CART_EXPIRY_ENABLED:
+    PeriodicJob("cart-expiry", expire_carts, CART_EXPIRY_INTERVAL_SECONDS, CART_EXPIRY_WINDOW)
+if ROLLUP_ENABLED:
+    PeriodicJob("cart-rollups", roll_up, ROLLUP_INTERVAL_SECONDS)
+if RECOMMENDER_ENABLED:
+    PeriodicJob("recommender-rebuild", rebuild_index, RECOMMENDER_REBUILD_SECONDS, run_at_start=True)
+if autocomplete.AUTOCOMPLETE_ENABLED:
+    PeriodicJob("autocomplete-rebuild", autocomplete.rebuild_index, autocomplete.AUTOCOMPLETE_REBUILD_SECONDS,
+                run_at_start=True)
+
+@app.on_event("startup")
+async def start_invalidation_listener():
+    product_events.attach(asyncio.get_running_loop())
+    if invalidation_listener is not None:
+        invalidation_listener.start()
+    for job in job_registry.jobs:
+        job.start()
+
+@app.on_event("shutdown")
+async def stop_invalidation_listener():
+    # Cerrar los streams SSE para no retrasar el apagado ordenado
+    product_events.close()
+    if invalidation_listener is not None:
+        await run_in_threadpool(invalidation_listener.stop)
+    for job in job_registry.jobs:
+        await run_in_threadpool(job.stop)
+
 # Incluir los routers
 app.include_router(users.router, prefix="/api/v1/users", tags=["users"])
 app.include_router(products.router, prefix="/api/v1/products", tags=["products"])
 app.include_router(carts.router, prefix="/api/v1/carts", tags=["carts"])
 app.include_router(admin_router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(stats_router, prefix="/api/v1/admin/stats", tags=["admin"])
+app.include_router(events_router, prefix="/api/v1/events", tags=["events"])
+app.include_router(batch_router, prefix="/api/v1/batch", tags=["batch"])
+app.include_router(profiling_router, prefix="/api/v1/admin/profiling", tags=["profiling"])
 
 @app.get("/")
 async def root():
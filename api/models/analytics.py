@@ -0,0 +1,59 @@
+from sqlalchemy import BigInteger, Column, Date, DateTime, Index, Integer, Numeric, String
+from sqlalchemy.sql import func
+from database import Base
+
+class CartEvent(Base):
+    # Cambio en un carrito (alta o baja de unidades), registrado en la misma transacción
+    __tablename__ = "cart_events"
+
+    # BigInteger en PostgreSQL; en SQLite solo INTEGER PRIMARY KEY es autoincremental
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    occurred_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    kind = Column(String(10), nullable=False)  # "add" | "remove"
+    user_id = Column(Integer, nullable=False)
+    cart_id = Column(Integer, nullable=False)
+    product_id = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    # Precio del producto en el momento del cambio (para estimar ingresos)
+    unit_price = Column(Numeric(10, 2), nullable=True)
+
+    # Recuento de usuarios únicos de los buckets que cambian (ver rollups.py)
+    __table_args__ = (Index("idx_cart_events_product_time", "product_id", "occurred_at"),)
+
+
+class CartActivityHourly(Base):
+    # Actividad de carritos por producto y hora (UTC), mantenida por rollups.py
+    __tablename__ = "cart_activity_hourly"
+
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    additions = Column(Integer, nullable=False, default=0)
+    removals = Column(Integer, nullable=False, default=0)
+    quantity_added = Column(Integer, nullable=False, default=0)
+    quantity_removed = Column(Integer, nullable=False, default=0)
+    unique_users = Column(Integer, nullable=False, default=0)
+    # Valor neto añadido a carritos (unidades añadidas - quitadas, al precio del momento)
+    revenue_estimate = Column(Numeric(14, 2), nullable=False, default=0)
+
+
+class CartActivityDaily(Base):
+    # Igual que CartActivityHourly, por día (UTC)
+    __tablename__ = "cart_activity_daily"
+
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    additions = Column(Integer, nullable=False, default=0)
+    removals = Column(Integer, nullable=False, default=0)
+    quantity_added = Column(Integer, nullable=False, default=0)
+    quantity_removed = Column(Integer, nullable=False, default=0)
+    unique_users = Column(Integer, nullable=False, default=0)
+    revenue_estimate = Column(Numeric(14, 2), nullable=False, default=0)
+
+
+class RollupWatermark(Base):
+    # Último cart_events.id incorporado a los rollups: cada ejecución solo lee lo nuevo
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    last_event_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -6,10 +6,13 @@ from database import Base
 class Cart(Base):
     # Define la tabla de carritos
     __tablename__ = "carts"
+    # Mismo nombre que en database/schema.sql
+    __table_args__ = (Index("idx_carts_updated_at", "updated_at"),)
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Última modificación de sus items (routes/carts.py): los carritos inactivos caducan (cart_expiry.py)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relaciona el carrito con el usuario y los items del carrito
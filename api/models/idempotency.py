@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, SmallInteger, Text, LargeBinary, DateTime
+from database import Base
+
+class IdempotencyKey(Base):
+    # Respuestas guardadas por Idempotency-Key (ver idempotency.py)
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(64), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(SmallInteger, nullable=True)  # NULL = petición original en curso
+    headers = Column(Text, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey(key='{self.key}', status_code={self.status_code})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, Index
 from sqlalchemy.sql import func
 from database import Base
 
@@ -13,7 +13,42 @@ class Product(Base):
     stock = Column(Integer, nullable=False, default=0)
     image_url = Column(String(255), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Contador de versión: cada UPDATE lo incrementa y comprueba (control de concurrencia optimista)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Borrado lógico: el producto sale del catálogo y el archivador lo retira después (ver archiver.py)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+
+    __mapper_args__ = {"version_id_col": version}
+
+    # Índices parciales (los mismos que en database/schema.sql): el catálogo solo
+    # recorre productos vivos y el archivador solo los retirados
+    __table_args__ = (
+        Index("idx_products_active_id", "id",
+              postgresql_where=deleted_at.is_(None), sqlite_where=deleted_at.is_(None)),
+        Index("idx_products_active_name", "name",
+              postgresql_where=deleted_at.is_(None), sqlite_where=deleted_at.is_(None)),
+        Index("idx_products_deleted_at", "deleted_at",
+              postgresql_where=deleted_at.isnot(None), sqlite_where=deleted_at.isnot(None)),
+    )
     
     # Representa el objeto Product como una cadena
     def __repr__(self):
-        return f"<Product(id={self.id}, name='{self.name}', price={self.price}, stock={self.stock})>"
\ No newline at end of file
+        return f"<Product(id={self.id}, name='{self.name}', price={self.price}, stock={self.stock})>"
+
+# Condición de "producto en el catálogo" para filtros y UPDATE masivos
+active_product = Product.deleted_at.is_(None)
+
+
+class ProductArchive(Base):
+    # Productos retirados que el archivador sacó de la tabla products
+    __tablename__ = "products_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(100), nullable=False)
+    description = Column(String, nullable=True)
+    price = Column(Numeric(10, 2), nullable=False)
+    stock = Column(Integer, nullable=False, default=0)
+    image_url = Column(String(255), nullable=True)
+    created_at = Column(DateTime(timezone=True))
+    deleted_at = Column(DateTime(timezone=True), nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
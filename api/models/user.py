@@ -14,6 +14,10 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Contador de versión: cada UPDATE lo incrementa y comprueba (control de concurrencia optimista)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
     
     # relación inversa con Cart:
     carts = relationship("Cart", back_populates="user", cascade="all, delete-orphan")
@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import select
+from database import SessionLocal
+from models.cart import CartItem
+
+# Configuración de las recomendaciones "comprados juntos" (variables de entorno)
+RECOMMENDER_ENABLED = os.getenv("RECOMMENDER_ENABLED", "true").lower() == "true"
+# Vecinos precalculados por producto (máximo que devuelve /products/{id}/related)
+RECOMMENDER_TOP_K = int(os.getenv("RECOMMENDER_TOP_K", "20"))
+# Reconstrucción completa desde cart_items: corrige la deriva entre réplicas (cada
+# una solo aplica los incrementos de sus propias peticiones) y los items borrados
+RECOMMENDER_REBUILD_SECONDS = float(os.getenv("RECOMMENDER_REBUILD_SECONDS", "3600"))
+# Carritos con más líneas no cuentan: generan n² pares y dicen poco de cada producto
+RECOMMENDER_MAX_CART_LINES = int(os.getenv("RECOMMENDER_MAX_CART_LINES", "100"))
+# Filas de cart_items leídas por bloque en la reconstrucción
+RECOMMENDER_FETCH_ROWS = int(os.getenv("RECOMMENDER_FETCH_ROWS", "100000"))
+# Pares generados por tramo de carritos (acota la memoria de la reconstrucción)
+RECOMMENDER_CHUNK_PAIRS = int(os.getenv("RECOMMENDER_CHUNK_PAIRS", "5000000"))
+
+
+def load_cart_lines(db):
+    """
+    (cart_ids, product_ids, item_ids) de cart_items ordenados por carrito, como
+    arrays int64. item_ids identifica las líneas que ya cuenta la reconstrucción.
+    """
+    result = db.execute(
+        select(CartItem.cart_id, CartItem.product_id, CartItem.id)
+        .order_by(CartItem.cart_id, CartItem.product_id)
+        .execution_options(yield_per=RECOMMENDER_FETCH_ROWS)
+    )
+    chunks = [np.array(rows, dtype=np.int64) for rows in result.partitions()]
+    lines = np.concatenate(chunks) if chunks else np.empty((0, 3), dtype=np.int64)
+    return lines[:, 0], lines[:, 1], lines[:, 2]
+
+
+def cart_pairs(product_ids, starts, sizes, width):
+    """
+    Claves a * width + b de todos los pares de líneas de los carritos indicados
+    (inicio y tamaño en product_ids). Vectorizado: cada línea se repite tantas
+    veces como líneas tiene su carrito y se empareja con todas ellas.
+    """
+    lines = np.repeat(starts, sizes) + (np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes))
+    line_starts = np.repeat(starts, sizes)
+    line_sizes = np.repeat(sizes, sizes)
+    left = np.repeat(lines, line_sizes)
+    right = np.repeat(line_starts, line_sizes) + (
+        np.arange(len(left)) - np.repeat(np.cumsum(line_sizes) - line_sizes, line_sizes)
+    )
+    a, b = product_ids[left], product_ids[right]
+    distinct = a != b
+    return a[distinct] * width + b[distinct]
+
+
+def co_occurrences(cart_ids, product_ids, max_cart_lines=RECOMMENDER_MAX_CART_LINES,
+                   chunk_pairs=RECOMMENDER_CHUNK_PAIRS):
+    """
+    Pares (a, b, carritos) de productos distintos que comparten carrito,
+    ordenados por (a, b); cart_ids debe venir ordenado. Los carritos se procesan
+    en tramos de como mucho chunk_pairs pares (la memoria no crece con la tabla)
+    y los recuentos de cada tramo se combinan al final.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if len(cart_ids) == 0:
+        return empty, empty, empty
+    starts = np.flatnonzero(np.r_[True, cart_ids[1:] != cart_ids[:-1]])
+    sizes = np.diff(np.r_[starts, len(cart_ids)])
+    keep = (sizes > 1) & (sizes <= max_cart_lines)
+    starts, sizes = starts[keep], sizes[keep]
+    if len(sizes) == 0:
+        return empty, empty, empty
+
+    width = int(product_ids.max()) + 1
+    pair_totals = np.cumsum(sizes * sizes)
+    keys, counts = [], []
+    first, done = 0, 0
+    while first < len(sizes):
+        last = max(int(np.searchsorted(pair_totals, done + chunk_pairs, side="right")), first + 1)
+        chunk_keys, chunk_counts = np.unique(
+            cart_pairs(product_ids, starts[first:last], sizes[first:last], width), return_counts=True
+        )
+        keys.append(chunk_keys)
+        counts.append(chunk_counts)
+        first, done = last, int(pair_totals[last - 1])
+
+    if len(keys) == 1:
+        keys, counts = keys[0], counts[0]
+    else:
+        keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+    return keys // width, keys % width, counts
+
+
+class CoOccurrenceIndex:
+    """
+    Matriz dispersa producto x producto (veces que dos productos coinciden en
+    un carrito) y, por producto, sus K vecinos con más coincidencias.
+
+    La matriz base sale de la reconstrucción en bloque (CSR con arrays NumPy);
+    los incrementos posteriores se acumulan en delta. Como los recuentos solo
+    crecen, un producto solo puede entrar en el top-K de otro cuando sube su
+    propio recuento, así que cada incremento actualiza el top-K en O(K) sin
+    recorrer la fila. La consulta devuelve el top-K precalculado: O(K).
+    """
+
+    def __init__(self, top_k):
+        self.top_k = top_k
+        self.lock = threading.Lock()
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.neighbors = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.delta = {}
+        self.top = {}
+        # Incrementos recibidos durante una reconstrucción (se reaplican al terminar)
+        self.pending = None
+        self.built_at = None
+
+    def base_count(self, a, b):
+        if a + 1 >= len(self.indptr):
+            return 0
+        start, end = self.indptr[a], self.indptr[a + 1]
+        position = start + np.searchsorted(self.neighbors[start:end], b)
+        return int(self.counts[position]) if position < end and self.neighbors[position] == b else 0
+
+    def bump(self, a, b):
+        """Suma una coincidencia (a, b) y mantiene el top-K de a"""
+        extra = self.delta.get((a, b), 0) + 1
+        self.delta[(a, b)] = extra
+        count = self.base_count(a, b) + extra
+        top = self.top.setdefault(a, [])
+        for position, (_, neighbor) in enumerate(top):
+            if neighbor == b:
+                top[position] = (count, b)
+                break
+        else:
+            if len(top) < self.top_k:
+                top.append((count, b))
+            elif (count, -b) > (top[-1][0], -top[-1][1]):
+                top[-1] = (count, b)
+            else:
+                return
+        top.sort(key=lambda entry: (-entry[0], entry[1]))
+
+    def observe(self, product_id, other_product_ids, item_id=None):
+        """Un producto nuevo (línea item_id) en un carrito que ya tenía other_product_ids"""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((item_id, product_id, other_product_ids))
+            for other in other_product_ids:
+                if other != product_id:
+                    self.bump(product_id, other)
+                    self.bump(other, product_id)
+
+    def related(self, product_id, limit):
+        """[(producto, coincidencias)] de mayor a menor, como mucho limit"""
+        with self.lock:
+            return [(neighbor, count) for count, neighbor in self.top.get(product_id, ())[:limit]]
+
+    def build(self, a, b, counts):
+        """
+        Estructuras nuevas a partir de los pares (a, b, veces) de co_occurrences,
+        ordenados por (a, b). No toca el índice en uso.
+        """
+        width = int(max(a.max(), b.max())) + 1 if len(a) else 0
+        indptr = np.zeros(width + 1, dtype=np.int64)
+        np.cumsum(np.bincount(a, minlength=width), out=indptr[1:])
+
+        # Top-K por fila: orden (a, -veces, b) y rango dentro de cada fila
+        order = np.lexsort((b, -counts, a))
+        ranked_a = a[order]
+        rank = np.arange(len(order)) - indptr[ranked_a]
+        selected = order[rank < self.top_k]
+        rows = a[selected]
+        boundaries = np.flatnonzero(rows[1:] != rows[:-1]) + 1
+        top = {
+            int(product): list(zip(row_counts.tolist(), row_neighbors.tolist()))
+            for product, row_counts, row_neighbors in zip(
+                rows[np.r_[0, boundaries]] if len(rows) else [],
+                np.split(counts[selected], boundaries),
+                np.split(b[selected], boundaries),
+            )
+        }
+        return indptr, b, counts, top
+
+    def start_rebuild(self):
+        with self.lock:
+            self.pending = []
+
+    def finish_rebuild(self, structures, counted_item_ids=None):
+        """
+        Sustituye el índice y reaplica los incrementos llegados mientras tanto,
+        salvo los de líneas que ya leyó la reconstrucción (counted_item_ids,
+        ordenado): su commit fue anterior a la lectura y ya están en structures.
+        """
+        with self.lock:
+            pending, self.pending = self.pending or [], None
+            if structures is None:
+                return
+            self.indptr, self.neighbors, self.counts, self.top = structures
+            self.delta = {}
+            self.built_at = datetime.now(timezone.utc)
+            if counted_item_ids is not None and len(counted_item_ids) and pending:
+                item_ids = np.array([entry[0] if entry[0] is not None else -1 for entry in pending], dtype=np.int64)
+                positions = np.minimum(np.searchsorted(counted_item_ids, item_ids), len(counted_item_ids) - 1)
+                counted = counted_item_ids[positions] == item_ids
+                pending = [entry for entry, skip in zip(pending, counted.tolist()) if not skip]
+            for _, product_id, others in pending:
+                for other in others:
+                    if other != product_id:
+                        self.bump(product_id, other)
+                        self.bump(other, product_id)
+
+    def stats(self):
+        with self.lock:
+            return {"products": len(self.top), "pairs": len(self.neighbors), "incremental_pairs": len(self.delta),
+                    "built_at": self.built_at.isoformat() if self.built_at else None}
+
+
+index = CoOccurrenceIndex(RECOMMENDER_TOP_K)
+
+
+def rebuild_index(should_continue=lambda: True, pause=time.sleep):
+    """
+    Reconstruye el índice completo desde cart_items; devuelve los contadores.
+    Los incrementos se empiezan a guardar antes de leer cart_items (no se pierde
+    ninguno) y al terminar se descartan los de líneas que la lectura ya incluía.
+    """
+    index.start_rebuild()
+    structures = counted_item_ids = None
+    try:
+        db = SessionLocal()
+        try:
+            cart_ids, product_ids, item_ids = load_cart_lines(db)
+        finally:
+            db.close()
+        a, b, counts = co_occurrences(cart_ids, product_ids)
+        structures = index.build(a, b, counts)
+        counted_item_ids = np.sort(item_ids)
+    finally:
+        index.finish_rebuild(structures, counted_item_ids)
+    return {"cart_lines": int(len(cart_ids)), "pairs": int(len(a)), "products": len(structures[3])}
@@ -0,0 +1,202 @@
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from itertools import takewhile
+from sqlalchemy import delete, func, select
+from database import SessionLocal, engine
+from models.analytics import CartActivityDaily, CartActivityHourly, CartEvent, RollupWatermark
+
+# Configuración de los rollups de actividad de carritos (variables de entorno)
+ROLLUP_ENABLED = os.getenv("ROLLUP_ENABLED", "true").lower() == "true"
+ROLLUP_INTERVAL_SECONDS = float(os.getenv("ROLLUP_INTERVAL_SECONDS", "60"))
+# Eventos leídos por transacción
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", "5000"))
+# Los eventos más recientes (según el reloj de la base de datos) se dejan para la
+# siguiente ejecución: así una transacción que aún no confirmó su evento (con un id
+# menor) no queda por detrás del watermark
+ROLLUP_LAG_SECONDS = float(os.getenv("ROLLUP_LAG_SECONDS", "30"))
+# Días que se conservan los eventos ya incorporados (al menos 2: el recuento de
+# usuarios únicos de un día vuelve a leer los eventos de ese día)
+CART_EVENTS_RETENTION_DAYS = max(float(os.getenv("CART_EVENTS_RETENTION_DAYS", "14")), 2)
+
+WATERMARK = "cart_activity"
+SUM_COLUMNS = ("additions", "removals", "quantity_added", "quantity_removed", "revenue_estimate")
+
+
+def upsert(table):
+    """INSERT ... ON CONFLICT del dialecto (mismo API en PostgreSQL y SQLite)"""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def as_utc(value):
+    # SQLite devuelve fechas sin zona (CURRENT_TIMESTAMP es UTC)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def hour_of(value):
+    return as_utc(value).replace(minute=0, second=0, microsecond=0)
+
+
+def empty_counters():
+    return {"additions": 0, "removals": 0, "quantity_added": 0, "quantity_removed": 0,
+            "revenue_estimate": Decimal("0")}
+
+
+def aggregate(events):
+    """Suma los eventos por (hora, producto) y (día, producto)"""
+    hourly = defaultdict(empty_counters)
+    daily = defaultdict(empty_counters)
+    for event in events:
+        value = (event.unit_price or Decimal("0")) * event.quantity
+        hour = hour_of(event.occurred_at)
+        for counters in (hourly[(hour, event.product_id)], daily[(hour.date(), event.product_id)]):
+            if event.kind == "add":
+                counters["additions"] += 1
+                counters["quantity_added"] += event.quantity
+                counters["revenue_estimate"] += value
+            else:
+                counters["removals"] += 1
+                counters["quantity_removed"] += event.quantity
+                counters["revenue_estimate"] -= value
+    return hourly, daily
+
+
+def unique_users(db, last_id, product_ids, since):
+    """
+    Usuarios distintos por (hora, producto) y (día, producto) desde since. No
+    se puede sumar por lotes (un usuario repetido contaría dos veces), así que
+    se recuentan solo los buckets que cambiaron, con los eventos hasta last_id.
+    """
+    hourly = defaultdict(set)
+    daily = defaultdict(set)
+    rows = db.execute(
+        select(CartEvent.user_id, CartEvent.product_id, CartEvent.occurred_at)
+        .where(CartEvent.product_id.in_(product_ids), CartEvent.occurred_at >= since, CartEvent.id <= last_id)
+    )
+    for user_id, product_id, occurred_at in rows:
+        hour = hour_of(occurred_at)
+        hourly[(hour, product_id)].add(user_id)
+        daily[(hour.date(), product_id)].add(user_id)
+    return hourly, daily
+
+
+def merge(db, model, bucket, counters, users):
+    """Suma los contadores nuevos a las filas del rollup (las crea si no existen)"""
+    table = model.__table__
+    statement = upsert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[bucket, "product_id"],
+        set_=dict(
+            {name: table.c[name] + statement.excluded[name] for name in SUM_COLUMNS},
+            unique_users=statement.excluded.unique_users,
+        ),
+    )
+    db.execute(statement, [
+        dict(values, **{bucket: key[0], "product_id": key[1], "unique_users": len(users.get(key, ()))})
+        for key, values in counters.items()
+    ])
+
+
+def ensure_watermark():
+    db = SessionLocal()
+    try:
+        db.execute(upsert(RollupWatermark.__table__)
+                   .values(name=WATERMARK, last_event_id=0)
+                   .on_conflict_do_nothing(index_elements=["name"]))
+        db.commit()
+    finally:
+        db.close()
+
+
+def roll_up_batch(db):
+    """
+    Incorpora a los rollups el siguiente lote de eventos posteriores al
+    watermark, en una transacción. None si otra réplica tiene el watermark.
+    """
+    # SKIP LOCKED sobre el watermark: una sola réplica agrega a la vez y las demás no esperan
+    watermark = db.execute(
+        select(RollupWatermark).where(RollupWatermark.name == WATERMARK).with_for_update(skip_locked=True)
+    ).scalar_one_or_none()
+    if watermark is None:
+        db.rollback()
+        return None
+
+    # occurred_at lo pone la base de datos: el corte se calcula con su reloj
+    cutoff = as_utc(db.execute(select(func.now())).scalar_one()) - timedelta(seconds=ROLLUP_LAG_SECONDS)
+    rows = db.execute(
+        select(CartEvent.id, CartEvent.kind, CartEvent.user_id, CartEvent.product_id,
+               CartEvent.quantity, CartEvent.unit_price, CartEvent.occurred_at)
+        .where(CartEvent.id > watermark.last_event_id)
+        .order_by(CartEvent.id)
+        .limit(ROLLUP_BATCH_SIZE)
+    ).all()
+    # Solo el tramo contiguo de ids anterior al primer evento reciente: el evento de
+    # una transacción larga (id mayor pero occurred_at antiguo, now() es el inicio de
+    # la transacción) no puede adelantar el watermark por encima de uno más reciente
+    events = list(takewhile(lambda event: as_utc(event.occurred_at) <= cutoff, rows))
+    if not events:
+        db.rollback()
+        return 0
+
+    last_id = events[-1].id
+    hourly, daily = aggregate(events)
+    since = datetime.combine(min(day for day, _ in daily), datetime.min.time(), tzinfo=timezone.utc)
+    hourly_users, daily_users = unique_users(db, last_id, {product_id for _, product_id in daily}, since)
+    merge(db, CartActivityHourly, "hour", hourly, hourly_users)
+    merge(db, CartActivityDaily, "day", daily, daily_users)
+
+    watermark.last_event_id = last_id
+    watermark.updated_at = func.now()
+    db.commit()
+    return len(events)
+
+
+def purge_events(db, now, batch_size):
+    """Borra un lote de eventos ya incorporados y más antiguos que la retención"""
+    watermark = db.execute(
+        select(RollupWatermark.last_event_id).where(RollupWatermark.name == WATERMARK)
+    ).scalar_one_or_none() or 0
+    old = (
+        select(CartEvent.id)
+        .where(CartEvent.id <= watermark,
+               CartEvent.occurred_at < now - timedelta(days=CART_EVENTS_RETENTION_DAYS))
+        .order_by(CartEvent.id)
+        .limit(batch_size)
+    )
+    result = db.execute(delete(CartEvent).where(CartEvent.id.in_(old.scalar_subquery())))
+    db.commit()
+    return result.rowcount
+
+
+def roll_up(now=None, should_continue=lambda: True, pause=time.sleep):
+    """Incorpora todos los eventos pendientes por lotes y purga los antiguos"""
+    now = now or datetime.now(timezone.utc)
+    totals = {"events": 0, "batches": 0, "purged": 0}
+    ensure_watermark()
+    db = SessionLocal()
+    try:
+        while should_continue():
+            processed = roll_up_batch(db)
+            if not processed:
+                break
+            totals["events"] += processed
+            totals["batches"] += 1
+            if processed < ROLLUP_BATCH_SIZE:
+                break
+        while should_continue():
+            purged = purge_events(db, now, ROLLUP_BATCH_SIZE)
+            totals["purged"] += purged
+            if purged < ROLLUP_BATCH_SIZE:
+                break
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return totals
@@ -1,12 +1,35 @@
 # api/routes/admin.py
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+import os
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query, Header, Response
+from pydantic import BaseModel
+from sqlalchemy import Integer, Numeric, column, func, or_, select, update
 from sqlalchemy.orm import Session
-from database import get_db
+from database import after_commit, get_db
 from models.user import User
-from models.product import Product
+from models.product import Product, active_product
+from models.cart import CartItem
+from fields import FieldSet
+from cache import TTLCache, registry as cache_registry
+from jobs import registry as job_registry
+from routes.users import require_admin
+from bulk import ADMIN_BULK_MAX_ITEMS, values_subquery
+from concurrency import add_stock, check_version, commit_versioned, etag, versioned
+import autocomplete
 
 router = APIRouter()
 
+# Resumen del panel: segundos en caché, umbral de stock bajo y productos listados
+ADMIN_SUMMARY_CACHE_SECONDS = float(os.getenv("ADMIN_SUMMARY_CACHE_SECONDS", "10"))
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", "10"))
+LOW_STOCK_LIMIT = 20
+# Filas máximas por página de los listados del panel
+ADMIN_PAGE_MAX = 500
+
+# Depende de varias tablas: se acota por TTL en vez de invalidarse por LISTEN/NOTIFY
+summary_cache = TTLCache("admin_summary", None, ttl=ADMIN_SUMMARY_CACHE_SECONDS, max_entries=1)
+
 def serialize_user(user: User) -> dict:
     return {
         'id': user.id,
@@ -14,7 +37,8 @@ def serialize_user(user: User) -> dict:
         'email': user.email,
         'is_admin': user.is_admin,
         'is_active': user.is_active,
-        'created_at': user.created_at.isoformat() if user.created_at else None
+        'created_at': user.created_at.isoformat() if user.created_at else None,
+        'version': user.version
     }
 
 def serialize_product(product: Product) -> dict:
@@ -25,20 +49,137 @@ def serialize_product(product: Product) -> dict:
         'price': float(product.price) if product.price is not None else None,
         'stock': product.stock,
         'image_url': product.image_url,
-        'created_at': product.created_at.isoformat() if product.created_at else None
+        'created_at': product.created_at.isoformat() if product.created_at else None,
+        'version': product.version
+    }
+
+def isoformat_or_none(value):
+    return value.isoformat() if value else None
+
+def float_or_none(value):
+    return float(value) if value is not None else None
+
+# Campos seleccionables con ?fields= (mismo formato que serialize_user / serialize_product)
+user_fields = FieldSet(User, {
+    'id': None,
+    'username': None,
+    'email': None,
+    'is_admin': None,
+    'is_active': None,
+    'created_at': isoformat_or_none,
+    'version': None,
+})
+
+product_fields = FieldSet(Product, {
+    'id': None,
+    'name': None,
+    'description': None,
+    'price': float_or_none,
+    'stock': None,
+    'image_url': None,
+    'created_at': isoformat_or_none,
+    'version': None,
+})
+
+# Estado de las cachés en proceso de esta réplica (aciertos, invalidaciones, listener activo)
+@router.get("/cache", tags=["admin"], dependencies=[Depends(require_admin)])
+async def get_cache_stats():
+    return cache_registry.stats()
+
+# Tareas periódicas de esta réplica: última ejecución, duración y filas borradas
+@router.get("/jobs", tags=["admin"], dependencies=[Depends(require_admin)])
+async def get_job_stats():
+    return job_registry.stats()
+
+def load_summary(db) -> dict:
+    """Contadores del panel con unas pocas consultas de agregación (sin traer filas)"""
+    users = db.execute(
+        select(func.count(), func.count().filter(User.is_admin), func.count().filter(User.is_active))
+        .select_from(User)
+    ).one()
+    products = db.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(Product.stock), 0),
+            func.coalesce(func.sum(Product.price * Product.stock), 0),
+            func.count().filter(Product.stock <= LOW_STOCK_THRESHOLD),
+        ).where(active_product)
+    ).one()
+    low_stock = db.execute(
+        select(Product.id, Product.name, Product.stock)
+        .where(active_product, Product.stock <= LOW_STOCK_THRESHOLD)
+        .order_by(Product.stock.asc(), Product.id.asc())
+        .limit(LOW_STOCK_LIMIT)
+    ).all()
+    # Carritos abiertos: los que tienen algún producto del catálogo
+    carts = db.execute(
+        select(
+            func.count(func.distinct(CartItem.cart_id)),
+            func.count(),
+            func.coalesce(func.sum(CartItem.quantity), 0),
+            func.coalesce(func.sum(CartItem.quantity * Product.price), 0),
+        )
+        .select_from(CartItem)
+        .join(Product, Product.id == CartItem.product_id)
+        .where(active_product)
+    ).one()
+    return {
+        "users": {"total": users[0], "admins": users[1], "active": users[2]},
+        "products": {
+            "total": products[0],
+            "units_in_stock": int(products[1]),
+            "inventory_value": float(products[2]),
+            "low_stock_threshold": LOW_STOCK_THRESHOLD,
+            "low_stock_count": products[3],
+            "low_stock": [{"id": row.id, "name": row.name, "stock": row.stock} for row in low_stock],
+        },
+        "carts": {
+            "open": carts[0],
+            "items": carts[1],
+            "units": int(carts[2]),
+            "value": float(carts[3]),
+        },
+        "generated_at": datetime.now(timezone.utc).isoformat(),
     }
 
-# Obtener todos los usuarios (admins arriba, id asc)
+# Resumen del panel (usuarios, inventario, stock bajo, carritos abiertos); caché de unos segundos
+@router.get("/summary", tags=["admin"], dependencies=[Depends(require_admin)])
+async def get_summary(db: Session = Depends(get_db)):
+    summary = summary_cache.get("summary")
+    if summary is None:
+        summary = load_summary(db)
+        summary_cache.set("summary", summary)
+    return summary
+
+# Obtener todos los usuarios (admins arriba, id asc; ?fields= limita las columnas;
+# ?limit=&offset= pagina el listado)
 @router.get("/users", tags=["admin"])
-async def get_all_users(db: Session = Depends(get_db)):
-    users = db.query(User).order_by(User.is_admin.desc(), User.id.asc()).all()
-    return [serialize_user(user) for user in users]
+async def get_all_users(
+    fields: str = Query(None),
+    limit: int = Query(None, ge=1, le=ADMIN_PAGE_MAX),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    names = user_fields.parse(fields)
+    query = user_fields.query(db, names).order_by(User.is_admin.desc(), User.id.asc())
+    if limit is not None:
+        query = query.limit(limit).offset(offset)
+    return [user_fields.to_dict(row, names) for row in query.all()]
 
-# Obtener todos los productos (orden estable por id asc)
+# Obtener todos los productos (orden estable por id asc; ?fields= limita las columnas;
+# ?limit=&offset= pagina el listado)
 @router.get("/products", tags=["admin"])
-async def get_all_products(db: Session = Depends(get_db)):
-    products = db.query(Product).order_by(Product.id.asc()).all()
-    return [serialize_product(product) for product in products]
+async def get_all_products(
+    fields: str = Query(None),
+    limit: int = Query(None, ge=1, le=ADMIN_PAGE_MAX),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    names = product_fields.parse(fields)
+    query = product_fields.query(db, names).filter(active_product).order_by(Product.id.asc())
+    if limit is not None:
+        query = query.limit(limit).offset(offset)
+    return [product_fields.to_dict(row, names) for row in query.all()]
 
 # Crear producto (aceptar JSON en el cuerpo)
 @router.post("/products", tags=["admin"], status_code=201)
@@ -60,28 +201,37 @@ async def create_product(
     db.add(product)
     db.commit()
     db.refresh(product)
+    after_commit(db, autocomplete.product_saved, product.id, product.name, product.stock)
 
     # Devolver el producto creado y la lista completa ordenada para que la UI pueda refrescar
-    products = db.query(Product).order_by(Product.id.asc()).all()
+    products = db.query(Product).filter(active_product).order_by(Product.id.asc()).all()
     return {
         "product": serialize_product(product),
         "products": [serialize_product(p) for p in products]
     }
 
-# Actualizar producto (aceptar JSON en el cuerpo)
+# Actualizar producto (aceptar JSON en el cuerpo).
+# If-Match con la versión leída evita pisar cambios de otro administrador (409);
+# stock_delta suma al stock de forma atómica en vez de fijarlo.
 @router.put("/products/{product_id}", tags=["admin"])
 async def update_product(
     product_id: int,
+    response: Response,
     name: str = Body(None),
     description: str = Body(None),
     price: float = Body(None),
     stock: int = Body(None),
+    stock_delta: int = Body(None),
     image_url: str = Body(None),
+    if_match: str = Header(None),
     db: Session = Depends(get_db)
 ):
-    product = db.query(Product).filter(Product.id == product_id).first()
+    if stock is not None and stock_delta is not None:
+        raise HTTPException(status_code=400, detail="stock y stock_delta son excluyentes")
+    product = db.query(Product).filter(Product.id == product_id, active_product).first()
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
+    expected_version = check_version(if_match, product)
     
     if name is not None:
         product.name = name
@@ -94,28 +244,37 @@ async def update_product(
     if image_url is not None:
         product.image_url = image_url
     
-    db.commit()
+    with versioned(db):
+        if stock_delta:
+            # Primero los demás campos (con su comprobación de versión), luego el delta,
+            # que con If-Match también exige la versión (la de después del flush)
+            db.flush()
+            add_stock(db, product_id, stock_delta, product.version if expected_version is not None else None)
+        db.commit()
     db.refresh(product)
+    after_commit(db, autocomplete.product_saved, product.id, product.name, product.stock)
+    response.headers["ETag"] = etag(product.version)
 
     # Devolver producto actualizado + lista ordenada
-    products = db.query(Product).order_by(Product.id.asc()).all()
+    products = db.query(Product).filter(active_product).order_by(Product.id.asc()).all()
     return {
         "product": serialize_product(product),
         "products": [serialize_product(p) for p in products]
     }
 
-# Eliminar producto
+# Eliminar producto (borrado lógico: no toca cart_items en la petición; ver archiver.py)
 @router.delete("/products/{product_id}", tags=["admin"])
 async def delete_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.query(Product).filter(Product.id == product_id, active_product).first()
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
-    db.delete(product)
-    db.commit()
+    product.deleted_at = func.now()
+    commit_versioned(db)
+    after_commit(db, autocomplete.products_removed, [product_id])
 
     # Devolver lista ordenada después de la eliminación
-    products = db.query(Product).order_by(Product.id.asc()).all()
+    products = db.query(Product).filter(active_product).order_by(Product.id.asc()).all()
     return {
         "message": "Producto eliminado exitosamente",
         "products": [serialize_product(p) for p in products]
@@ -129,7 +288,7 @@ async def make_user_admin(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
     user.is_admin = True
-    db.commit()
+    commit_versioned(db)
     db.refresh(user)
     
     return {
@@ -145,10 +304,183 @@ async def remove_user_admin(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
     user.is_admin = False
-    db.commit()
+    commit_versioned(db)
     db.refresh(user)
     
     return {
         "message": "Privilegios de administrador removidos exitosamente",
         "user": serialize_user(user)
     }
+
+# --- Operaciones masivas: una sentencia SQL por operación, resultado por fila ---
+
+class ProductPatch(BaseModel):
+    id: int
+    price: Optional[float] = None
+    stock: Optional[int] = None
+    stock_delta: Optional[int] = None
+    # Versión esperada de la fila (como If-Match)
+    version: Optional[int] = None
+
+class ProductBulkUpdate(BaseModel):
+    items: List[ProductPatch]
+    # Todo o nada: si alguna fila falla no se aplica ninguna
+    atomic: bool = False
+
+class ProductBulkDelete(BaseModel):
+    ids: List[int]
+
+class UserBulkAdmin(BaseModel):
+    ids: List[int]
+    is_admin: bool
+
+PATCH_COLUMNS = [
+    column("id", Integer),
+    column("price", Numeric(10, 2)),
+    column("stock", Integer),
+    column("stock_delta", Integer),
+    column("version", Integer),
+]
+
+def check_bulk_size(count):
+    if count == 0:
+        raise HTTPException(status_code=400, detail="La lista está vacía")
+    if count > ADMIN_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Máximo {ADMIN_BULK_MAX_ITEMS} filas por operación")
+
+def invalid_patch(patch: ProductPatch):
+    if patch.price is None and patch.stock is None and patch.stock_delta is None:
+        return "Sin cambios: indica price, stock o stock_delta"
+    if patch.stock is not None and patch.stock_delta is not None:
+        return "stock y stock_delta son excluyentes"
+    if patch.price is not None and patch.price < 0:
+        return "Precio inválido"
+    if patch.stock is not None and patch.stock < 0:
+        return "Stock inválido"
+    return None
+
+def row_error(row_id, status_code, detail):
+    return {"id": row_id, "status": status_code, "detail": detail}
+
+# Actualizar precio/stock de muchos productos con un solo UPDATE ... FROM (VALUES ...)
+@router.post("/products/bulk", tags=["admin"], dependencies=[Depends(require_admin)])
+async def bulk_update_products(payload: ProductBulkUpdate, db: Session = Depends(get_db)):
+    check_bulk_size(len(payload.items))
+    products = Product.__table__
+
+    results = [None] * len(payload.items)
+    valid = {}  # id -> posición en la lista
+    for index, patch in enumerate(payload.items):
+        error = "ID repetido en la lista" if patch.id in valid else invalid_patch(patch)
+        if error:
+            results[index] = row_error(patch.id, 400, error)
+        else:
+            valid[patch.id] = index
+
+    updated = {}
+    if valid and not (payload.atomic and len(valid) < len(payload.items)):
+        patches = values_subquery("patch", PATCH_COLUMNS, [
+            (patch.id, patch.price, patch.stock, patch.stock_delta, patch.version)
+            for patch in (payload.items[index] for index in valid.values())
+        ])
+        new_stock = func.coalesce(patches.c.stock, products.c.stock + func.coalesce(patches.c.stock_delta, 0))
+        statement = (
+            update(products)
+            .where(products.c.id == patches.c.id, products.c.deleted_at.is_(None))
+            .where(or_(patches.c.version.is_(None), products.c.version == patches.c.version))
+            .where(new_stock >= 0)
+            .values(
+                price=func.coalesce(patches.c.price, products.c.price),
+                stock=new_stock,
+                version=products.c.version + 1,
+            )
+            .returning(products.c.id, products.c.price, products.c.stock, products.c.version)
+        )
+        updated = {row.id: row for row in db.execute(statement)}
+
+        # Las filas que el UPDATE no tocó: no existen, otra versión o stock insuficiente
+        missing = [row_id for row_id in valid if row_id not in updated]
+        current = {}
+        if missing:
+            current = {row.id: row for row in db.execute(
+                select(products.c.id, products.c.version).where(products.c.id.in_(missing), products.c.deleted_at.is_(None))
+            )}
+        for row_id, index in valid.items():
+            row = updated.get(row_id)
+            if row is not None:
+                results[index] = {
+                    "id": row_id, "status": 200,
+                    "price": float(row.price), "stock": row.stock, "version": row.version,
+                }
+            elif row_id not in current:
+                results[index] = row_error(row_id, 404, "Producto no encontrado")
+            elif payload.items[index].version not in (None, current[row_id].version):
+                results[index] = row_error(row_id, 409, "El producto fue modificado por otra petición")
+            else:
+                results[index] = row_error(row_id, 409, "Stock insuficiente")
+
+    failed = any(result is None or result["status"] >= 400 for result in results)
+    committed = not (payload.atomic and failed)
+    if committed:
+        db.commit()
+        after_commit(db, autocomplete.stock_changed, {row_id: row.stock for row_id, row in updated.items()})
+    else:
+        db.rollback()
+        results = [
+            result if result is not None and result["status"] >= 400
+            else row_error(payload.items[index].id, 424, "No aplicada: falló otra fila de la lista")
+            for index, result in enumerate(results)
+        ]
+
+    return {
+        "results": results,
+        "updated": len(updated) if committed else 0,
+        "committed": committed,
+    }
+
+# Retirar muchos productos con un solo UPDATE (borrado lógico)
+@router.post("/products/bulk-delete", tags=["admin"], dependencies=[Depends(require_admin)])
+async def bulk_delete_products(payload: ProductBulkDelete, db: Session = Depends(get_db)):
+    check_bulk_size(len(payload.ids))
+    products = Product.__table__
+    ids = list(dict.fromkeys(payload.ids))
+    deleted = set(db.execute(
+        update(products)
+        .where(products.c.id.in_(ids), products.c.deleted_at.is_(None))
+        .values(deleted_at=func.now(), version=products.c.version + 1)
+        .returning(products.c.id)
+    ).scalars())
+    db.commit()
+    after_commit(db, autocomplete.products_removed, deleted)
+    return {
+        "results": [
+            {"id": row_id, "status": 200} if row_id in deleted else row_error(row_id, 404, "Producto no encontrado")
+            for row_id in ids
+        ],
+        "deleted": len(deleted),
+    }
+
+# Dar o quitar privilegios de administrador a muchos usuarios con un solo UPDATE
+@router.post("/users/bulk-admin", tags=["admin"], dependencies=[Depends(require_admin)])
+async def bulk_set_admin(payload: UserBulkAdmin, db: Session = Depends(get_db)):
+    check_bulk_size(len(payload.ids))
+    users = User.__table__
+    ids = list(dict.fromkeys(payload.ids))
+    changed = set(db.execute(
+        update(users)
+        .where(users.c.id.in_(ids), users.c.is_admin.is_distinct_from(payload.is_admin))
+        .values(is_admin=payload.is_admin, version=users.c.version + 1)
+        .returning(users.c.id)
+    ).scalars())
+    unchanged = [row_id for row_id in ids if row_id not in changed]
+    existing = set(db.execute(select(users.c.id).where(users.c.id.in_(unchanged))).scalars()) if unchanged else set()
+    db.commit()
+    return {
+        "results": [
+            {"id": row_id, "status": 200, "changed": row_id in changed}
+            if row_id in changed or row_id in existing
+            else row_error(row_id, 404, "Usuario no encontrado")
+            for row_id in ids
+        ],
+        "updated": len(changed),
+    }
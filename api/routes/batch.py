@@ -0,0 +1,220 @@
+# api/routes/batch.py
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from database import OuterTransaction, shared_session
+from observability import tracing
+
+# Crear el router del endpoint de lotes
+router = APIRouter()
+logger = logging.getLogger("api.batch")
+
+# Límites de un lote (variables de entorno)
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+BATCH_MAX_BODY_BYTES = int(os.getenv("BATCH_MAX_BODY_BYTES", str(256 * 1024)))
+BATCH_MAX_RESPONSE_BYTES = int(os.getenv("BATCH_MAX_RESPONSE_BYTES", str(1024 * 1024)))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+API_PREFIX = "/api/v1/"
+ALLOWED_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+# Cabeceras de la petición del lote que heredan las sub-peticiones
+INHERITED_HEADERS = {b"authorization", b"x-request-id", b"traceparent"}
+# Cabeceras de la sub-respuesta que se devuelven al cliente
+FORWARDED_HEADERS = ("etag", "location", "retry-after")
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+    body: Any = None
+    headers: Dict[str, str] = {}
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+    # Ejecutar en orden dentro de una única transacción (todo o nada)
+    transaction: bool = False
+
+
+def item_error(item, status_code, detail):
+    return {"id": item.id, "status": status_code, "body": {"detail": detail}}
+
+
+def validate_item(item):
+    if item.method.upper() not in ALLOWED_METHODS:
+        return f"Método no permitido: {item.method}"
+    path = item.path.split("?", 1)[0]
+    if not path.startswith(API_PREFIX):
+        return f"La ruta debe empezar por {API_PREFIX}"
+    if path.rstrip("/") == "/api/v1/batch":
+        return "No se permiten lotes anidados"
+    return None
+
+
+async def dispatch(app, parent_scope, item, batch_span=None):
+    """
+    Ejecuta una sub-petición sin red, con toda la pila de la app (middlewares
+    incluidos: request id, traza, registro de acceso, X-Profile e Idempotency-Key)
+    """
+    path, _, query = item.path.partition("?")
+    payload = json.dumps(item.body).encode() if item.body is not None else b""
+    headers = [(k, v) for k, v in parent_scope["headers"] if k in INHERITED_HEADERS]
+    if batch_span is not None:
+        # El span raíz de la sub-petición cuelga del span de su lote
+        headers = [(k, v) for k, v in headers if k != b"traceparent"]
+        headers.append((b"traceparent", batch_span.traceparent().encode()))
+    headers += [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in item.headers.items()]
+    headers += [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+    scope = {
+        "type": "http",
+        "asgi": parent_scope.get("asgi", {"version": "3.0"}),
+        "http_version": parent_scope.get("http_version", "1.1"),
+        "method": item.method.upper(),
+        "scheme": parent_scope.get("scheme", "http"),
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": parent_scope.get("root_path", ""),
+        "query_string": query.encode(),
+        "headers": headers,
+        "client": parent_scope.get("client"),
+        "server": parent_scope.get("server"),
+        "app": app,
+    }
+    body_sent = False
+    status_code = 500
+    response_headers = {}
+    chunks = []
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # La sub-petición no tiene cliente propio que se desconecte
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            response_headers.update((k.decode("latin-1").lower(), v.decode("latin-1")) for k, v in message["headers"])
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # Un fallo inesperado afecta solo a su sub-petición
+        logger.exception("batch: error en sub-petición", extra={"fields": {"method": scope["method"], "path": path}})
+        return item_error(item, 500, "Error interno del servidor"), 0
+
+    body = b"".join(chunks)
+    if not body:
+        content = None
+    elif response_headers.get("content-type", "").startswith("application/json"):
+        content = json.loads(body)
+    else:
+        content = body.decode("utf-8", errors="replace")
+    result = {"id": item.id, "status": status_code, "body": content}
+    forwarded = {name: response_headers[name] for name in FORWARDED_HEADERS if name in response_headers}
+    if forwarded:
+        result["headers"] = forwarded
+    return result, len(body)
+
+
+async def traced_dispatch(app, scope, item):
+    with tracing.span(f"batch {item.method.upper()} {item.path.partition('?')[0]}") as batch_span:
+        return await dispatch(app, scope, item, batch_span)
+
+
+async def run_concurrent(app, scope, items):
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run_one(item):
+        async with semaphore:
+            return await traced_dispatch(app, scope, item)
+
+    return await asyncio.gather(*(run_one(item) for item in items))
+
+
+async def run_in_transaction(app, scope, items):
+    """
+    Sub-peticiones en orden sobre una misma sesión. Cada commit de un manejador
+    solo libera un SAVEPOINT; la transacción exterior se confirma al final si
+    todas terminaron con éxito y se revierte entera si alguna falló.
+    """
+    tx = await run_in_threadpool(OuterTransaction)
+    token = shared_session.set(tx.db)
+    results = []
+    failed = False
+    ok = False
+    try:
+        for item in items:
+            if failed:
+                results.append((item_error(item, 424, "No ejecutada: falló una petición anterior del lote"), 0))
+                continue
+            result, size = await traced_dispatch(app, scope, item)
+            results.append((result, size))
+            failed = result["status"] >= 400
+        ok = not failed
+    finally:
+        shared_session.reset(token)
+        if ok:
+            await run_in_threadpool(tx.commit)
+        await run_in_threadpool(tx.close)
+    return results, ok
+
+
+# Ejecutar varias peticiones a la API en un solo viaje
+@router.post("/", tags=["batch"])
+async def run_batch(request: Request):
+    body = await request.body()
+    if len(body) > BATCH_MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail=f"El lote supera {BATCH_MAX_BODY_BYTES} bytes")
+    try:
+        batch = BatchRequest(**json.loads(body or b"{}"))
+    except (ValueError, TypeError) as exc:
+        if isinstance(exc, ValidationError):
+            detail = [{"loc": list(error["loc"]), "msg": error["msg"]} for error in exc.errors()]
+        else:
+            detail = "JSON inválido"
+        raise HTTPException(status_code=422, detail=detail)
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="El lote está vacío")
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=413, detail=f"Máximo {BATCH_MAX_REQUESTS} peticiones por lote")
+
+    errors = {index: validate_item(item) for index, item in enumerate(batch.requests)}
+    if any(errors.values()):
+        # Un lote con peticiones mal formadas no ejecuta ninguna
+        return {"responses": [
+            item_error(item, 400, errors[index]) if errors[index] else item_error(item, 424, "No ejecutada")
+            for index, item in enumerate(batch.requests)
+        ]}
+
+    committed = None
+    if batch.transaction:
+        results, committed = await run_in_transaction(request.app, request.scope, batch.requests)
+    else:
+        results = await run_concurrent(request.app, request.scope, batch.requests)
+
+    # Presupuesto total de respuesta: las que no caben se sustituyen por un error
+    responses = []
+    remaining = BATCH_MAX_RESPONSE_BYTES
+    for (result, size), item in zip(results, batch.requests):
+        if size > remaining:
+            result = item_error(item, 413, "Respuesta demasiado grande para el lote")
+        else:
+            remaining -= size
+        responses.append(result)
+
+    response = {"responses": responses}
+    if committed is not None:
+        response["committed"] = committed
+    return response
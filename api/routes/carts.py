@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
+from sqlalchemy import func, insert, literal, select, update
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from database import get_db
+from database import after_commit, get_db
 from models.cart import Cart, CartItem
-from models.product import Product 
+from models.product import Product, active_product
+from models.analytics import CartEvent
+import recommender
 
 # Crear el router para carritos
 router = APIRouter()
@@ -12,6 +15,34 @@ router = APIRouter()
 class CartItemUpdate(BaseModel):
     quantity: int
 
+def touch_cart(db, cart_id: int) -> bool:
+    """
+    Marca actividad en el carrito (updated_at, que usa la caducidad de carritos
+    abandonados; ver cart_expiry.py). Bloquea la fila hasta el commit, así la
+    tarea de caducidad la salta. False si el carrito ya no existe.
+    """
+    result = db.execute(
+        update(Cart)
+        .where(Cart.id == cart_id)
+        .values(updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+def record_item_events(db, kind: str, quantity, *conditions):
+    """
+    Registra en cart_events un cambio de los items que cumplen conditions, en
+    la misma transacción (los rollups de actividad salen de ahí; ver rollups.py).
+    quantity es una expresión: CartItem.quantity o un literal con el delta.
+    """
+    db.execute(insert(CartEvent).from_select(
+        ["kind", "user_id", "cart_id", "product_id", "quantity", "unit_price"],
+        select(literal(kind), Cart.user_id, CartItem.cart_id, CartItem.product_id, quantity, Product.price)
+        .join(Cart, Cart.id == CartItem.cart_id)
+        .outerjoin(Product, Product.id == CartItem.product_id)
+        .where(*conditions)
+    ))
+
 @router.get("/")
 async def get_user_cart(user_id: int = Query(...), db: Session = Depends(get_db)):
     """
@@ -21,6 +52,7 @@ async def get_user_cart(user_id: int = Query(...), db: Session = Depends(get_db)
     if not cart:
         raise HTTPException(status_code=404, detail="Carrito no encontrado")
 
+    # Solo productos que siguen en el catálogo (los retirados o archivados no se muestran)
     items = [
         {
             "id": item.id,
@@ -28,7 +60,10 @@ async def get_user_cart(user_id: int = Query(...), db: Session = Depends(get_db)
             "quantity": item.quantity,
             "added_at": item.added_at
         }
-        for item in cart.items
+        for item in db.query(CartItem)
+        .join(Product, Product.id == CartItem.product_id)
+        .filter(CartItem.cart_id == cart.id, active_product)
+        .order_by(CartItem.id)
     ]
     return {"cart_id": cart.id, "user_id": cart.user_id, "items": items}
 
@@ -45,12 +80,14 @@ async def add_item_to_cart(
     Si no existe el carrito, lo crea.
     """
 
-    # Validar que el producto exista
-    product = db.query(Product).filter(Product.id == product_id).first()
+    # Validar que el producto exista y siga en el catálogo
+    product = db.query(Product).filter(Product.id == product_id, active_product).first()
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
     cart = db.query(Cart).filter(Cart.user_id == user_id).first()
+    if cart and not touch_cart(db, cart.id):
+        cart = None  # caducó entre la consulta y la actualización
     if not cart:
         cart = Cart(user_id=user_id)
         db.add(cart)
@@ -61,14 +98,24 @@ async def add_item_to_cart(
         CartItem.product_id == product_id
     ).first()
 
+    # Productos que ya estaban en el carrito: coinciden con el nuevo (recomendaciones)
+    other_product_ids = []
     if item:
         item.quantity += quantity
     else:
+        if recommender.RECOMMENDER_ENABLED:
+            other_product_ids = db.execute(
+                select(CartItem.product_id).where(CartItem.cart_id == cart.id)
+            ).scalars().all()
         item = CartItem(cart_id=cart.id, product_id=product_id, quantity=quantity)
         db.add(item)
+    db.add(CartEvent(kind="add", user_id=user_id, cart_id=cart.id, product_id=product_id,
+                     quantity=quantity, unit_price=product.price))
 
     db.commit()
     db.refresh(item)
+    if other_product_ids:
+        after_commit(db, recommender.index.observe, product_id, other_product_ids, item.id)
 
     return {
         "id": item.id,
@@ -88,12 +135,18 @@ async def update_cart_item(
     Actualizar la cantidad de un producto en el carrito
     """
     item = db.query(CartItem).filter(CartItem.id == item_id).first()
-    if not item:
+    if not item or not touch_cart(db, item.cart_id):
         raise HTTPException(status_code=404, detail="Item no encontrado")
+    # Un producto retirado del catálogo no admite cambios de cantidad (sí eliminarlo)
+    if not db.query(Product.id).filter(Product.id == item.product_id, active_product).first():
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
 
     if cart_item_update.quantity <= 0:
         raise HTTPException(status_code=400, detail="Cantidad inválida")
 
+    delta = cart_item_update.quantity - item.quantity
+    if delta:
+        record_item_events(db, "add" if delta > 0 else "remove", literal(abs(delta)), CartItem.id == item.id)
     item.quantity = cart_item_update.quantity
     db.commit()
     db.refresh(item)
@@ -112,9 +165,10 @@ async def remove_item_from_cart(item_id: int, db: Session = Depends(get_db)):
     Eliminar un item específico del carrito
     """
     item = db.query(CartItem).filter(CartItem.id == item_id).first()
-    if not item:
+    if not item or not touch_cart(db, item.cart_id):
         raise HTTPException(status_code=404, detail="Item no encontrado")
 
+    record_item_events(db, "remove", CartItem.quantity, CartItem.id == item.id)
     db.delete(item)
     db.commit()
     return {"detail": "Item eliminado del carrito"}
@@ -129,6 +183,8 @@ async def clear_cart(user_id: int = Query(...), db: Session = Depends(get_db)):
     if not cart:
         raise HTTPException(status_code=404, detail="Carrito no encontrado")
 
+    touch_cart(db, cart.id)
+    record_item_events(db, "remove", CartItem.quantity, CartItem.cart_id == cart.id)
     db.query(CartItem).filter(CartItem.cart_id == cart.id).delete()
     db.commit()
 
@@ -0,0 +1,24 @@
+# api/routes/events.py
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+from events import product_events, stream
+
+# Crear el router de eventos en tiempo real (Server-Sent Events)
+router = APIRouter()
+
+# Cambios de precio y stock del catálogo. EventSource reenvía Last-Event-ID al reconectar;
+# ?last_event_id= sirve para clientes que no pueden fijar la cabecera.
+@router.get("/products", tags=["events"])
+async def product_event_stream(
+    last_event_id_header: str = Header(None, alias="Last-Event-ID"),
+    last_event_id: str = Query(None)
+):
+    return StreamingResponse(
+        stream(product_events, last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # nginx no debe acumular el stream en su buffer
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -1,43 +1,144 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+import json
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from database import get_db
-from models.product import Product
+from database import after_commit, get_db, SessionLocal, shared_session
+from models.product import Product, active_product
+from fields import FieldSet
+from singleflight import SingleFlight, SingleFlightTimeout
+from cache import TTLCache
+from concurrency import add_stock, check_version, commit_versioned, etag, versioned
+import recommender
+import autocomplete
 
 # Crear un router para productos
 router = APIRouter()
 
-# Obtener lista de productos (ordenados por id asc)
+# Lecturas concurrentes idénticas del catálogo comparten una sola consulta
+catalog_flight = SingleFlight("catalog")
+# Respuestas ya serializadas del catálogo (invalidadas por LISTEN/NOTIFY al escribir productos)
+catalog_cache = TTLCache("catalog", "products")
+
+def product_to_dict(p: Product) -> dict:
+    return {
+        "id": p.id,
+        "name": p.name,
+        "description": p.description,
+        "price": str(p.price),
+        "stock": p.stock,
+        "image_url": p.image_url,
+        "created_at": p.created_at,
+        "version": p.version
+    }
+
+# Campos seleccionables con ?fields= (mismo formato que product_to_dict)
+product_fields = FieldSet(Product, {
+    "id": None,
+    "name": None,
+    "description": None,
+    "price": str,
+    "stock": None,
+    "image_url": None,
+    "created_at": None,
+    "version": None,
+})
+
+def encode_json(data) -> bytes:
+    # Mismo formato que JSONResponse, serializado una vez para todas las peticiones que esperan
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# Cargas del catálogo (reciben la sesión)
+def load_products(db, names) -> bytes:
+    rows = product_fields.query(db, names).filter(active_product).order_by(Product.id.asc()).all()
+    return encode_json([product_fields.to_dict(row, names) for row in rows])
+
+def load_product(db, product_id: int, names):
+    row = product_fields.query(db, names).filter(Product.id == product_id, active_product).first()
+    return encode_json(product_fields.to_dict(row, names)) if row else None
+
+# Sesión propia para la carga agrupada: corre en el threadpool y solo el líder toma una conexión
+def with_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+async def shared_read(key, fn, *args, ids=None):
+    shared = shared_session.get()
+    if shared is not None:
+        # Dentro de un lote transaccional hay que ver sus escrituras: sin caché ni agrupar
+        return fn(shared, *args)
+    body = catalog_cache.get(key)
+    if body is not None:
+        return body
+    generation = catalog_cache.current_generation()
+    try:
+        body = await catalog_flight.do(key, with_session, fn, *args)
+    except SingleFlightTimeout:
+        raise HTTPException(status_code=504, detail="Tiempo de espera agotado al consultar el catálogo")
+    if body is not None:
+        catalog_cache.set(key, body, ids=ids, generation=generation)
+    return body
+
+# Obtener lista de productos (ordenados por id asc; ?fields=id,name,price limita las columnas)
 @router.get("/")
-async def get_products(db: Session = Depends(get_db)):
-    products = db.query(Product).order_by(Product.id.asc()).all()
-    return [
-        {
-            "id": p.id,
-            "name": p.name,
-            "description": p.description,
-            "price": str(p.price),
-            "stock": p.stock,
-            "image_url": p.image_url,
-            "created_at": p.created_at
-        }
-        for p in products
-    ]
+async def get_products(fields: str = Query(None)):
+    names = product_fields.parse(fields)
+    body = await shared_read(("products", names), load_products, names)
+    return Response(body, media_type="application/json")
+
+# Sugerencias para el buscador: productos con una palabra del nombre que empieza
+# por q (sin distinguir mayúsculas ni tildes). Sale del índice en memoria, sin consultas
+@router.get("/autocomplete")
+async def autocomplete_products(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(autocomplete.AUTOCOMPLETE_MAX_RESULTS, ge=1, le=autocomplete.AUTOCOMPLETE_MAX_RESULTS)
+):
+    if not autocomplete.AUTOCOMPLETE_ENABLED:
+        raise HTTPException(status_code=404, detail="Autocompletado desactivado")
+    response.headers["Cache-Control"] = "public, max-age=30"
+    return {
+        "query": q,
+        "results": [{"id": product_id, "name": name} for product_id, name in autocomplete.index.suggest(q, limit)],
+    }
 
 # Obtener un producto por ID
 @router.get("/{product_id}")
-async def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
+async def get_product(product_id: int, fields: str = Query(None)):
+    names = product_fields.parse(fields)
+    body = await shared_read(("product", product_id, names), load_product, product_id, names, ids=(product_id,))
+    if body is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    return {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "price": str(product.price),
-        "stock": product.stock,
-        "image_url": product.image_url,
-        "created_at": product.created_at
+    return Response(body, media_type="application/json")
+
+# Productos que suelen ir en el mismo carrito (top-K precalculado; ver recommender.py)
+@router.get("/{product_id}/related")
+async def get_related_products(
+    product_id: int,
+    limit: int = Query(10, ge=1, le=recommender.RECOMMENDER_TOP_K),
+    fields: str = Query(None),
+    db: Session = Depends(get_db)
+):
+    names = product_fields.parse(fields)
+    # Se piden los K vecinos: los retirados del catálogo se descartan y el resto completa el límite
+    neighbors = recommender.index.related(product_id, recommender.RECOMMENDER_TOP_K)
+    ids = [product_id] + [neighbor for neighbor, _ in neighbors]
+    rows = {
+        row.id: row
+        for row in product_fields.query(db, names).filter(Product.id.in_(ids), active_product)
     }
+    if product_id not in rows:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    related = [
+        dict(product_fields.to_dict(rows[neighbor], names), co_occurrences=count)
+        for neighbor, count in neighbors
+        if neighbor in rows
+    ][:limit]
+    return {"product_id": product_id, "related": related}
 
 # Crear un producto
 @router.post("/")
@@ -59,30 +160,29 @@ async def create_product(
     db.add(product)
     db.commit()
     db.refresh(product)
-    return {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "price": str(product.price),
-        "stock": product.stock,
-        "image_url": product.image_url,
-        "created_at": product.created_at
-    }
+    after_commit(db, autocomplete.product_saved, product.id, product.name, product.stock)
+    return product_to_dict(product)
 
-# Actualizar un producto
+# Actualizar un producto (If-Match: versión esperada; stock_delta: suma atómica al stock)
 @router.put("/{product_id}")
 async def update_product(
     product_id: int,
+    response: Response,
     name: str = Body(None),
     description: str = Body(None),
     price: float = Body(None),
     stock: int = Body(None),
+    stock_delta: int = Body(None),
     image_url: str = Body(None),
+    if_match: str = Header(None),
     db: Session = Depends(get_db)
 ):
-    product = db.query(Product).filter(Product.id == product_id).first()
+    if stock is not None and stock_delta is not None:
+        raise HTTPException(status_code=400, detail="stock y stock_delta son excluyentes")
+    product = db.query(Product).filter(Product.id == product_id, active_product).first()
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
+    expected_version = check_version(if_match, product)
 
     if name is not None:
         product.name = name
@@ -95,25 +195,25 @@ async def update_product(
     if image_url is not None:
         product.image_url = image_url
 
-    db.commit()
+    with versioned(db):
+        if stock_delta:
+            db.flush()
+            # Con If-Match el delta también exige la versión (la de después del flush, si lo hubo)
+            add_stock(db, product_id, stock_delta, product.version if expected_version is not None else None)
+        db.commit()
     db.refresh(product)
-    return {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "price": str(product.price),
-        "stock": product.stock,
-        "image_url": product.image_url,
-        "created_at": product.created_at
-    }
+    after_commit(db, autocomplete.product_saved, product.id, product.name, product.stock)
+    response.headers["ETag"] = etag(product.version)
+    return product_to_dict(product)
 
-# Eliminar un producto
+# Eliminar un producto (borrado lógico: las líneas de carrito las retira el archivador)
 @router.delete("/{product_id}")
 async def delete_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.query(Product).filter(Product.id == product_id, active_product).first()
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
-    db.delete(product)
-    db.commit()
+    product.deleted_at = func.now()
+    commit_versioned(db)
+    after_commit(db, autocomplete.products_removed, [product_id])
     return {"message": f"Producto con id {product_id} eliminado correctamente"}
\ No newline at end of file
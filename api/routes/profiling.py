@@ -0,0 +1,101 @@
+# api/routes/profiling.py
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response
+from observability import profiling
+from routes.users import require_admin
+
+# Todas las rutas de perfilado exigen un administrador
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+def attachment(filename):
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+
+# Perfil de CPU por muestreo de todos los hilos durante N segundos (formato plegado para flamegraph)
+@router.get("/cpu", tags=["profiling"])
+async def cpu_profile(
+    seconds: float = Query(10, gt=0, le=profiling.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000)
+):
+    try:
+        # El muestreo bloquea: se ejecuta fuera del bucle de eventos para poder verlo trabajar
+        folded, samples = await run_in_threadpool(profiling.sample_cpu, seconds, interval_ms / 1000)
+    except profiling.ProfilerBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    filename = f"api-cpu-{int(time.time())}.folded"
+    headers = attachment(filename)
+    headers["X-Profile-Samples"] = str(samples)
+    return PlainTextResponse(folded, headers=headers)
+
+# Estado de tracemalloc y snapshots disponibles
+@router.get("/memory", tags=["profiling"])
+async def memory_status():
+    return profiling.memory_summary()
+
+# Tomar una snapshot de memoria (activa tracemalloc la primera vez)
+@router.post("/memory/snapshots", tags=["profiling"], status_code=201)
+async def take_memory_snapshot(limit: int = Query(20, ge=1, le=500)):
+    snapshot_id = await run_in_threadpool(profiling.snapshots.take)
+    snapshot = profiling.snapshots.get(snapshot_id)
+    return {"id": snapshot_id, "top": profiling.top_allocators(snapshot, limit)}
+
+# Principales asignaciones de una snapshot
+@router.get("/memory/snapshots/{snapshot_id}", tags=["profiling"])
+async def get_memory_snapshot(
+    snapshot_id: int,
+    limit: int = Query(20, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    snapshot = profiling.snapshots.get(snapshot_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Snapshot no encontrada")
+    return {"id": snapshot_id, "top": profiling.top_allocators(snapshot, limit, group_by)}
+
+# Diferencia entre dos snapshots (qué creció entre base y target)
+@router.get("/memory/diff", tags=["profiling"])
+async def diff_memory_snapshots(
+    base: int = Query(...),
+    target: int = Query(...),
+    limit: int = Query(20, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    base_snapshot = profiling.snapshots.get(base)
+    target_snapshot = profiling.snapshots.get(target)
+    if base_snapshot is None or target_snapshot is None:
+        raise HTTPException(status_code=404, detail="Snapshot no encontrada")
+    return {"base": base, "target": target,
+            "diff": profiling.diff_snapshots(base_snapshot, target_snapshot, limit, group_by)}
+
+# Descartar snapshots y detener tracemalloc
+@router.delete("/memory", tags=["profiling"], status_code=204)
+async def stop_memory_tracing():
+    profiling.snapshots.clear()
+
+# Perfiles de peticiones individuales (cabecera X-Profile: 1)
+@router.get("/requests", tags=["profiling"])
+async def list_request_profiles():
+    return profiling.request_profiles.list()
+
+# Resumen legible de un perfil de petición
+@router.get("/requests/{profile_id}", tags=["profiling"])
+async def get_request_profile(
+    profile_id: str,
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls|ncalls)$"),
+    limit: int = Query(40, ge=1, le=500)
+):
+    entry = profiling.request_profiles.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return PlainTextResponse(profiling.pstats_text(entry, sort, limit))
+
+# Descarga del perfil en formato pstats (snakeviz, pstats, gprof2dot)
+@router.get("/requests/{profile_id}/pstats", tags=["profiling"])
+async def download_request_profile(profile_id: str):
+    entry = profiling.request_profiles.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return Response(profiling.pstats_bytes(entry), media_type="application/octet-stream",
+                    headers=attachment(f"api-{profile_id}.pstats"))
@@ -0,0 +1,119 @@
+# api/routes/stats.py
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from database import get_db
+from models.analytics import CartActivityDaily, CartActivityHourly, RollupWatermark
+from models.product import Product
+from rollups import SUM_COLUMNS, WATERMARK, as_utc
+from routes.users import require_admin
+
+# Estadísticas de actividad de carritos. Solo leen los rollups (rollups.py), nunca
+# cart_items ni cart_events: el coste no crece con el histórico.
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+class Metric(str, Enum):
+    additions = "additions"
+    removals = "removals"
+    quantity_added = "quantity_added"
+    quantity_removed = "quantity_removed"
+    revenue_estimate = "revenue_estimate"
+
+
+def counters_to_dict(row, names):
+    return {
+        name: float(value or 0) if name == "revenue_estimate" else int(value or 0)
+        for name, value in zip(names, row)
+    }
+
+
+def freshness(db):
+    """Hasta dónde llegan los rollups (watermark de la última ejecución)"""
+    row = db.execute(
+        select(RollupWatermark.last_event_id, RollupWatermark.updated_at).where(RollupWatermark.name == WATERMARK)
+    ).first()
+    if row is None:
+        return {"last_event_id": 0, "updated_at": None}
+    return {"last_event_id": row.last_event_id, "updated_at": as_utc(row.updated_at).isoformat() if row.updated_at else None}
+
+
+def series(db, model, bucket, since, product_id):
+    """
+    Serie temporal por bucket. Con product_id incluye usuarios únicos; para
+    todos los productos no (sumarlos contaría dos veces a un mismo usuario).
+    """
+    names = list(SUM_COLUMNS) + (["unique_users"] if product_id is not None else [])
+    bucket_column = getattr(model, bucket)
+    statement = (
+        select(bucket_column, *[func.sum(getattr(model, name)) for name in names])
+        .where(bucket_column >= since)
+        .group_by(bucket_column)
+        .order_by(bucket_column)
+    )
+    if product_id is not None:
+        statement = statement.where(model.product_id == product_id)
+    rows = db.execute(statement).all()
+    points = [dict(counters_to_dict(row[1:], names), **{bucket: row[0]}) for row in rows]
+    totals = {name: sum(point[name] for point in points) for name in SUM_COLUMNS}
+    return points, totals
+
+
+# Actividad por hora de las últimas N horas (UTC); ?product_id= para un solo producto
+@router.get("/hourly", tags=["admin"])
+async def hourly_stats(
+    hours: int = Query(24, ge=1, le=24 * 14),
+    product_id: int = Query(None),
+    db: Session = Depends(get_db)
+):
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    points, totals = series(db, CartActivityHourly, "hour", now - timedelta(hours=hours - 1), product_id)
+    for point in points:
+        point["hour"] = as_utc(point["hour"]).isoformat()
+    return {"hours": hours, "product_id": product_id, "series": points, "totals": totals, "watermark": freshness(db)}
+
+# Actividad por día de los últimos N días (UTC)
+@router.get("/daily", tags=["admin"])
+async def daily_stats(
+    days: int = Query(30, ge=1, le=3660),
+    product_id: int = Query(None),
+    db: Session = Depends(get_db)
+):
+    today = datetime.now(timezone.utc).date()
+    points, totals = series(db, CartActivityDaily, "day", today - timedelta(days=days - 1), product_id)
+    for point in points:
+        point["day"] = point["day"].isoformat()
+    return {"days": days, "product_id": product_id, "series": points, "totals": totals, "watermark": freshness(db)}
+
+# Productos con más actividad en los últimos N días según una métrica
+@router.get("/top-products", tags=["admin"])
+async def top_products(
+    days: int = Query(1, ge=1, le=3660),
+    metric: Metric = Query(Metric.quantity_added),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    names = list(SUM_COLUMNS)
+    ranking = func.sum(getattr(CartActivityDaily, metric.value))
+    rows = db.execute(
+        select(CartActivityDaily.product_id, *[func.sum(getattr(CartActivityDaily, name)) for name in names])
+        .where(CartActivityDaily.day >= since)
+        .group_by(CartActivityDaily.product_id)
+        .order_by(ranking.desc(), CartActivityDaily.product_id)
+        .limit(limit)
+    ).all()
+    # Solo los nombres de los productos del ranking (por clave primaria, incluidos los retirados)
+    product_ids = [row[0] for row in rows]
+    names_by_id = dict(db.execute(select(Product.id, Product.name).where(Product.id.in_(product_ids))).all()) if product_ids else {}
+    return {
+        "days": days,
+        "metric": metric.value,
+        "products": [
+            dict(counters_to_dict(row[1:], names), product_id=row[0], name=names_by_id.get(row[0]))
+            for row in rows
+        ],
+        "watermark": freshness(db),
+    }
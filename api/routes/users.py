@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Header, Query, Response
 from sqlalchemy.orm import Session
 from database import get_db
 from models.user import User
+from fields import FieldSet
+from cache import TTLCache
+from concurrency import check_version, commit_versioned, etag
+from collections import namedtuple
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
@@ -10,6 +14,16 @@ import os
 # Crear el router
 router = APIRouter()
 
+# Campos públicos seleccionables con ?fields= (nunca password_hash)
+user_fields = FieldSet(User, {
+    "id": None,
+    "username": None,
+    "email": None,
+    "is_active": None,
+    "is_admin": None,
+    "version": None,
+})
+
 # Configuración JWT
 SECRET_KEY = os.getenv("SECRET_KEY", "tu_clave_secreta_muy_segura")
 ALGORITHM = "HS256"
@@ -36,6 +50,48 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Rol de los usuarios autenticados, cacheado por username (se invalida al cambiar la fila)
+UserRole = namedtuple("UserRole", ["id", "username", "is_admin"])
+role_cache = TTLCache("user_roles", "users")
+
+def get_user_role(username, db: Session):
+    """Rol de un usuario activo o None"""
+    role = role_cache.get(username)
+    if role is not None:
+        return role
+    generation = role_cache.current_generation()
+    user = db.query(User.id, User.username, User.is_admin).filter(
+        User.username == username, User.is_active.is_(True)
+    ).first()
+    if not user:
+        return None
+    role = UserRole(user.id, user.username, bool(user.is_admin))
+    role_cache.set(username, role, ids=(user.id,), generation=generation)
+    return role
+
+def get_user_from_authorization(authorization, db: Session):
+    """Devuelve el rol del usuario del token Bearer o None si falta o no es válido"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if not username:
+        return None
+    return get_user_role(username, db)
+
+def require_admin(authorization: str = Header(None), db: Session = Depends(get_db)) -> UserRole:
+    """Dependencia: exige un token válido de un usuario administrador"""
+    user = get_user_from_authorization(authorization, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="Token inválido o ausente")
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Se requieren permisos de administrador")
+    return user
+
 # Registro de usuario
 @router.post("/register")
 async def register_user(
@@ -101,7 +157,8 @@ async def get_user_profile(
         "username": user.username,
         "email": user.email,
         "is_active": user.is_active,
-        "is_admin": user.is_admin 
+        "is_admin": user.is_admin,
+        "version": user.version
     }
 
 
@@ -110,71 +167,66 @@ async def get_user_profile(
 @router.put("/profile/{user_id}")
 async def update_user_profile(
     user_id: int,
+    response: Response,
     username: str = Body(None),
     email: str = Body(None),
+    if_match: str = Header(None),
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    check_version(if_match, user)
 
     if username:
         user.username = username
     if email:
         user.email = email
 
-    db.commit()
+    commit_versioned(db)
     db.refresh(user)
+    response.headers["ETag"] = etag(user.version)
 
     return {
         "id": user.id,
         "username": user.username,
         "email": user.email,
-        "is_active": user.is_active
+        "is_active": user.is_active,
+        "version": user.version
     }
 
-# Listar todos los usuarios (ordenados por admin y id)
+# Listar todos los usuarios (ordenados por admin y id; ?fields= limita las columnas)
 @router.get("/")
-async def list_users(db: Session = Depends(get_db)):
-    users = db.query(User).order_by(User.is_admin.desc(), User.id.asc()).all()
-    return [
-        {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "is_active": user.is_active,
-            "is_admin": user.is_admin
-        }
-        for user in users
-    ]
+async def list_users(fields: str = Query(None), db: Session = Depends(get_db)):
+    names = user_fields.parse(fields)
+    rows = user_fields.query(db, names).order_by(User.is_admin.desc(), User.id.asc()).all()
+    return [user_fields.to_dict(row, names) for row in rows]
     
 # Obtener información de usuario por ID
 @router.get("/{user_id}")
-async def get_user_by_id(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+async def get_user_by_id(user_id: int, fields: str = Query(None), db: Session = Depends(get_db)):
+    names = user_fields.parse(fields)
+    row = user_fields.query(db, names).filter(User.id == user_id).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    return {
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "is_active": user.is_active,
-        "is_admin": user.is_admin
-    }
+    return user_fields.to_dict(row, names)
 
-# Actualizar información de usuario
+# Actualizar información de usuario (If-Match con la versión leída: 409 si otra petición lo modificó)
 @router.put("/{user_id}")
 async def update_user(
     user_id: int,
+    response: Response,
     username: str = Body(None),
     email: str = Body(None),
     current_password: str = Body(None),
+    if_match: str = Header(None),
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    check_version(if_match, user)
     
     # Verificar contraseña actual si se proporciona
     if current_password:
@@ -196,15 +248,17 @@ async def update_user(
             raise HTTPException(status_code=400, detail="El email ya está en uso")
         user.email = email
     
-    db.commit()
+    commit_versioned(db)
     db.refresh(user)
+    response.headers["ETag"] = etag(user.version)
     
     return {
         "id": user.id,
         "username": user.username,
         "email": user.email,
         "is_active": user.is_active,
-        "is_admin": user.is_admin
+        "is_admin": user.is_admin,
+        "version": user.version
     }
 
 # Cambiar contraseña
@@ -226,6 +280,6 @@ async def change_password(
     # Hashear nueva contraseña
     hashed_password = get_password_hash(new_password)
     user.password_hash = hashed_password
-    db.commit()
+    commit_versioned(db)
     
     return {"message": "Contraseña cambiada exitosamente"}
\ No newline at end of file
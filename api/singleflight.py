@@ -0,0 +1,49 @@
+import asyncio
+import os
+from fastapi.concurrency import run_in_threadpool
+
+# Tiempo máximo que una petición espera un resultado compartido (segundos)
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "5"))
+
+
+class SingleFlightTimeout(Exception):
+    """El resultado compartido no llegó a tiempo"""
+
+
+class SingleFlight:
+    """
+    Agrupa lecturas idénticas concurrentes: la primera petición de una clave
+    ejecuta la función en el threadpool y las demás que llegan mientras
+    tanto esperan ese mismo resultado (o reciben la misma excepción). Así,
+    N peticiones duplicadas usan una sola consulta y una sola conexión.
+    """
+
+    def __init__(self, name, timeout=SINGLEFLIGHT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self.inflight = {}
+        self.stats = {"leaders": 0, "shared": 0, "timeouts": 0}
+
+    async def do(self, key, fn, *args, timeout=None):
+        task = self.inflight.get(key)
+        if task is None:
+            self.stats["leaders"] += 1
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            self.inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        else:
+            self.stats["shared"] += 1
+
+        # shield: si una petición se cancela o agota su espera, la carga sigue para las demás
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise SingleFlightTimeout(f"{self.name}: sin respuesta para {key!r}")
+
+    def _forget(self, key, task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        # Marcar la excepción como leída aunque ningún llamador siga esperando
+        if not task.cancelled():
+            task.exception()
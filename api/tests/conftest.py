@@ -0,0 +1,45 @@
+"""
+Configuración común de las pruebas de la API (pytest).
+
+Los módulos de la API se importan como en el contenedor (desde api/) y el
+paquete observability desde la raíz del repositorio. La base de datos es un
+SQLite temporal: se fija antes de importar database.py.
+
+    pip install -r api/requirements.txt -r api/requirements-dev.txt
+    python -m pytest -q api/tests
+"""
+import os
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(API_DIR))
+sys.path.insert(0, API_DIR)
+
+DB_DIR = tempfile.mkdtemp(prefix="tienda-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DB_DIR, 'tienda.db')}"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["TRACE_EXPORT_DIR"] = ""
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def db_tables():
+    """Tablas recién creadas para cada prueba"""
+    from database import Base, engine
+    import models.analytics, models.cart, models.idempotency, models.product, models.user  # noqa: F401
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def client(db_tables):
+    """TestClient de la app sin ejecutar el arranque (sin tareas periódicas ni listener)"""
+    from fastapi.testclient import TestClient
+    from main import app
+
+    return TestClient(app)
@@ -0,0 +1,31 @@
+import pytest
+
+
+@pytest.fixture
+def cart(client, db_tables):
+    """Carrito del usuario 1 con un producto que sigue en el catálogo y otro que se retira"""
+    kept, retired = (
+        client.post("/api/v1/products/", json={"name": name, "price": 10, "stock": 5}).json()["id"]
+        for name in ("Teclado", "Ratón")
+    )
+    items = {
+        product_id: client.post("/api/v1/carts/items", json={"user_id": 1, "product_id": product_id}).json()["id"]
+        for product_id in (kept, retired)
+    }
+    assert client.delete(f"/api/v1/products/{retired}").status_code == 200
+    return kept, retired, items
+
+
+def test_cart_hides_retired_products(client, cart):
+    kept, _, items = cart
+    response = client.get("/api/v1/carts/", params={"user_id": 1})
+    assert response.status_code == 200
+    assert [(item["id"], item["product_id"]) for item in response.json()["items"]] == [(items[kept], kept)]
+
+
+def test_retired_product_quantity_cannot_be_updated(client, cart):
+    kept, retired, items = cart
+    assert client.put(f"/api/v1/carts/items/{items[retired]}", json={"quantity": 3}).status_code == 404
+    response = client.put(f"/api/v1/carts/items/{items[kept]}", json={"quantity": 3})
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 3
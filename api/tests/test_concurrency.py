@@ -0,0 +1,51 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from concurrency import add_stock
+from database import SessionLocal
+from models.product import Product
+
+
+@pytest.fixture
+def product_id(client):
+    response = client.post("/api/v1/products/", json={"name": "Teclado", "price": 10, "stock": 5})
+    assert response.status_code in (200, 201)
+    return response.json()["id"]
+
+
+def test_stock_delta_with_if_match_detects_a_write_after_the_read(db_tables, product_id):
+    db = SessionLocal()
+    try:
+        # Otra petición cambia el producto entre la lectura (versión 1) y el UPDATE del delta
+        db.execute(update(Product).where(Product.id == product_id).values(price=12, version=2))
+        db.commit()
+        with pytest.raises(HTTPException) as error:
+            add_stock(db, product_id, 3, expected_version=1)
+        assert error.value.status_code == 409
+        assert error.value.headers == {"ETag": '"2"'}
+        db.rollback()
+        assert db.get(Product, product_id).stock == 5
+    finally:
+        db.close()
+
+
+def test_stock_delta_without_if_match_adds_to_the_current_stock(client, product_id):
+    client.put(f"/api/v1/products/{product_id}", json={"price": 11})
+    response = client.put(f"/api/v1/products/{product_id}", json={"stock_delta": 2})
+    assert response.status_code == 200
+    assert response.json()["stock"] == 7
+
+
+def test_stock_delta_with_current_if_match(client, product_id):
+    response = client.put(f"/api/v1/products/{product_id}", json={"stock_delta": -2}, headers={"If-Match": '"1"'})
+    assert response.status_code == 200
+    assert response.json()["stock"] == 3
+    stale = client.put(f"/api/v1/products/{product_id}", json={"stock_delta": -1}, headers={"If-Match": '"1"'})
+    assert stale.status_code == 409
+
+
+def test_stock_and_stock_delta_are_exclusive(client, product_id):
+    response = client.put(f"/api/v1/products/{product_id}", json={"stock": 1, "stock_delta": 1})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "stock y stock_delta son excluyentes"
@@ -0,0 +1,75 @@
+import asyncio
+
+import events
+
+
+def event_ids(chunks):
+    return [line[4:] for chunk in chunks for line in chunk.splitlines() if line.startswith("id: ")]
+
+
+def event_names(chunks):
+    return [line[7:] for chunk in chunks for line in chunk.splitlines() if line.startswith("event: ")]
+
+
+async def drain(body):
+    return [chunk async for chunk in body]
+
+
+def publish(broadcaster, *seqs):
+    for seq in seqs:
+        broadcaster.publish("product.updated", {"id": seq}, f"{seq}-0")
+
+
+def test_overflow_ends_stream_in_order_and_resume_sends_the_rest(monkeypatch):
+    monkeypatch.setattr(events, "SSE_CLIENT_QUEUE", 3)
+
+    async def scenario():
+        broadcaster = events.Broadcaster()
+        broadcaster.attach(asyncio.get_running_loop())
+        body = events.stream(broadcaster)
+        assert (await body.__anext__()).startswith("retry:")
+
+        publish(broadcaster, 1, 2, 3, 4, 5)
+        await asyncio.sleep(0)
+        first = await body.__anext__()
+        # Llega otro evento mientras el stream vacía la cola (ya con hueco)
+        publish(broadcaster, 6)
+        await asyncio.sleep(0)
+        delivered = [first] + await drain(body)
+
+        resumed = events.stream(broadcaster, event_ids(delivered)[-1])
+        await resumed.__anext__()
+        backlog = [await resumed.__anext__() for _ in range(3)]
+        await resumed.aclose()
+        return delivered, backlog
+
+    delivered, backlog = asyncio.run(scenario())
+    assert event_ids(delivered) == ["1-0", "2-0", "3-0"]
+    assert event_ids(backlog) == ["4-0", "5-0", "6-0"]
+
+
+def test_resume_on_another_replica_with_the_same_ids():
+    async def scenario():
+        replicas = [events.Broadcaster(), events.Broadcaster()]
+        for replica in replicas:
+            publish(replica, 1, 2, 3)
+        body = events.stream(replicas[1], "1-0")
+        chunks = [await body.__anext__() for _ in range(3)]
+        await body.aclose()
+        return chunks
+
+    assert event_ids(asyncio.run(scenario())) == ["2-0", "3-0"]
+
+
+def test_unknown_last_event_id_gets_reset():
+    async def scenario():
+        broadcaster = events.Broadcaster()
+        publish(broadcaster, 1, 2)
+        body = events.stream(broadcaster, "99-0")
+        chunks = [await body.__anext__() for _ in range(2)]
+        await body.aclose()
+        return chunks
+
+    chunks = asyncio.run(scenario())
+    assert event_names(chunks) == ["reset"]
+    assert event_ids(chunks) == [""]
@@ -0,0 +1,74 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from routes import carts
+
+ITEMS = "/api/v1/carts/items"
+
+
+@pytest.fixture
+def product_id(client):
+    return client.post("/api/v1/products/", json={"name": "Teclado", "price": 10, "stock": 5}).json()["id"]
+
+
+def cart_quantities(client, user_id):
+    response = client.get("/api/v1/carts/", params={"user_id": user_id})
+    if response.status_code == 404:
+        return None
+    return [item["quantity"] for item in response.json()["items"]]
+
+
+def test_repeated_key_replays_the_stored_response(client, product_id):
+    headers = {"Idempotency-Key": "alta-1"}
+    first = client.post(ITEMS, json={"user_id": 1, "product_id": product_id}, headers=headers)
+    again = client.post(ITEMS, json={"user_id": 1, "product_id": product_id}, headers=headers)
+    assert first.status_code == again.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.json() == first.json()
+    assert cart_quantities(client, 1) == [1]
+
+
+def test_key_reused_with_another_body_is_rejected(client, product_id):
+    headers = {"Idempotency-Key": "alta-1"}
+    client.post(ITEMS, json={"user_id": 1, "product_id": product_id}, headers=headers)
+    response = client.post(ITEMS, json={"user_id": 1, "product_id": product_id, "quantity": 2}, headers=headers)
+    assert response.status_code == 422
+    assert cart_quantities(client, 1) == [1]
+
+
+def test_server_error_releases_the_key(client, product_id, monkeypatch):
+    # El carrito ya existe: el alta pasa por touch_cart, que falla una vez
+    client.post(ITEMS, json={"user_id": 1, "product_id": product_id})
+
+    def broken_touch_cart(db, cart_id):
+        raise RuntimeError("fallo simulado")
+
+    monkeypatch.setattr(carts, "touch_cart", broken_touch_cart)
+    headers = {"Idempotency-Key": "alta-2"}
+    failing = TestClient(client.app, raise_server_exceptions=False)
+    assert failing.post(ITEMS, json={"user_id": 1, "product_id": product_id}, headers=headers).status_code == 500
+    assert cart_quantities(client, 1) == [1]
+
+    monkeypatch.undo()
+    retry = client.post(ITEMS, json={"user_id": 1, "product_id": product_id}, headers=headers)
+    assert retry.status_code == 201
+    assert "Idempotent-Replayed" not in retry.headers
+    assert cart_quantities(client, 1) == [2]
+
+
+def test_failed_transactional_batch_rolls_back_and_skips_the_rest(client, product_id):
+    add = {"method": "POST", "path": ITEMS, "body": {"user_id": 2, "product_id": product_id},
+           "headers": {"Idempotency-Key": "lote-1"}}
+    missing = {"method": "POST", "path": ITEMS, "body": {"user_id": 2, "product_id": 999}}
+    response = client.post("/api/v1/batch/", json={"transaction": True, "requests": [add, missing, add]})
+    assert response.status_code == 200
+    assert response.json()["committed"] is False
+    assert [item["status"] for item in response.json()["responses"]] == [201, 404, 424]
+    assert cart_quantities(client, 2) is None
+
+    # La reclamación de la clave se revirtió con el lote: fuera de él se ejecuta de nuevo
+    retry = client.post(ITEMS, json=add["body"], headers=add["headers"])
+    assert retry.status_code == 201
+    assert "Idempotent-Replayed" not in retry.headers
+    assert cart_quantities(client, 2) == [1]
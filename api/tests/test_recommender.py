@@ -0,0 +1,41 @@
+import recommender
+from database import SessionLocal
+from models.cart import Cart, CartItem
+
+
+def add_line(cart_id, product_id):
+    db = SessionLocal()
+    try:
+        item = CartItem(cart_id=cart_id, product_id=product_id, quantity=1)
+        db.add(item)
+        db.commit()
+        return item.id
+    finally:
+        db.close()
+
+
+def test_rebuild_counts_each_line_once(db_tables, monkeypatch):
+    index = recommender.CoOccurrenceIndex(5)
+    monkeypatch.setattr(recommender, "index", index)
+    db = SessionLocal()
+    db.add_all([Cart(id=1, user_id=1), Cart(id=2, user_id=2)])
+    db.commit()
+    db.close()
+    add_line(1, 10)
+    # Confirmada antes de la lectura, pero su incremento llega durante la reconstrucción
+    counted = add_line(1, 20)
+
+    load_cart_lines = recommender.load_cart_lines
+
+    def racing_load(db):
+        index.observe(20, [10], counted)
+        lines = load_cart_lines(db)
+        # Confirmada después de la lectura: solo la cuenta su incremento
+        add_line(2, 10)
+        index.observe(20, [10], add_line(2, 20))
+        return lines
+
+    monkeypatch.setattr(recommender, "load_cart_lines", racing_load)
+    recommender.rebuild_index()
+    assert index.related(10, 5) == [(20, 2)]
+    assert index.related(20, 5) == [(10, 2)]
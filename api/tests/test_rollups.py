@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+
+import rollups
+from database import SessionLocal
+from models.analytics import CartActivityDaily, CartEvent, RollupWatermark
+
+
+def add_events(db, *ages):
+    """Un evento "add" por edad (segundos), con ids consecutivos en ese orden"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for age in ages:
+        db.add(CartEvent(kind="add", user_id=1, cart_id=1, product_id=1, quantity=1, unit_price=10,
+                         occurred_at=now - timedelta(seconds=age)))
+    db.commit()
+
+
+def watermark(db):
+    return db.execute(select(RollupWatermark.last_event_id)).scalar_one()
+
+
+def quantity_added(db):
+    return db.execute(select(CartActivityDaily.quantity_added)).scalar() or 0
+
+
+def test_watermark_stops_before_the_first_recent_event(db_tables):
+    db = SessionLocal()
+    try:
+        # El tercero simula una transacción larga: id mayor que el segundo pero occurred_at antiguo
+        add_events(db, 3600, 0, 3600)
+        assert rollups.roll_up()["events"] == 1
+        assert watermark(db) == 1
+
+        # Cuando el segundo sale de la ventana de retraso entran los dos
+        db.execute(update(CartEvent).where(CartEvent.id == 2)
+                   .values(occurred_at=datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)))
+        db.commit()
+        assert rollups.roll_up()["events"] == 2
+        assert watermark(db) == 3
+        assert quantity_added(db) == 3
+    finally:
+        db.close()
+
+
+def test_nothing_is_rolled_up_while_the_oldest_pending_event_is_recent(db_tables):
+    db = SessionLocal()
+    try:
+        add_events(db, 0, 3600)
+        assert rollups.roll_up()["events"] == 0
+        assert watermark(db) == 0
+    finally:
+        db.close()
@@ -0,0 +1,165 @@
+"""
+Coste del índice de autocompletado en memoria (api/autocomplete.py).
+
+Genera --products nombres sintéticos (tipo, adjetivo, marca y modelo, con tildes)
+con popularidad tipo Zipf y mide, sin base de datos:
+    build       carga completa del índice (lo que hace la reconstrucción periódica)
+    memoria     bytes retenidos por el índice (tracemalloc), total y por producto
+    suggest     latencia por consulta (p50/p99/máx en µs) con prefijos de 1 a 6
+                letras de palabras reales, en mayúsculas/sin tildes, y fallos
+    put         cambios de nombre por segundo (ruta de escritura de productos)
+    stock       cambios de stock por segundo con el orden por stock
+
+Con --max-p99-us y --max-memory-mib falla (código 1) si se superan los límites.
+
+    python benchmarks/autocomplete_bench.py --products 100000
+    python benchmarks/autocomplete_bench.py --products 500000 --max-p99-us 1000 --max-memory-mib 512
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KINDS = ["Cafetera", "Tostadora", "Batidora", "Lámpara", "Cámara", "Teclado", "Ratón", "Monitor",
+         "Auriculares", "Altavoz", "Mochila", "Zapatillas", "Camiseta", "Pantalón", "Reloj", "Sartén",
+         "Cuchillo", "Silla", "Escritorio", "Estantería", "Bicicleta", "Balón", "Raqueta", "Tienda"]
+ADJECTIVES = ["eléctrica", "mecánico", "inalámbrico", "portátil", "compacto", "térmica", "ergonómica",
+              "plegable", "clásico", "deportivo", "básico", "profesional", "automático", "acústico"]
+BRANDS = ["Acme", "Núcleo", "Óptima", "Zenit", "Boreal", "Vértice", "Aurora", "Pampa", "Cóndor", "Andes"]
+
+
+def synthetic_products(products, seed):
+    """[(id, nombre, stock)] y {id: popularidad}"""
+    rng = random.Random(seed)
+    catalog = [
+        (product_id,
+         f"{rng.choice(KINDS)} {rng.choice(ADJECTIVES)} {rng.choice(BRANDS)} {rng.randint(100, 9999)}",
+         rng.randint(0, 500))
+        for product_id in range(1, products + 1)
+    ]
+    popularity = {product_id: int(rng.paretovariate(1.2)) for product_id in range(1, products + 1)}
+    return catalog, popularity
+
+
+def synthetic_queries(catalog, count, seed):
+    """Prefijos de palabras de nombres reales con mayúsculas y tildes variadas, más un 10% sin resultados"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            queries.append(rng.choice(["xq", "zzz", "qwerty", "ñandú"]))
+            continue
+        word = rng.choice(rng.choice(catalog)[1].split())
+        prefix = word[:rng.randint(1, 6)]
+        queries.append(rng.choice([prefix, prefix.lower(), prefix.upper()]))
+    return queries
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memoria, carga y latencia del índice de autocompletado")
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=50_000)
+    parser.add_argument("--updates", type=int, default=5_000)
+    parser.add_argument("--rank", choices=["popularity", "stock"], default="popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-p99-us", type=float, help="Latencia p99 máxima exigida a suggest (µs)")
+    parser.add_argument("--max-memory-mib", type=float, help="Memoria máxima exigida al índice (MiB)")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ["TRACE_EXPORT_DIR"] = ""
+    sys.path.insert(0, REPO_ROOT)  # paquetes compartidos (observability, textsearch)
+    sys.path.insert(0, os.path.join(REPO_ROOT, "api"))
+    from autocomplete import AutocompleteIndex
+
+    # Memoria: se generan los datos con tracemalloc activo y se sueltan las entradas,
+    # así solo cuenta lo que el índice retiene (nombres incluidos)
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    index = AutocompleteIndex(rank_by=args.rank)
+    catalog, popularity = synthetic_products(args.products, args.seed)
+    index.replace(catalog, popularity)
+    del catalog, popularity
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    catalog, popularity = synthetic_products(args.products, args.seed)
+    start = time.perf_counter()
+    index.replace(catalog, popularity)
+    build = time.perf_counter() - start
+
+    queries = synthetic_queries(catalog, args.queries, args.seed + 1)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter_ns()
+        index.suggest(query, index.max_results)
+        latencies.append(time.perf_counter_ns() - start)
+    latencies.sort()
+
+    rng = random.Random(args.seed + 2)
+    renamed = [(rng.randint(1, args.products), rng.choice(catalog)[1]) for _ in range(args.updates)]
+    start = time.perf_counter()
+    for product_id, name in renamed:
+        index.put(product_id, name, index.stock.get(product_id, 0))
+    put = len(renamed) / (time.perf_counter() - start)
+
+    stock_index = AutocompleteIndex(rank_by="stock")
+    stock_index.replace(catalog, popularity)
+    changes = [(rng.randint(1, args.products), rng.randint(0, 500)) for _ in range(args.updates)]
+    start = time.perf_counter()
+    for product_id, stock in changes:
+        stock_index.update([(product_id, None, stock)])
+    stock_ops = len(changes) / (time.perf_counter() - start)
+
+    results = {
+        "products": args.products,
+        "rank": args.rank,
+        "index": index.stats(),
+        "build_seconds": round(build, 3),
+        "memory": {"mib": round(memory / 2 ** 20, 1), "bytes_per_product": round(memory / args.products)},
+        "suggest_us": {
+            "p50": round(percentile(latencies, 0.50) / 1000, 1),
+            "p99": round(percentile(latencies, 0.99) / 1000, 1),
+            "max": round(latencies[-1] / 1000, 1),
+        },
+        "put_ops_s": round(put),
+        "stock_ops_s": round(stock_ops),
+    }
+    print(f"{'productos':<18}{results['products']:>14,}")
+    print(f"{'claves':<18}{results['index']['keys']:>14,}")
+    print(f"{'prefijos cacheados':<18}{results['index']['cached_prefixes']:>14,}")
+    print(f"{'build (s)':<18}{results['build_seconds']:>14}")
+    print(f"{'memoria (MiB)':<18}{results['memory']['mib']:>14}")
+    print(f"{'bytes/producto':<18}{results['memory']['bytes_per_product']:>14,}")
+    print(f"{'suggest p50 (µs)':<18}{results['suggest_us']['p50']:>14}")
+    print(f"{'suggest p99 (µs)':<18}{results['suggest_us']['p99']:>14}")
+    print(f"{'suggest máx (µs)':<18}{results['suggest_us']['max']:>14}")
+    print(f"{'put/s':<18}{results['put_ops_s']:>14,}")
+    print(f"{'stock/s':<18}{results['stock_ops_s']:>14,}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    failed = False
+    if args.max_p99_us and results["suggest_us"]["p99"] > args.max_p99_us:
+        print(f"Latencia p99 por encima de {args.max_p99_us}µs")
+        failed = True
+    if args.max_memory_mib and results["memory"]["mib"] > args.max_memory_mib:
+        print(f"Memoria por encima de {args.max_memory_mib} MiB")
+        failed = True
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,102 @@
+"""
+Throughput de las operaciones masivas del panel frente a una petición por fila.
+
+Aplica el mismo cambio de precio/stock a --rows productos de dos formas contra
+la app ASGI (sin red) sobre SQLite local, y registra filas por segundo:
+    per_row   PUT /api/v1/admin/products/{id}, una petición y un commit por fila
+    bulk      POST /api/v1/admin/products/bulk, un solo UPDATE ... FROM (VALUES ...)
+
+Con --min-speedup falla (código 1) si bulk no es al menos esa cantidad de veces
+más rápido. Contra PostgreSQL la diferencia es mayor: cada fila evita además un
+viaje de red y un commit con fsync.
+
+    python benchmarks/bulk_bench.py --rows 1000
+    python benchmarks/bulk_bench.py --rows 5000 --min-speedup 10 --output bulk.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from microbench import SEED_PRODUCTS, asgi_request, setup_app
+
+
+def run_per_row(loop, app, headers, ids, price):
+    start = time.perf_counter()
+    for product_id in ids:
+        status, _ = loop.run_until_complete(asgi_request(
+            app, "PUT", f"/api/v1/admin/products/{product_id}",
+            body={"price": price, "stock_delta": 1}, headers=headers,
+        ))
+        assert status == 200, f"PUT {product_id} -> {status}"
+    return time.perf_counter() - start
+
+
+def run_bulk(loop, app, headers, ids, price, chunk):
+    start = time.perf_counter()
+    for offset in range(0, len(ids), chunk):
+        items = [{"id": product_id, "price": price, "stock_delta": 1} for product_id in ids[offset:offset + chunk]]
+        status, body = loop.run_until_complete(asgi_request(
+            app, "POST", "/api/v1/admin/products/bulk", body={"items": items}, headers=headers,
+        ))
+        assert status == 200, f"bulk -> {status}"
+        assert json.loads(body)["updated"] == len(items)
+    return time.perf_counter() - start
+
+
+def add_products(count):
+    """Completa el catálogo hasta count productos"""
+    from database import SessionLocal
+    from models.product import Product
+
+    db = SessionLocal()
+    existing = db.query(Product).count()
+    db.add_all(Product(name=f"Producto extra {i}", price=1000, stock=10) for i in range(existing, count))
+    db.commit()
+    ids = [row.id for row in db.query(Product.id).order_by(Product.id).limit(count)]
+    db.close()
+    return ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Operaciones masivas frente a una petición por fila")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--chunk", type=int, default=5000, help="Filas por petición masiva (<= ADMIN_BULK_MAX_ITEMS)")
+    parser.add_argument("--min-speedup", type=float, help="Aceleración mínima exigida a bulk frente a per_row")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app, _ = setup_app(os.path.join(tmp, "bulk_bench.db"))
+        from routes.users import create_access_token
+
+        ids = add_products(max(args.rows, SEED_PRODUCTS))[:args.rows]
+        # user0 es administrador en los datos de prueba
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user0'})}"}
+        loop = asyncio.new_event_loop()
+        run_bulk(loop, app, headers, ids[:10], 1, args.chunk)  # calentamiento
+
+        per_row = run_per_row(loop, app, headers, ids, 1234)
+        bulk = run_bulk(loop, app, headers, ids, 4321, args.chunk)
+
+    results = {
+        "rows": args.rows,
+        "per_row": {"seconds": round(per_row, 3), "rows_s": round(args.rows / per_row, 1)},
+        "bulk": {"seconds": round(bulk, 3), "rows_s": round(args.rows / bulk, 1)},
+        "speedup": round(per_row / bulk, 1),
+    }
+    print(f"{'modo':<10}{'segundos':>10}{'filas/s':>12}")
+    for mode in ("per_row", "bulk"):
+        print(f"{mode:<10}{results[mode]['seconds']:>10}{results[mode]['rows_s']:>12}")
+    print(f"\nbulk es {results['speedup']}x más rápido ({args.rows} filas)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.min_speedup and results["speedup"] < args.min_speedup:
+        print(f"Aceleración por debajo de {args.min_speedup}x")
+        sys.exit(1)
@@ -0,0 +1,370 @@
+"""
+Generador de carga con recorridos realistas de la tienda.
+
+Cada usuario virtual elige un recorrido según la mezcla configurada y lo
+ejecuta paso a paso; se mide cada paso por separado (throughput, p50/p95/p99
+y tasa de errores). Los resultados se guardan en JSON y se comparan contra
+una línea base para detectar regresiones antes de desplegar.
+
+Recorridos:
+    anonymous  GET / y GET /products
+    api_login  POST /api/v1/users/login
+    shopper    login en la webapp, agregar al carrito, ver carrito, cambiar cantidades
+    admin      login de admin y edición de un producto
+
+Perfiles:
+    constant   --users usuarios durante --duration segundos
+    ramp       de 1 a --users usuarios en --ramp segundos y luego se mantiene
+    soak       --users usuarios durante mucho tiempo con snapshots cada --soak-interval
+
+Ejemplos:
+    # Contra el stack de docker compose (a través del proxy)
+    python benchmarks/loadtest.py --profile ramp --users 50 --duration 120 --output results.json
+    # Dentro del proceso (API con uvicorn + webapp con werkzeug sobre SQLite)
+    python benchmarks/loadtest.py --in-process --users 10 --duration 30
+    # Guardar como línea base y comparar la siguiente ejecución
+    python benchmarks/loadtest.py --output base.json --save-baseline benchmarks/baselines/loadtest.json
+    python benchmarks/loadtest.py --baseline benchmarks/baselines/loadtest.json
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from microcache_bench import percentile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Credenciales de los datos de prueba de database/schema.sql
+DEFAULT_SHOPPERS = [("juan", "juanUser123"), ("maria", "marioUser123"), ("pedro", "pedroUser123")]
+DEFAULT_ADMIN = ("admin", "admin123")
+
+DEFAULT_MIX = {"anonymous": 60, "shopper": 30, "api_login": 5, "admin": 5}
+
+
+class StepStats:
+    """Latencias y errores por paso, compartidas entre usuarios virtuales"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, step, elapsed_ms, ok):
+        with self.lock:
+            self.latencies[step].append(elapsed_ms)
+            if not ok:
+                self.errors[step] += 1
+
+    def snapshot(self, duration):
+        with self.lock:
+            summary = {}
+            for step, latencies in sorted(self.latencies.items()):
+                total = len(latencies)
+                summary[step] = {
+                    "requests": total,
+                    "rps": round(total / duration, 2) if duration else 0.0,
+                    "errors": self.errors[step],
+                    "error_rate": round(self.errors[step] / total, 4) if total else 0.0,
+                    "p50_ms": round(percentile(latencies, 50), 2),
+                    "p95_ms": round(percentile(latencies, 95), 2),
+                    "p99_ms": round(percentile(latencies, 99), 2),
+                }
+            return summary
+
+
+class VirtualUser:
+    """Un usuario con su propia sesión HTTP (cookies de Flask incluidas)"""
+
+    def __init__(self, web_url, api_url, stats, product_ids, shoppers, admin):
+        self.web_url = web_url
+        self.api_url = api_url
+        self.stats = stats
+        self.product_ids = product_ids
+        self.shoppers = shoppers
+        self.admin = admin
+        self.http = requests.Session()
+
+    def step(self, name, method, url, ok_status=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = self.http.request(method, url, timeout=15, allow_redirects=False, **kwargs)
+            ok = resp.status_code in ok_status
+        except requests.RequestException:
+            resp = None
+            ok = False
+        self.stats.record(name, (time.perf_counter() - start) * 1000, ok)
+        return resp
+
+    def web_login(self, username, password):
+        self.http.cookies.clear()
+        resp = self.step("webapp_login", "POST", f"{self.web_url}/login",
+                         ok_status=(302,), data={"username": username, "password": password})
+        return resp is not None and resp.status_code == 302
+
+    # --- Recorridos ---
+    def anonymous(self):
+        self.http.cookies.clear()
+        self.step("home", "GET", f"{self.web_url}/")
+        self.step("products_page", "GET", f"{self.web_url}/products")
+
+    def api_login(self):
+        username, password = random.choice(self.shoppers)
+        self.step("api_login", "POST", f"{self.api_url}/api/v1/users/login",
+                  json={"username": username, "password": password})
+
+    def shopper(self):
+        username, password = random.choice(self.shoppers)
+        if not self.web_login(username, password):
+            return
+        self.step("products_page", "GET", f"{self.web_url}/products")
+        product_id = random.choice(self.product_ids)
+        self.step("add_to_cart", "POST", f"{self.web_url}/add-to-cart/{product_id}",
+                  ok_status=(302,), data={"quantity": random.randint(1, 3)})
+        resp = self.step("cart_page", "GET", f"{self.web_url}/cart")
+        item_ids = []
+        if resp is not None and resp.status_code == 200:
+            marker = 'data-item-id="'
+            text = resp.text
+            pos = text.find(marker)
+            while pos != -1:
+                end = text.find('"', pos + len(marker))
+                item_ids.append(text[pos + len(marker):end])
+                pos = text.find(marker, end)
+        if item_ids:
+            self.step("update_quantity", "POST", f"{self.web_url}/update-cart-item/{random.choice(item_ids)}",
+                      json={"quantity": random.randint(1, 5)})
+
+    def admin_edit(self):
+        if not self.web_login(*self.admin):
+            return
+        product_id = random.choice(self.product_ids)
+        resp = self.step("admin_product_read", "GET", f"{self.api_url}/api/v1/products/{product_id}")
+        if resp is None or resp.status_code != 200:
+            return
+        product = resp.json()
+        self.step("admin_update_product", "POST", f"{self.web_url}/admin/update-product", ok_status=(302,), data={
+            "id": product_id,
+            "name": product["name"],
+            "description": product.get("description") or "",
+            "price": product["price"],
+            "stock": max(0, int(product["stock"]) + random.choice((-1, 1))),
+            "image_url": product.get("image_url") or "",
+        })
+
+    def run_journey(self, journey):
+        {
+            "anonymous": self.anonymous,
+            "api_login": self.api_login,
+            "shopper": self.shopper,
+            "admin": self.admin_edit,
+        }[journey]()
+
+
+def users_at(profile, elapsed, args):
+    """Número de usuarios activos en el instante elapsed según el perfil"""
+    if profile == "ramp" and elapsed < args.ramp:
+        return max(1, int(args.users * elapsed / args.ramp))
+    return args.users
+
+
+def run_load(args, web_url, api_url):
+    stats = StepStats()
+    products = requests.get(f"{api_url}/api/v1/products/", timeout=15).json()
+    product_ids = [p["id"] for p in products] or [1]
+    journeys, weights = zip(*args.mix.items())
+
+    stop = threading.Event()
+    active = []  # eventos de parada por usuario virtual
+    started = time.monotonic()
+    snapshots = []
+
+    def user_loop(user_stop):
+        user = VirtualUser(web_url, api_url, stats, product_ids, DEFAULT_SHOPPERS, DEFAULT_ADMIN)
+        while not stop.is_set() and not user_stop.is_set():
+            user.run_journey(random.choices(journeys, weights)[0])
+            if args.think_time:
+                time.sleep(random.uniform(0, args.think_time))
+
+    threads = []
+    next_snapshot = args.soak_interval
+    while True:
+        elapsed = time.monotonic() - started
+        if elapsed >= args.duration:
+            break
+        target = users_at(args.profile, elapsed, args)
+        while len(active) < target:
+            user_stop = threading.Event()
+            thread = threading.Thread(target=user_loop, args=(user_stop,), daemon=True)
+            thread.start()
+            active.append(user_stop)
+            threads.append(thread)
+        while len(active) > target:
+            active.pop().set()
+        if args.profile == "soak" and elapsed >= next_snapshot:
+            snapshots.append({"elapsed_s": round(elapsed), "steps": stats.snapshot(elapsed)})
+            next_snapshot += args.soak_interval
+        time.sleep(0.2)
+
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=20)
+
+    duration = time.monotonic() - started
+    return {
+        "profile": args.profile,
+        "users": args.users,
+        "duration_s": round(duration, 1),
+        "mix": args.mix,
+        "steps": stats.snapshot(duration),
+        "snapshots": snapshots,
+    }
+
+
+def compare(results, baseline, max_latency_regression, max_error_rate_increase):
+    """Devuelve la lista de regresiones por paso respecto a la línea base"""
+    regressions = []
+    for step, base in baseline.get("steps", {}).items():
+        current = results["steps"].get(step)
+        if current is None:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if base[metric] and current[metric] > base[metric] * (1 + max_latency_regression):
+                regressions.append(f"{step}: {metric} {base[metric]} -> {current[metric]}")
+        if current["error_rate"] > base["error_rate"] + max_error_rate_increase:
+            regressions.append(f"{step}: error_rate {base['error_rate']} -> {current['error_rate']}")
+    return regressions
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_in_process(database_url):
+    """
+    Levanta la API (uvicorn) y la webapp (werkzeug) en hilos de este proceso,
+    sobre una base de datos local con los datos de prueba de schema.sql.
+    """
+    api_port, web_port = _free_port(), _free_port()
+    os.environ.setdefault("DATABASE_URL", database_url)
+    os.environ["API_URL"] = f"http://127.0.0.1:{api_port}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    sys.path.insert(0, REPO_ROOT)  # paquetes compartidos (observability, textsearch)
+    sys.path.insert(0, os.path.join(REPO_ROOT, "api"))
+    import uvicorn
+    from main import app as api_app
+    from database import Base, SessionLocal, engine
+    from models.product import Product
+    from models.user import User
+    from routes.users import hash_password
+    import models.cart  # noqa: F401  (registrar las tablas del carrito)
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    if not db.query(User).first():
+        for username, password in DEFAULT_SHOPPERS + [DEFAULT_ADMIN]:
+            db.add(User(username=username, email=f"{username}@example.com",
+                        password_hash=hash_password(password), is_admin=(username == DEFAULT_ADMIN[0])))
+        for i in range(1, 13):
+            db.add(Product(name=f"Producto {i}", description="Producto de prueba", price=1000 * i, stock=100))
+        db.commit()
+    db.close()
+
+    server = uvicorn.Server(uvicorn.Config(api_app, host="127.0.0.1", port=api_port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+
+    # La webapp importa sus módulos por nombre (utils, resilience...) desde su carpeta.
+    # Logging y trazas son el paquete observability, compartido: en este modo ambos
+    # servicios escriben con el nombre del último que se configura (webapp)
+    sys.path.insert(0, os.path.join(REPO_ROOT, "webapp"))
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    from app import app as web_app
+    web_server = make_server("127.0.0.1", web_port, web_app, threaded=True)
+    threading.Thread(target=web_server.serve_forever, daemon=True).start()
+
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{api_port}/health", timeout=1)
+            break
+        except requests.RequestException:
+            time.sleep(0.2)
+    return f"http://127.0.0.1:{web_port}", f"http://127.0.0.1:{api_port}"
+
+
+def parse_mix(raw):
+    mix = {}
+    for part in raw.split(","):
+        name, weight = part.split("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Recorrido desconocido: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pruebas de carga con recorridos de la tienda")
+    parser.add_argument("--web-url", default="http://localhost")
+    parser.add_argument("--api-url", default="http://localhost")
+    parser.add_argument("--in-process", action="store_true", help="Levantar API y webapp en este proceso")
+    parser.add_argument("--database-url", default="sqlite:////tmp/tienda_loadtest.db")
+    parser.add_argument("--profile", choices=("constant", "ramp", "soak"), default="constant")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--ramp", type=float, default=30.0, help="Segundos de rampa (perfil ramp)")
+    parser.add_argument("--soak-interval", type=float, default=300.0, help="Segundos entre snapshots (perfil soak)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pausa máxima entre recorridos (s)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Pesos de los recorridos, p. ej. anonymous=60,shopper=30,api_login=5,admin=5")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--baseline", help="Resultados de referencia contra los que comparar")
+    parser.add_argument("--save-baseline", help="Guardar estos resultados como nueva línea base")
+    parser.add_argument("--max-latency-regression", type=float, default=0.2,
+                        help="Aumento relativo máximo permitido de p95/p99 (0.2 = 20%%)")
+    parser.add_argument("--max-error-rate-increase", type=float, default=0.01)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.in_process:
+        web_url, api_url = start_in_process(args.database_url)
+    else:
+        web_url, api_url = args.web_url.rstrip("/"), args.api_url.rstrip("/")
+
+    results = run_load(args, web_url, api_url)
+
+    print(f"{'paso':<22}{'req':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>7}")
+    for step, row in results["steps"].items():
+        print(f"{step:<22}{row['requests']:>8}{row['rps']:>9}{row['p50_ms']:>9}"
+              f"{row['p95_ms']:>9}{row['p99_ms']:>9}{row['error_rate'] * 100:>6.1f}%")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_latency_regression, args.max_error_rate_increase)
+        if regressions:
+            print("\nRegresiones respecto a la línea base:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\nSin regresiones respecto a la línea base")
@@ -0,0 +1,213 @@
+"""
+Micro-benchmarks en proceso de los caminos calientes de la API.
+
+Ejecuta cada caso contra la app ASGI (sin red ni servidor) o llamando a la
+función directamente, sobre una base de datos SQLite local con datos de
+prueba, y registra:
+    ops_s     operaciones por segundo (mejor de --repeat rondas)
+    peak_kib  memoria máxima asignada durante una operación (tracemalloc)
+
+Con --baseline falla (código 1) si alguna métrica empeora más allá del umbral.
+
+    python benchmarks/microbench.py
+    python benchmarks/microbench.py --save-baseline benchmarks/baselines/microbench.json
+    python benchmarks/microbench.py --baseline benchmarks/baselines/microbench.json --max-regression 0.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEED_PRODUCTS = 500
+SEED_USERS = 200
+CART_ITEMS = 50
+
+
+async def asgi_request(app, method, path, query_string=b"", body=None, headers=None):
+    """Llama a la app ASGI directamente y devuelve (status, body)"""
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query_string,
+        "headers": [
+            (b"host", b"bench"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+        ] + [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    request_sent = False
+    messages = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # El cliente nunca se desconecta: se espera hasta que la respuesta termine
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    status = next(m["status"] for m in messages if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return status, body
+
+
+def setup_app(database_path):
+    """Importa la API sobre una base SQLite y carga los datos de prueba"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{database_path}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["TRACE_EXPORT_DIR"] = ""
+    sys.path.insert(0, REPO_ROOT)  # paquetes compartidos (observability, textsearch)
+    sys.path.insert(0, os.path.join(REPO_ROOT, "api"))
+
+    from main import app
+    from database import Base, SessionLocal, engine
+    from models.cart import Cart, CartItem
+    from models.product import Product
+    from models.user import User
+    from routes.users import hash_password
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    password_hash = hash_password("benchUser123")
+    db.add_all(User(username=f"user{i}", email=f"user{i}@example.com", password_hash=password_hash,
+                    is_admin=(i % 20 == 0)) for i in range(SEED_USERS))
+    db.add_all(Product(name=f"Producto {i}", description="Descripción de prueba " * 10,
+                       price=1000 + i, stock=i % 50, image_url=f"https://img.example.com/{i}.png")
+               for i in range(SEED_PRODUCTS))
+    db.flush()
+    cart = Cart(user_id=1)
+    db.add(cart)
+    db.flush()
+    db.add_all(CartItem(cart_id=cart.id, product_id=i + 1, quantity=1) for i in range(CART_ITEMS))
+    db.commit()
+    db.close()
+    return app, password_hash
+
+
+def build_cases(app, password_hash):
+    """Casos de benchmark: nombre -> función síncrona que ejecuta una operación"""
+    from database import SessionLocal
+    from models.product import Product
+    from models.user import User
+    from routes.admin import serialize_product, serialize_user
+    from routes.users import create_access_token, verify_password
+
+    loop = asyncio.new_event_loop()
+    db = SessionLocal()
+    products = db.query(Product).all()
+    users = db.query(User).all()
+
+    def http(method, path, query_string=b"", body=None):
+        def op():
+            status, _ = loop.run_until_complete(asgi_request(app, method, path, query_string, body))
+            assert status < 400, f"{method} {path} -> {status}"
+        return op
+
+    return {
+        "serialize_product_x500": lambda: [serialize_product(p) for p in products],
+        "serialize_user_x200": lambda: [serialize_user(u) for u in users],
+        "GET /api/v1/products/": http("GET", "/api/v1/products/"),
+        "GET /api/v1/products/?fields=": http("GET", "/api/v1/products/", b"fields=id,name,price"),
+        "GET /api/v1/products/{id}": http("GET", "/api/v1/products/1"),
+        "GET /api/v1/users/": http("GET", "/api/v1/users/"),
+        "GET /api/v1/admin/products": http("GET", "/api/v1/admin/products"),
+        "GET /api/v1/carts/ (50 items)": http("GET", "/api/v1/carts/", b"user_id=1"),
+        "create_access_token": lambda: create_access_token({"sub": "user1"}),
+        "verify_password": lambda: verify_password("benchUser123", password_hash),
+    }
+
+
+def measure(op, min_time, repeat):
+    """Mejor ops/s de varias rondas de al menos min_time segundos, y pico de memoria por operación"""
+    op()  # calentamiento
+    best = 0.0
+    for _ in range(repeat):
+        count = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            op()
+            count += 1
+            elapsed = time.perf_counter() - start
+        best = max(best, count / elapsed)
+
+    tracemalloc.start()
+    baseline_current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    op()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ops_s": round(best, 1), "peak_kib": round((peak - baseline_current) / 1024, 1)}
+
+
+def compare(results, baseline, max_regression):
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current["ops_s"] < base["ops_s"] * (1 - max_regression):
+            regressions.append(f"{name}: ops_s {base['ops_s']} -> {current['ops_s']}")
+        if base["peak_kib"] and current["peak_kib"] > base["peak_kib"] * (1 + max_regression):
+            regressions.append(f"{name}: peak_kib {base['peak_kib']} -> {current['peak_kib']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de la API")
+    parser.add_argument("--filter", help="Ejecutar solo los casos que contengan este texto")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Duración mínima de cada ronda (s)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--baseline", help="Resultados de referencia contra los que comparar")
+    parser.add_argument("--save-baseline", help="Guardar estos resultados como nueva línea base")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Empeoramiento relativo máximo permitido (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app, password_hash = setup_app(os.path.join(tmp, "microbench.db"))
+        cases = build_cases(app, password_hash)
+
+        results = {}
+        print(f"{'caso':<34}{'ops/s':>12}{'peak KiB':>11}")
+        for name, op in cases.items():
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = measure(op, args.min_time, args.repeat)
+            print(f"{name:<34}{results[name]['ops_s']:>12}{results[name]['peak_kib']:>11}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegresiones respecto a la línea base:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\nSin regresiones respecto a la línea base")
@@ -0,0 +1,125 @@
+"""
+Benchmark de la micro-caché de nginx.
+
+Lanza peticiones GET concurrentes contra las rutas del catálogo a través del
+proxy y reporta throughput, latencias (p50/p95/p99) y la tasa de aciertos de
+caché a partir de la cabecera X-Cache-Status.
+
+Para ver el efecto, comparar dos ejecuciones:
+
+    MICROCACHE=off docker compose up -d --build proxy
+    python benchmarks/microcache_bench.py --output off.json
+    MICROCACHE=on docker compose up -d --build proxy
+    python benchmarks/microcache_bench.py --output on.json --compare off.json
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_PATHS = ["/", "/products", "/api/v1/products/", "/api/v1/products/1"]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(base_url, paths, concurrency, duration, headers=None):
+    """Ejecuta la carga y devuelve las métricas por ruta"""
+    results = {path: {"latencies": [], "cache": Counter(), "errors": 0} for path in paths}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+    local = threading.local()
+
+    def worker(worker_id):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            local.session.headers.update(headers or {})
+        i = worker_id
+        while time.monotonic() < stop_at:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                resp = local.session.get(base_url + path, timeout=10, allow_redirects=False)
+                elapsed = (time.perf_counter() - start) * 1000
+                ok = resp.status_code < 500
+                cache_status = resp.headers.get("X-Cache-Status", "NONE")
+            except requests.RequestException:
+                elapsed = (time.perf_counter() - start) * 1000
+                ok = False
+                cache_status = "ERROR"
+            with lock:
+                entry = results[path]
+                entry["latencies"].append(elapsed)
+                entry["cache"][cache_status] += 1
+                if not ok:
+                    entry["errors"] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for worker_id in range(concurrency):
+            pool.submit(worker, worker_id)
+
+    summary = {}
+    for path, entry in results.items():
+        latencies = entry["latencies"]
+        total = len(latencies)
+        hits = entry["cache"].get("HIT", 0) + entry["cache"].get("STALE", 0) + entry["cache"].get("UPDATING", 0)
+        summary[path] = {
+            "requests": total,
+            "rps": round(total / duration, 1),
+            "errors": entry["errors"],
+            "hit_ratio": round(hits / total, 3) if total else 0.0,
+            "cache_status": dict(entry["cache"]),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        }
+    return summary
+
+
+def print_summary(summary, baseline=None):
+    header = f"{'ruta':<24}{'rps':>9}{'hit%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>6}"
+    print(header)
+    print("-" * len(header))
+    for path, row in summary.items():
+        print(f"{path:<24}{row['rps']:>9}{row['hit_ratio'] * 100:>6.1f}%"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['errors']:>6}")
+        if baseline and path in baseline:
+            base = baseline[path]
+            speedup = base["p50_ms"] / row["p50_ms"] if row["p50_ms"] else 0
+            rps_gain = row["rps"] / base["rps"] if base["rps"] else 0
+            print(f"{'  vs baseline':<24}{rps_gain:>8.2f}x{'':>7}{speedup:>8.2f}x (p50)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la micro-caché del proxy")
+    parser.add_argument("--base-url", default="http://localhost")
+    parser.add_argument("--path", action="append", dest="paths", help="Ruta a medir (repetible)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="Segundos de carga")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--compare", help="Resultados JSON de otra ejecución (p. ej. con MICROCACHE=off)")
+    args = parser.parse_args()
+
+    summary = run(args.base_url.rstrip("/"), args.paths or DEFAULT_PATHS, args.concurrency, args.duration)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_summary(summary, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
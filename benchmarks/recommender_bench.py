@@ -0,0 +1,96 @@
+"""
+Coste del índice de recomendaciones "comprados juntos" (api/recommender.py).
+
+Genera --lines líneas de carrito sintéticas (popularidad de productos tipo
+Zipf, de 1 a --max-cart-lines líneas por carrito) y mide, sin base de datos:
+    rebuild     co_occurrences + build: de las líneas al top-K de cada producto
+    observe     incrementos por segundo (un producto nuevo en un carrito de 4)
+    related     consultas por segundo del top-K precalculado
+
+Con --max-rebuild-seconds falla (código 1) si la reconstrucción tarda más.
+
+    python benchmarks/recommender_bench.py --lines 1000000
+    python benchmarks/recommender_bench.py --lines 5000000 --products 100000 --max-rebuild-seconds 120
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def synthetic_lines(lines, products, max_cart_lines, seed):
+    """(cart_ids, product_ids) ordenados por carrito, sin productos repetidos en un carrito"""
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, max_cart_lines + 1, size=lines // ((max_cart_lines + 1) // 2) + 1)
+    sizes = sizes[np.cumsum(sizes) <= lines]
+    cart_ids = np.repeat(np.arange(1, len(sizes) + 1), sizes)
+    product_ids = np.minimum(rng.zipf(1.3, size=len(cart_ids)), products).astype(np.int64)
+    # Una línea por (carrito, producto), como en cart_items
+    keys = np.unique(cart_ids * (products + 1) + product_ids)
+    return keys // (products + 1), keys % (products + 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstrucción y consultas del índice de recomendaciones")
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--max-cart-lines", type=int, default=8, help="Líneas máximas por carrito sintético")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-rebuild-seconds", type=float, help="Tiempo máximo exigido a la reconstrucción")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ["TRACE_EXPORT_DIR"] = ""
+    sys.path.insert(0, REPO_ROOT)  # paquetes compartidos (observability, textsearch)
+    sys.path.insert(0, os.path.join(REPO_ROOT, "api"))
+    from recommender import CoOccurrenceIndex, co_occurrences
+
+    cart_ids, product_ids = synthetic_lines(args.lines, args.products, args.max_cart_lines, args.seed)
+    index = CoOccurrenceIndex(args.top_k)
+
+    start = time.perf_counter()
+    a, b, counts = co_occurrences(cart_ids, product_ids)
+    index.finish_rebuild(index.build(a, b, counts))
+    rebuild = time.perf_counter() - start
+
+    rng = np.random.default_rng(args.seed + 1)
+    popular = product_ids[rng.integers(0, len(product_ids), size=20_000)].tolist()
+    start = time.perf_counter()
+    for position in range(0, len(popular) - 4, 4):
+        index.observe(popular[position], popular[position + 1:position + 4])
+    observe = (len(popular) // 4) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for product_id in popular:
+        index.related(product_id, args.top_k)
+    related = len(popular) / (time.perf_counter() - start)
+
+    results = {
+        "cart_lines": int(len(cart_ids)),
+        "carts": int(len(np.unique(cart_ids))),
+        "pairs": int(len(a)),
+        "rebuild": {"seconds": round(rebuild, 3), "lines_s": round(len(cart_ids) / rebuild)},
+        "observe_ops_s": round(observe),
+        "related_ops_s": round(related),
+        "index": index.stats(),
+    }
+    print(f"{'líneas':<14}{results['cart_lines']:>14,}")
+    print(f"{'pares':<14}{results['pairs']:>14,}")
+    print(f"{'rebuild (s)':<14}{results['rebuild']['seconds']:>14}")
+    print(f"{'observe/s':<14}{results['observe_ops_s']:>14,}")
+    print(f"{'related/s':<14}{results['related_ops_s']:>14,}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.max_rebuild_seconds and rebuild > args.max_rebuild_seconds:
+        print(f"Reconstrucción por encima de {args.max_rebuild_seconds}s")
+        sys.exit(1)
@@ -0,0 +1,71 @@
+"""
+Prueba de escalado horizontal: mide el throughput del stack con 1..N réplicas
+de api y webapp detrás del proxy y comprueba que crece de forma casi lineal.
+
+Requiere el stack de docker compose. La micro-caché se salta enviando una
+cabecera Authorization para medir el trabajo real de las réplicas.
+
+    python benchmarks/scaling_bench.py --replicas 1 2 3 4 --output scaling.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from microcache_bench import run
+
+DEFAULT_PATHS = ["/products", "/api/v1/products/", "/api/v1/products/1"]
+
+
+def scale(replicas):
+    """Escala api y webapp y espera a que todas las réplicas estén sanas"""
+    subprocess.run(
+        ["docker", "compose", "up", "-d", "--wait",
+         "--scale", f"api={replicas}", "--scale", f"webapp={replicas}"],
+        check=True,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput con 1..N réplicas")
+    parser.add_argument("--base-url", default="http://localhost")
+    parser.add_argument("--replicas", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--concurrency-per-replica", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--settle", type=float, default=10.0,
+                        help="Segundos de espera tras escalar (re-resolución DNS del proxy)")
+    parser.add_argument("--min-efficiency", type=float, default=0.75,
+                        help="Eficiencia mínima rps(N) / (N * rps(1)) para considerar el escalado lineal")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    headers = {"Authorization": "Bearer scaling-bench"}
+    results = {}
+    for replicas in args.replicas:
+        scale(replicas)
+        time.sleep(args.settle)
+        # Calentamiento breve antes de medir
+        run(args.base_url, DEFAULT_PATHS, replicas * args.concurrency_per_replica, 3, headers)
+        summary = run(args.base_url, DEFAULT_PATHS, replicas * args.concurrency_per_replica, args.duration, headers)
+        total_rps = sum(row["rps"] for row in summary.values())
+        errors = sum(row["errors"] for row in summary.values())
+        results[replicas] = {"rps": round(total_rps, 1), "errors": errors, "routes": summary}
+
+    base = results[args.replicas[0]]["rps"] / args.replicas[0]
+    print(f"{'réplicas':>9}{'rps':>10}{'speedup':>10}{'eficiencia':>12}{'errores':>9}")
+    failed = False
+    for replicas, row in results.items():
+        speedup = row["rps"] / base if base else 0
+        efficiency = speedup / replicas
+        row["efficiency"] = round(efficiency, 3)
+        failed = failed or efficiency < args.min_efficiency
+        print(f"{replicas:>9}{row['rps']:>10}{speedup:>9.2f}x{efficiency:>12.2f}{row['errors']:>9}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if failed:
+        print(f"El escalado no es lineal (eficiencia < {args.min_efficiency})")
+        sys.exit(1)
@@ -8,7 +8,8 @@ CREATE TABLE IF NOT EXISTS users (
     password_hash VARCHAR(128) NOT NULL,
     is_active BOOLEAN DEFAULT TRUE,
     is_admin BOOLEAN DEFAULT FALSE,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    version INTEGER NOT NULL DEFAULT 1
 );
 
 -- Tabla de productos  
@@ -19,7 +20,22 @@ CREATE TABLE IF NOT EXISTS products (
     price NUMERIC(10,2) NOT NULL,
     stock INTEGER NOT NULL DEFAULT 0,
     image_url VARCHAR(255),
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    version INTEGER NOT NULL DEFAULT 1,
+    deleted_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Productos retirados que el archivador ya sacó de products
+CREATE TABLE IF NOT EXISTS products_archive (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    description TEXT,
+    price NUMERIC(10,2) NOT NULL,
+    stock INTEGER NOT NULL DEFAULT 0,
+    image_url VARCHAR(255),
+    created_at TIMESTAMP WITH TIME ZONE,
+    deleted_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Tabla de carritos
@@ -39,17 +55,157 @@ CREATE TABLE IF NOT EXISTS cart_items (
     added_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Columna version (control de concurrencia optimista) en bases ya creadas
+ALTER TABLE users ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE products ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+-- Borrado lógico de productos en bases ya creadas
+ALTER TABLE products ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE;
+
 -- Agregar índices para mejorar el rendimiento de las búsquedas
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
-CREATE INDEX IF NOT EXISTS idx_products_name ON products(name);
 CREATE INDEX IF NOT EXISTS idx_carts_user_id ON carts(user_id);
+-- Caducidad de carritos abandonados (los más antiguos primero, ver api/cart_expiry.py)
+CREATE INDEX IF NOT EXISTS idx_carts_updated_at ON carts(updated_at);
 CREATE INDEX IF NOT EXISTS idx_cart_items_cart_id ON cart_items(cart_id);
 CREATE INDEX IF NOT EXISTS idx_cart_items_product_id ON cart_items(product_id);
 
+-- Índices parciales de productos: el catálogo (orden por id, búsqueda por
+-- nombre) solo recorre filas vivas y el archivador solo las retiradas, así los
+-- productos borrados no engordan los índices calientes
+DROP INDEX IF EXISTS idx_products_name;
+CREATE INDEX IF NOT EXISTS idx_products_active_id ON products(id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_products_active_name ON products(name) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_products_deleted_at ON products(deleted_at) WHERE deleted_at IS NOT NULL;
+
 -- Las restricciones de clave foránea ya están definidas en las tablas carts
 
 
+-- ==========================
+-- Invalidación de cachés de la API (LISTEN/NOTIFY)
+-- ==========================
+-- Cada sentencia que modifica products o users publica en el canal
+-- cache_invalidation un JSON {"table", "op", "ids", "seq"}. Con muchas filas (o un
+-- TRUNCATE) ids es null y los listeners vacían todo lo que depende de la tabla.
+-- seq identifica la notificación igual en todas las réplicas (ids de los eventos SSE).
+-- Triggers por sentencia con tablas de transición: una carga masiva con COPY
+-- genera una sola notificación, no una por fila.
+CREATE SEQUENCE IF NOT EXISTS cache_notification_seq;
+
+CREATE OR REPLACE FUNCTION notify_cache_invalidation() RETURNS trigger AS $$
+DECLARE
+    changed_ids INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(id) INTO changed_ids FROM (SELECT id FROM new_rows LIMIT 501) AS s;
+    ELSIF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT array_agg(id) INTO changed_ids FROM (SELECT id FROM old_rows LIMIT 501) AS s;
+    END IF;
+
+    IF changed_ids IS NULL AND TG_OP <> 'TRUNCATE' THEN
+        RETURN NULL;  -- la sentencia no tocó ninguna fila
+    END IF;
+    IF array_length(changed_ids, 1) > 500 THEN
+        changed_ids := NULL;  -- el payload de NOTIFY está limitado a 8000 bytes
+    END IF;
+
+    PERFORM pg_notify('cache_invalidation', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'ids', changed_ids,
+        'seq', nextval('cache_notification_seq')
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tbl TEXT;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['products', 'users'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_cache_insert', tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation()', tbl || '_cache_insert', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_cache_update', tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation()', tbl || '_cache_update', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_cache_delete', tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation()', tbl || '_cache_delete', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_cache_truncate', tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidation()', tbl || '_cache_truncate', tbl);
+    END LOOP;
+END $$;
+
+
+-- ==========================
+-- Claves de idempotencia de la API (cabecera Idempotency-Key)
+-- ==========================
+-- key es un sha256 de (credenciales, método, ruta, clave del cliente) y
+-- fingerprint el sha256 del cuerpo. status_code NULL = petición original en
+-- curso; mientras tanto expires_at es el plazo tras el que se da por abandonada.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key CHAR(64) PRIMARY KEY,
+    fingerprint CHAR(64) NOT NULL,
+    status_code SMALLINT,
+    headers TEXT,
+    body BYTEA,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
+
+-- ==========================
+-- Actividad de carritos (eventos y rollups, ver api/rollups.py)
+-- ==========================
+-- Cada alta o baja de unidades en un carrito deja un evento en la misma
+-- transacción. Una tarea periódica suma los eventos posteriores al watermark en
+-- los rollups por hora y por día; /api/v1/admin/stats solo lee los rollups.
+CREATE TABLE IF NOT EXISTS cart_events (
+    id BIGSERIAL PRIMARY KEY,
+    occurred_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    kind VARCHAR(10) NOT NULL,
+    user_id INTEGER NOT NULL,
+    cart_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price NUMERIC(10,2)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cart_events_product_time ON cart_events(product_id, occurred_at);
+
+CREATE TABLE IF NOT EXISTS cart_activity_hourly (
+    hour TIMESTAMP WITH TIME ZONE NOT NULL,
+    product_id INTEGER NOT NULL,
+    additions INTEGER NOT NULL DEFAULT 0,
+    removals INTEGER NOT NULL DEFAULT 0,
+    quantity_added INTEGER NOT NULL DEFAULT 0,
+    quantity_removed INTEGER NOT NULL DEFAULT 0,
+    unique_users INTEGER NOT NULL DEFAULT 0,
+    revenue_estimate NUMERIC(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, product_id)
+);
+
+CREATE TABLE IF NOT EXISTS cart_activity_daily (
+    day DATE NOT NULL,
+    product_id INTEGER NOT NULL,
+    additions INTEGER NOT NULL DEFAULT 0,
+    removals INTEGER NOT NULL DEFAULT 0,
+    quantity_added INTEGER NOT NULL DEFAULT 0,
+    quantity_removed INTEGER NOT NULL DEFAULT 0,
+    unique_users INTEGER NOT NULL DEFAULT 0,
+    revenue_estimate NUMERIC(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, product_id)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    name VARCHAR(50) PRIMARY KEY,
+    last_event_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- ==========================
 -- Insertar datos de prueba SOLO si no existen
 -- ==========================
@@ -0,0 +1,7 @@
+"""
+Logging estructurado, trazas y perfilado compartidos por la API y la webapp.
+
+Aquí solo hay código independiente del framework; cada servicio conecta estas
+piezas con sus peticiones: middlewares de FastAPI en api/main.py y hooks de
+Flask en webapp/flask_observability.py.
+"""
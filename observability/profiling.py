@@ -0,0 +1,204 @@
+import cProfile
+import io
+import itertools
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+
+# Configuración de perfilado (variables de entorno)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_KEEP_REQUESTS = int(os.getenv("PROFILE_KEEP_REQUESTS", "20"))
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+TRACEMALLOC_KEEP_SNAPSHOTS = int(os.getenv("TRACEMALLOC_KEEP_SNAPSHOTS", "5"))
+
+# Cabecera que activa el perfilado cProfile de una petición (solo administradores)
+PROFILE_HEADER = "X-Profile"
+
+
+class ProfilerBusy(Exception):
+    """Ya hay un perfilado del mismo tipo en curso en este proceso"""
+
+
+_cpu_lock = threading.Lock()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def sample_cpu(seconds, interval=0.005):
+    """
+    Muestrea las pilas de todos los hilos cada `interval` segundos durante
+    `seconds` y devuelve (pilas plegadas, número de muestras). El formato
+    plegado ("hilo;f1;f2 N") lo aceptan flamegraph.pl y speedscope.
+    """
+    if not _cpu_lock.acquire(blocking=False):
+        raise ProfilerBusy("Ya hay un perfil de CPU en curso")
+    try:
+        own_id = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + min(seconds, PROFILE_MAX_SECONDS)
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(labels))] += 1
+            samples += 1
+            time.sleep(interval)
+        folded = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        return folded, samples
+    finally:
+        _cpu_lock.release()
+
+
+class SnapshotStore:
+    """Snapshots de tracemalloc numerados; se conservan solo los últimos"""
+
+    def __init__(self):
+        self.snapshots = OrderedDict()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def take(self):
+        # tracemalloc se activa con la primera snapshot: tiene coste mientras está activo
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        with self.lock:
+            snapshot_id = next(self.ids)
+            self.snapshots[snapshot_id] = snapshot
+            while len(self.snapshots) > TRACEMALLOC_KEEP_SNAPSHOTS:
+                self.snapshots.popitem(last=False)
+        return snapshot_id
+
+    def get(self, snapshot_id):
+        with self.lock:
+            return self.snapshots.get(snapshot_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.snapshots)
+
+    def clear(self):
+        with self.lock:
+            self.snapshots.clear()
+        tracemalloc.stop()
+
+
+snapshots = SnapshotStore()
+
+
+def _stat_to_dict(stat, diff=False):
+    entry = {
+        "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        "size_kib": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+    if diff:
+        entry["size_diff_kib"] = round(stat.size_diff / 1024, 1)
+        entry["count_diff"] = stat.count_diff
+    return entry
+
+
+def top_allocators(snapshot, limit=20, group_by="lineno"):
+    return [_stat_to_dict(stat) for stat in snapshot.statistics(group_by)[:limit]]
+
+
+def diff_snapshots(base, target, limit=20, group_by="lineno"):
+    stats = target.compare_to(base, group_by)
+    return [_stat_to_dict(stat, diff=True) for stat in stats[:limit]]
+
+
+def memory_summary():
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": tracemalloc.is_tracing(),
+        "traced_kib": round(current / 1024, 1),
+        "peak_kib": round(peak / 1024, 1),
+        "snapshots": snapshots.list(),
+    }
+
+
+class RequestProfiles:
+    """Perfiles cProfile de peticiones individuales (los últimos PROFILE_KEEP_REQUESTS)"""
+
+    def __init__(self):
+        self.profiles = OrderedDict()
+        self.lock = threading.Lock()
+        # sys.setprofile es por hilo: en el bucle de eventos solo puede haber un cProfile activo
+        self.active = threading.Lock()
+
+    def start(self):
+        """Devuelve un cProfile.Profile ya activo o None si hay otro en curso"""
+        if not self.active.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def finish(self, profiler, profile_id, label):
+        profiler.disable()
+        self.active.release()
+        profiler.create_stats()
+        total = sum(stat[2] for stat in profiler.stats.values())
+        with self.lock:
+            self.profiles[profile_id] = {
+                "label": label,
+                "created": time.time(),
+                "total_s": round(total, 4),
+                "stats": profiler.stats,
+            }
+            while len(self.profiles) > PROFILE_KEEP_REQUESTS:
+                self.profiles.popitem(last=False)
+
+    def list(self):
+        with self.lock:
+            return [
+                {"id": profile_id, "label": entry["label"], "created": entry["created"], "total_s": entry["total_s"]}
+                for profile_id, entry in reversed(self.profiles.items())
+            ]
+
+    def get(self, profile_id):
+        with self.lock:
+            return self.profiles.get(profile_id)
+
+
+request_profiles = RequestProfiles()
+
+
+def pstats_bytes(entry):
+    """Contenido de un archivo .pstats (lo que escribe Profile.dump_stats)"""
+    return marshal.dumps(entry["stats"])
+
+
+def pstats_text(entry, sort="cumulative", limit=40):
+    output = io.StringIO()
+    stats = pstats.Stats(_StatsHolder(entry["stats"]), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+class _StatsHolder:
+    """Adaptador para construir pstats.Stats a partir de un diccionario de estadísticas"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
@@ -0,0 +1,181 @@
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+# Configuración de trazas (variables de entorno)
+# TRACE_EXPORT_DIR vacío desactiva la exportación
+TRACE_EXPORT_DIR = os.getenv("TRACE_EXPORT_DIR", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SQL_MAX_LENGTH = int(os.getenv("TRACE_SQL_MAX_LENGTH", "500"))
+
+# Servicio que firma los spans (lo fija setup_tracing al arrancar: "api" o "webapp")
+SERVICE_NAME = "unknown"
+
+# Span activo en el contexto actual
+current_span = contextvars.ContextVar("current_span", default=None)
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_HEX32_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "sampled", "start", "duration_ms", "attributes")
+
+    def __init__(self, name, trace_id, parent_id, sampled, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start = time.time()
+        self.duration_ms = None
+        self.attributes = attributes or {}
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def finish(self):
+        self.duration_ms = round((time.time() - self.start) * 1000, 3)
+        if self.sampled:
+            _exporter.export(self)
+
+
+class SpanExporter:
+    """Escribe los spans como líneas JSON desde un hilo en segundo plano"""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=10000)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        if not TRACE_EXPORT_DIR:
+            return
+        self._ensure_started()
+        try:
+            self.queue.put_nowait({
+                "service": SERVICE_NAME,
+                "name": span.name,
+                "trace_id": span.trace_id,
+                "span_id": span.span_id,
+                "parent_id": span.parent_id,
+                "start": span.start,
+                "duration_ms": span.duration_ms,
+                "attributes": span.attributes,
+            })
+        except queue.Full:
+            pass
+
+    def _ensure_started(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self.thread.start()
+                atexit.register(self.queue.put, None)
+
+    def _run(self):
+        os.makedirs(TRACE_EXPORT_DIR, exist_ok=True)
+        # Un archivo por proceso para no intercalar escrituras entre réplicas/workers
+        path = os.path.join(TRACE_EXPORT_DIR, f"{SERVICE_NAME}-{socket.gethostname()}-{os.getpid()}.jsonl")
+        with open(path, "a", encoding="utf-8") as f:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                f.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+                if self.queue.empty():
+                    f.flush()
+
+
+_exporter = SpanExporter()
+
+
+def setup_tracing(service: str):
+    """Fija el nombre del servicio de los spans exportados (y de su archivo .jsonl)"""
+    global SERVICE_NAME
+    SERVICE_NAME = service
+
+
+def parse_traceparent(header):
+    """Devuelve (trace_id, parent_span_id, sampled) o None si la cabecera no es válida"""
+    match = _TRACEPARENT_RE.match((header or "").strip().lower())
+    if not match:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+def start_trace(name, traceparent=None, request_id=None, attributes=None):
+    """
+    Crea el span raíz de una petición entrante. Continúa la traza de la
+    cabecera traceparent si existe; si no, usa el request id de nginx
+    (32 hex) como trace id y decide el muestreo con TRACE_SAMPLE_RATE.
+    """
+    parsed = parse_traceparent(traceparent)
+    if parsed:
+        trace_id, parent_id, sampled = parsed
+    else:
+        candidate = (request_id or "").lower()
+        trace_id = candidate if _HEX32_RE.match(candidate) else os.urandom(16).hex()
+        parent_id = None
+        sampled = bool(TRACE_EXPORT_DIR) and random.random() < TRACE_SAMPLE_RATE
+    return Span(name, trace_id, parent_id, sampled, attributes)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Span hijo del span activo (no hace nada fuera de una traza)"""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, parent.span_id, parent.sampled, attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    finally:
+        current_span.reset(token)
+        child.finish()
+
+
+def instrument_engine(engine):
+    """Registra un span por cada sentencia SQL ejecutada por el engine"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        parent = current_span.get()
+        if parent is None or not parent.sampled:
+            return
+        child = Span("sql", parent.trace_id, parent.span_id, True, {
+            "db.statement": statement[:TRACE_SQL_MAX_LENGTH],
+            "db.executemany": executemany,
+        })
+        conn.info.setdefault("trace_spans", []).append(child)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            child = spans.pop()
+            child.attributes["db.rowcount"] = cursor.rowcount
+            child.finish()
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("trace_spans") if conn is not None else None
+        if spans:
+            child = spans.pop()
+            child.attributes["error"] = str(exception_context.original_exception)[:200]
+            child.finish()
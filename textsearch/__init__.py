@@ -0,0 +1,7 @@
+"""
+Normalización de textos de búsqueda compartida por la API y la webapp.
+
+El autocompletado de la API (api/autocomplete.py) y el filtro del catálogo de
+la webapp (webapp/app.py) deben coincidir: las mismas claves por palabra,
+plegadas y truncadas igual, encuentran los mismos productos.
+"""
@@ -0,0 +1,30 @@
+import os
+import unicodedata
+
+# Caracteres indexados por clave (nadie escribe más para autocompletar).
+# Una búsqueda más larga se compara solo por sus primeros MAX_KEY_CHARS caracteres
+MAX_KEY_CHARS = int(os.getenv("AUTOCOMPLETE_MAX_KEY_CHARS", "24"))
+
+
+def fold(text):
+    """Minúsculas, sin tildes ni diéresis y con espacios simples ("Teclado  Mecánico" -> "teclado mecanico")"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def search_prefix(query, max_chars=MAX_KEY_CHARS):
+    """Prefijo que se busca para lo que escribe el usuario ("" si no hay nada que buscar)"""
+    return fold(query)[:max_chars]
+
+
+def name_keys(name, max_chars=MAX_KEY_CHARS):
+    """Claves de un nombre: desde el inicio de cada palabra ("mec" encuentra "Teclado mecánico")"""
+    folded = fold(name)
+    starts = [0] + [position + 1 for position, char in enumerate(folded) if char == " "]
+    return tuple(dict.fromkeys(folded[start:start + max_chars] for start in starts if start < len(folded)))
+
+
+def matches(name, prefix, max_chars=MAX_KEY_CHARS):
+    """Alguna clave del nombre empieza por prefix (un search_prefix): el criterio de las sugerencias"""
+    return any(key.startswith(prefix) for key in name_keys(name, max_chars))
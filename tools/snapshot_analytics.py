@@ -0,0 +1,216 @@
+"""
+Análisis de un snapshot de tools/export_snapshot.py con NumPy/Arrow: valor del
+inventario, distribución de precios y composición de los carritos. Todo son
+operaciones vectorizadas sobre columnas (sin bucles de Python por fila), así
+que escala con el tamaño del snapshot sin pasar por pandas.
+
+Requiere las dependencias opcionales de tools/requirements.txt (pyarrow, numpy).
+
+    python tools/snapshot_analytics.py snapshots/2025-01-01
+    # Solo un análisis, con más tramos en el histograma de precios
+    python tools/snapshot_analytics.py snapshots/2025-01-01 --only prices --bins 20
+
+Desde Python (p. ej. un notebook):
+
+    from snapshot_analytics import load_snapshot, inventory_valuation
+    tables = load_snapshot("snapshots/2025-01-01")
+    inventory_valuation(tables["products"])
+"""
+import argparse
+import json
+import os
+import sys
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # dependencias opcionales
+    np = pa = pc = pq = None
+
+MANIFEST_NAME = "snapshot.json"
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+def load_snapshot(directory, tables=None):
+    """{tabla: pyarrow.Table} con las tablas del snapshot (según snapshot.json)"""
+    with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+    loaded = {}
+    for name, info in manifest["tables"].items():
+        if tables and name not in tables:
+            continue
+        path = os.path.join(directory, info["file"])
+        if manifest["format"] == "parquet":
+            loaded[name] = pq.read_table(path)
+        else:
+            with pa.memory_map(path) as source:
+                loaded[name] = pa.ipc.open_file(source).read_all()
+    return loaded
+
+
+def active_products(products):
+    """Productos del catálogo (sin los retirados con borrado lógico)"""
+    return products.filter(pc.is_null(products["deleted_at"]))
+
+
+def to_numpy(array, dtype):
+    # Los nulos (price, stock sin valor) cuentan como 0
+    return pc.fill_null(array, 0).to_numpy().astype(dtype, copy=False)
+
+
+def top_indices(values, limit):
+    """Índices de los limit mayores valores, de mayor a menor (argpartition: O(n))"""
+    limit = min(limit, len(values))
+    if limit == 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-values, limit - 1)[:limit]
+    return candidates[np.argsort(-values[candidates], kind="stable")]
+
+
+def inventory_valuation(products, top=10):
+    """Unidades y valor en stock (price * stock), concentración y productos de mayor valor"""
+    products = active_products(products)
+    prices = to_numpy(products["price"], np.float64)
+    stock = to_numpy(products["stock"], np.int64)
+    value = prices * stock
+    total = float(value.sum())
+
+    order = np.sort(value)[::-1]
+    top_decile = max(len(order) // 10, 1) if len(order) else 0
+    ranked = top_indices(value, top)
+    top_products = products.take(pa.array(ranked, type=pa.int64())).select(["id", "name", "price", "stock"])
+    top_products = top_products.append_column("value", pa.array(value[ranked])).to_pylist()
+    return {
+        "products": len(products),
+        "units": int(stock.sum()),
+        "value": round(total, 2),
+        "out_of_stock": int(np.count_nonzero(stock <= 0)),
+        # Parte del valor que concentra el 10% de productos de mayor valor
+        "top_decile_share": round(float(order[:top_decile].sum()) / total, 4) if total else 0.0,
+        "top_products": top_products,
+    }
+
+
+def price_distribution(products, bins=10):
+    """Cuantiles e histograma de precios (tramos logarítmicos: los precios tienen cola larga)"""
+    prices = to_numpy(active_products(products)["price"], np.float64)
+    prices = prices[prices > 0]
+    if not len(prices):
+        return {"products": 0, "quantiles": {}, "histogram": []}
+    low, high = prices.min(), prices.max()
+    edges = np.geomspace(low, high, bins + 1) if high > low else np.array([low, high + 0.01])
+    counts, edges = np.histogram(prices, bins=edges)
+    return {
+        "products": int(len(prices)),
+        "min": round(float(low), 2),
+        "max": round(float(high), 2),
+        "mean": round(float(prices.mean()), 2),
+        "quantiles": {f"p{round(q * 100)}": round(float(v), 2)
+                      for q, v in zip(QUANTILES, np.quantile(prices, QUANTILES))},
+        "histogram": [
+            {"from": round(float(start), 2), "to": round(float(end), 2), "products": int(count)}
+            for start, end, count in zip(edges[:-1], edges[1:], counts)
+        ],
+    }
+
+
+def price_lookup(products):
+    """Array indexado por product_id con el precio actual (0 si no existe)"""
+    ids = to_numpy(products["id"], np.int64)
+    lookup = np.zeros(int(ids.max()) + 1 if len(ids) else 1, dtype=np.float64)
+    lookup[ids] = to_numpy(products["price"], np.float64)
+    return lookup
+
+
+def cart_composition(cart_items, products, top=10):
+    """
+    Líneas, unidades y valor por carrito (a precio actual) y productos más
+    presentes en carritos. El join con products es un índice en un array por
+    product_id; los agregados por carrito, np.bincount sobre ids compactados.
+    Las líneas de productos retirados (borrado lógico, aún sin archivar) no
+    cuentan: se informan aparte en retired_items.
+    """
+    products = active_products(products)
+    cart_ids = to_numpy(cart_items["cart_id"], np.int64)
+    product_ids = to_numpy(cart_items["product_id"], np.int64)
+    quantities = to_numpy(cart_items["quantity"], np.int64)
+
+    prices = price_lookup(products)
+    listed = np.zeros(len(prices), dtype=bool)
+    listed[to_numpy(products["id"], np.int64)] = True
+    known = product_ids < len(listed)
+    active = known & listed[np.where(known, product_ids, 0)]
+    retired_items = int(np.count_nonzero(~active))
+    cart_ids, product_ids, quantities = cart_ids[active], product_ids[active], quantities[active]
+    if not len(cart_ids):
+        return {"carts": 0, "items": 0, "retired_items": retired_items}
+
+    line_values = prices[product_ids] * quantities
+
+    carts, cart_index = np.unique(cart_ids, return_inverse=True)
+    lines_per_cart = np.bincount(cart_index)
+    units_per_cart = np.bincount(cart_index, weights=quantities)
+    value_per_cart = np.bincount(cart_index, weights=line_values)
+
+    # Carritos por número de líneas (1, 2, ...) y productos por presencia en carritos
+    size_counts = np.bincount(lines_per_cart)
+    product_carts = np.bincount(product_ids)
+    product_units = np.bincount(product_ids, weights=quantities)
+    ranked = top_indices(product_carts.astype(np.float64), top)
+    ranked = ranked[product_carts[ranked] > 0]
+    # Nombres solo de los productos del ranking: posición de cada id en la columna y take
+    ids = products["id"].combine_chunks()
+    positions = pc.index_in(pa.array(ranked, type=pa.int64()).cast(ids.type), value_set=ids)
+    names = products["name"].take(positions).to_pylist()
+
+    def summary(values):
+        return {"mean": round(float(values.mean()), 2),
+                "p50": round(float(np.median(values)), 2),
+                "p90": round(float(np.quantile(values, 0.9)), 2),
+                "max": round(float(values.max()), 2)}
+
+    return {
+        "carts": int(len(carts)),
+        "items": int(len(cart_ids)),
+        "retired_items": retired_items,
+        "units": int(quantities.sum()),
+        "value": round(float(line_values.sum()), 2),
+        "lines_per_cart": summary(lines_per_cart),
+        "units_per_cart": summary(units_per_cart),
+        "value_per_cart": summary(value_per_cart),
+        "carts_by_lines": {int(size): int(count) for size, count in enumerate(size_counts) if count},
+        "top_products": [
+            {"product_id": int(product_id), "name": name,
+             "carts": int(product_carts[product_id]), "units": int(product_units[product_id])}
+            for product_id, name in zip(ranked, names)
+        ],
+    }
+
+
+ANALYSES = {
+    "inventory": lambda tables, args: inventory_valuation(tables["products"], args.top),
+    "prices": lambda tables, args: price_distribution(tables["products"], args.bins),
+    "carts": lambda tables, args: cart_composition(tables["cart_items"], tables["products"], args.top),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agregados vectorizados sobre un snapshot columnar")
+    parser.add_argument("snapshot_dir")
+    parser.add_argument("--only", nargs="+", choices=list(ANALYSES), help="solo estos análisis")
+    parser.add_argument("--top", type=int, default=10, help="productos en los rankings")
+    parser.add_argument("--bins", type=int, default=10, help="tramos del histograma de precios")
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("Faltan pyarrow/numpy: pip install -r tools/requirements.txt")
+
+    names = args.only or list(ANALYSES)
+    tables = load_snapshot(args.snapshot_dir, {"products", "cart_items"})
+    print(json.dumps({name: ANALYSES[name](tables, args) for name in names}, indent=2, default=str, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
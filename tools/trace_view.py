@@ -0,0 +1,101 @@
+"""
+Visor de trazas: une el log JSON de nginx con los spans de la webapp y la API
+(archivos *.jsonl de TRACE_EXPORT_DIR) y muestra el desglose de una petición.
+
+    # Las 5 peticiones muestreadas más lentas
+    python tools/trace_view.py /var/log/traces --slowest 5
+    # Una traza concreta (trace id = X-Request-ID)
+    python tools/trace_view.py /var/log/traces --trace 4bf92f3577b34da6a3ce929d0e0e4736
+"""
+import argparse
+import glob
+import json
+import os
+from collections import defaultdict
+
+
+def load(directory):
+    """Devuelve {trace_id: [spans]} con todos los registros del directorio"""
+    traces = defaultdict(list)
+    for path in glob.glob(os.path.join(directory, "*.jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("service") == "nginx":
+                    # nginx registra el final y la duración en segundos
+                    duration = float(record.get("request_time") or 0)
+                    record = {
+                        "service": "nginx",
+                        "name": f"{record.get('method')} {record.get('uri')}",
+                        "trace_id": record.get("trace_id"),
+                        "span_id": "nginx",
+                        "parent_id": None,
+                        "start": float(record["end"]) - duration,
+                        "duration_ms": round(duration * 1000, 3),
+                        "attributes": {
+                            "status": record.get("status"),
+                            "upstream": record.get("upstream"),
+                            "upstream_ms": record.get("upstream_ms"),
+                            "cache": record.get("cache"),
+                        },
+                    }
+                traces[record.get("trace_id")].append(record)
+    return traces
+
+
+def print_trace(spans):
+    """Imprime el árbol de spans con su desplazamiento respecto al inicio"""
+    children = defaultdict(list)
+    ids = {span["span_id"] for span in spans}
+    roots = []
+    for span in sorted(spans, key=lambda s: s["start"]):
+        parent = span.get("parent_id")
+        if parent and parent in ids:
+            children[parent].append(span)
+        elif span["service"] == "nginx":
+            roots.insert(0, span)
+        else:
+            roots.append(span)
+
+    origin = min(span["start"] for span in spans)
+    nginx_root = roots[0] if roots and roots[0]["service"] == "nginx" else None
+
+    def walk(span, depth):
+        offset = (span["start"] - origin) * 1000
+        attrs = span.get("attributes") or {}
+        detail = attrs.get("db.statement") or attrs.get("upstream") or ""
+        print(f"{offset:>9.1f}ms {span['duration_ms']:>9.1f}ms  {'  ' * depth}"
+              f"[{span['service']}] {span['name']} {str(detail)[:80]}")
+        for child in children.get(span["span_id"], []):
+            walk(child, depth + 1)
+
+    for root in roots:
+        walk(root, 1 if nginx_root is not None and root is not nginx_root else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Desglose de trazas de extremo a extremo")
+    parser.add_argument("directory", nargs="?", default="/var/log/traces")
+    parser.add_argument("--trace", help="Trace id a mostrar")
+    parser.add_argument("--slowest", type=int, default=3, help="Mostrar las N trazas muestreadas más lentas")
+    args = parser.parse_args()
+
+    traces = load(args.directory)
+    if args.trace:
+        selected = [args.trace]
+    else:
+        # Solo trazas con spans de Python (las muestreadas), ordenadas por duración total
+        sampled = {tid: spans for tid, spans in traces.items() if any(s["service"] != "nginx" for s in spans)}
+        selected = sorted(sampled, key=lambda tid: max(s["duration_ms"] for s in sampled[tid]), reverse=True)
+        selected = selected[:args.slowest]
+
+    for trace_id in selected:
+        spans = traces.get(trace_id)
+        if not spans:
+            print(f"Traza {trace_id} no encontrada")
+            continue
+        print(f"\ntrace_id={trace_id}")
+        print_trace(spans)
@@ -1,9 +1,20 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response, g, has_request_context
 import requests
 import os
+import json
+import time
+import uuid
+import logging
 from datetime import datetime
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 from utils import admin_required
+import flask_observability
+from observability.logs import request_id_var
+from observability import tracing
+from textsearch.folding import matches, search_prefix
+from resilience import (
+    RETRY_MAX_ATTEMPTS, backoff_delay, breaker_for, render_metrics, retry_budget, retry_counters
+)
 
 
 # --- Configuración de la aplicación Flask ---
@@ -11,6 +22,17 @@ app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'clave-por-defecto-cambiar')
 
 
+# --- Logging estructurado (JSON, cola en segundo plano, request id) ---
+flask_observability.init_logging(app)
+logger = logging.getLogger("webapp")
+
+# --- Trazas de extremo a extremo (proxy -> webapp -> API -> SQL) ---
+flask_observability.init_tracing(app)
+
+# --- Perfilado bajo demanda para administradores (CPU, memoria, por petición) ---
+flask_observability.init_profiling(app)
+
+
 # --- Configuración de JWT ---
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-cambiar-en-produccion')
 app.config['JWT_TOKEN_LOCATION'] = ['headers']  # Los tokens se envían en headers
@@ -22,6 +44,50 @@ app.config['JWT_HEADER_TYPE'] = 'Bearer'
 jwt = JWTManager(app)
 
 
+# --- Archivos estáticos con hash de contenido (ver build_assets.py) ---
+def load_asset_manifest():
+    manifest_path = os.path.join(app.static_folder, 'dist', 'manifest.json')
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Sin build (desarrollo local): se sirven los archivos originales
+        return {}
+
+
+ASSET_MANIFEST = load_asset_manifest()
+
+
+def new_idempotency_key():
+    # Una por formulario renderizado: un doble envío o un reintento reutiliza la misma
+    return uuid.uuid4().hex
+
+
+def idempotency_headers():
+    """Cabecera Idempotency-Key con la clave del campo oculto del formulario (si viene)"""
+    key = request.form.get('idempotency_key')
+    return {'Idempotency-Key': key} if key else None
+
+
+# Stream SSE de cambios de precio/stock (lo abre el navegador, a través de nginx)
+PRODUCT_EVENTS_URL = os.getenv('PRODUCT_EVENTS_URL', '/api/v1/events/products')
+
+# Sugerencias del buscador (las pide el navegador en cada tecla, a través de nginx)
+AUTOCOMPLETE_URL = os.getenv('AUTOCOMPLETE_URL', '/api/v1/products/autocomplete')
+
+
+@app.context_processor
+def inject_asset_url():
+    def asset_url(filename):
+        return url_for('static', filename=ASSET_MANIFEST.get(filename, filename))
+    return {
+        'asset_url': asset_url,
+        'product_events_url': PRODUCT_EVENTS_URL,
+        'autocomplete_url': AUTOCOMPLETE_URL,
+        'new_idempotency_key': new_idempotency_key,
+    }
+
+
 # --- URL base de la API (FastAPI) ---
 API_URL = os.getenv('API_URL', 'http://api:8000')
 
@@ -29,11 +95,64 @@ API_URL = os.getenv('API_URL', 'http://api:8000')
 # Prefijo común para endpoints de la API
 API_PREFIX = "/api/v1"
 
+# Máximo de sub-peticiones por llamada a /batch (debe coincidir con BATCH_MAX_REQUESTS de la API)
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '20'))
+
+# Filas por página de las tablas del panel de administración (el resto se carga al pedirlo)
+ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', '50'))
+
+# Columnas de cada tabla del panel
+ADMIN_USER_FIELDS = "id,username,email,is_admin,is_active"
+
+# Recomendaciones "comprados juntos" mostradas por producto y en el carrito
+# (no más que RECOMMENDER_TOP_K de la API)
+RELATED_PRODUCTS_LIMIT = int(os.getenv('RELATED_PRODUCTS_LIMIT', '4'))
+RELATED_FIELDS = "id,name,price,image_url,stock"
+
+
+# --- Presupuesto de tiempo por página y timeout por llamada a la API ---
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', '3'))
+PAGE_BUDGET_SECONDS = float(os.getenv('PAGE_BUDGET_SECONDS', '5'))
+
+
+@app.before_request
+def set_request_deadline():
+    # Ninguna página espera a la API más allá de su presupuesto
+    g.deadline = time.monotonic() + PAGE_BUDGET_SECONDS
+
+
+def _remaining_budget():
+    """Segundos que le quedan a la petición actual (None fuera de una petición)"""
+    if not has_request_context() or 'deadline' not in g:
+        return None
+    return g.deadline - time.monotonic()
+
+
+def _send(method, url, headers, data, params, timeout):
+    if method == 'GET':
+        return requests.get(url, headers=headers, params=params, timeout=timeout)
+
+    if method == 'POST':
+        # Si se indicó explícitamente JSON en headers o se pasó un dict en data -> enviar JSON
+        if headers.get('Content-Type') == 'application/json' or isinstance(data, dict):
+            return requests.post(url, headers=headers, json=data, timeout=timeout)
+        # En caso contrario, enviar form-encoded o params (según se necesite)
+        return requests.post(url, headers=headers, data=params or data, timeout=timeout)
+
+    if method == 'PUT':
+        # Para todas las requests PUT, usar json=data
+        return requests.put(url, headers=headers, json=data, timeout=timeout)
+
+    return requests.delete(url, headers=headers, params=params, timeout=timeout)
+
 
 # --- Helpers básicos ---
-def api_request(endpoint, method='GET', data=None, headers=None, params=None, timeout=10):
+def api_request(endpoint, method='GET', data=None, headers=None, params=None, timeout=None):
     """
     Helper para llamar a la API: devuelve (status_code, json|texto)
+    Pasa por el circuit breaker del grupo del endpoint, respeta el presupuesto
+    de tiempo de la página y reintenta con jitter las peticiones GET y las
+    escrituras con Idempotency-Key (la API ejecuta estas una sola vez).
     """
     # Construir URL correctamente evitando dobles barras
     base_url = API_URL.rstrip('/')
@@ -46,49 +165,178 @@ def api_request(endpoint, method='GET', data=None, headers=None, params=None, ti
         final_headers.update(headers)
     if 'access_token' in session:
         final_headers['Authorization'] = f"Bearer {session['access_token']}"
+    # Propagar el request id para correlacionar los logs de webapp y API
+    request_id = request_id_var.get()
+    if request_id:
+        final_headers.setdefault('X-Request-ID', request_id)
 
     # Para endpoints que esperamos JSON por defecto (se puede mantener para compatibilidad)
-    json_endpoints = ["users/login", "users/register", "admin/products", "carts/items"]
+    json_endpoints = ["users/login", "users/register", "admin/products", "carts/items", "batch"]
     if any(ep in endpoint for ep in json_endpoints) or endpoint.startswith(("admin/products/", "carts/items/")):
         final_headers.setdefault('Content-Type', 'application/json')
 
-    try:
-        method = method.upper()
-
-        if method == 'GET':
-            resp = requests.get(url, headers=final_headers, params=params, timeout=timeout)
+    method = method.upper()
+    if method not in ('GET', 'POST', 'PUT', 'DELETE'):
+        return 0, {"error": f"Método HTTP no soportado: {method}"}
+
+    breaker = breaker_for(endpoint)
+    retry_safe = method == 'GET' or 'Idempotency-Key' in final_headers
+    max_attempts = 1 + (RETRY_MAX_ATTEMPTS if retry_safe else 0)
+    retry_budget.record_request()
+
+    resp = None
+    error = None
+    attempt = 0
+    while True:
+        remaining = _remaining_budget()
+        if remaining is not None and remaining <= 0:
+            if resp is None:
+                error = "Presupuesto de tiempo de la página agotado"
+            break
+        if not breaker.allow():
+            if resp is None:
+                error = f"Circuit breaker abierto para '{breaker.name}'"
+            break
+
+        call_timeout = API_TIMEOUT if timeout is None else timeout
+        if remaining is not None:
+            call_timeout = min(call_timeout, remaining)
+
+        with tracing.span(f"api_request {method} {endpoint}", attempt=attempt + 1) as call_span:
+            if call_span is not None:
+                final_headers['traceparent'] = call_span.traceparent()
+            try:
+                resp = _send(method, url, final_headers, data, params, call_timeout)
+                error = None
+                breaker.record(resp.status_code < 500)
+            except requests.RequestException as e:
+                resp = None
+                error = str(e)
+                breaker.record(False)
+            if call_span is not None:
+                call_span.attributes["http.status_code"] = resp.status_code if resp is not None else 0
+
+        attempt += 1
+        retryable = resp is None or resp.status_code in (502, 503, 504)
+        if not retryable or attempt >= max_attempts:
+            break
+        if not retry_budget.try_acquire():
+            retry_counters['budget_exhausted'] += 1
+            break
+
+        delay = backoff_delay(attempt)
+        remaining = _remaining_budget()
+        if remaining is not None and delay >= remaining:
+            break
+        retry_counters['attempted'] += 1
+        time.sleep(delay)
+
+    if resp is None:
+        logger.warning("api_request fallido", extra={"fields": {
+            "endpoint": endpoint, "method": method, "attempts": attempt, "error": error
+        }})
+        return 0, {"error": error, "detail": "Servicio temporalmente no disponible"}
+
+    # Manejar respuestas vacías (como 204 No Content)
+    if resp.status_code == 204:
+        return resp.status_code, {}
 
-        elif method == 'POST':
-            # Si se indicó explícitamente JSON en headers o se pasó un dict en data -> enviar JSON
-            if final_headers.get('Content-Type') == 'application/json' or isinstance(data, dict):
-                resp = requests.post(url, headers=final_headers, json=data, timeout=timeout)
-            else:
-                # En caso contrario, enviar form-encoded o params (según se necesite)
-                resp = requests.post(url, headers=final_headers, data=params or data, timeout=timeout)
+    try:
+        response_data = resp.json()
+        return resp.status_code, response_data
+    except ValueError:
+        return resp.status_code, resp.text
 
-        elif method == 'PUT':
-            # Para todas las requests PUT, usar json=data
-            resp = requests.put(url, headers=final_headers, json=data, timeout=timeout)
 
-        elif method == 'DELETE':
-            resp = requests.delete(url, headers=final_headers, params=params, timeout=timeout)
+def fetch_products_batch(product_ids, fields="id,name,price,image_url"):
+    """
+    Obtiene varios productos con una sola llamada a /batch de la API.
+    Devuelve {product_id: datos}; los productos que fallan no aparecen.
+    """
+    if not product_ids:
+        return {}
+    products_by_id = {}
+    ids = sorted(product_ids)
+    # La API limita el número de peticiones por lote
+    for start in range(0, len(ids), BATCH_MAX_REQUESTS):
+        chunk = ids[start:start + BATCH_MAX_REQUESTS]
+        status, data = api_request("/batch", method='POST', data={"requests": [
+            {"id": str(product_id), "method": "GET", "path": f"{API_PREFIX}/products/{product_id}?fields={fields}"}
+            for product_id in chunk
+        ]})
+        if status != 200 or not isinstance(data, dict):
+            continue
+        for result in data.get('responses', []):
+            if result.get('status') == 200 and isinstance(result.get('body'), dict):
+                products_by_id[int(result['id'])] = result['body']
+    return products_by_id
+
+
+def api_batch(paths):
+    """
+    Varias lecturas GET en una sola llamada a /batch de la API.
+    paths: {id: ruta bajo API_PREFIX}. Devuelve {id: (status, cuerpo)}; las
+    que no llegan a ejecutarse devuelven (0, {}).
+    """
+    results = {key: (0, {}) for key in paths}
+    status, data = api_request("/batch", method='POST', data={"requests": [
+        {"id": key, "method": "GET", "path": f"{API_PREFIX}{path}"} for key, path in paths.items()
+    ]})
+    if status == 200 and isinstance(data, dict):
+        for result in data.get('responses', []):
+            if result.get('id') in results:
+                results[result['id']] = (result.get('status', 0), result.get('body'))
+    return results
 
-        else:
-            return 0, {"error": f"Método HTTP no soportado: {method}"}
 
-        # Manejar respuestas vacías (como 204 No Content)
-        if resp.status_code == 204:
-            return resp.status_code, {}
+def related_path(product_id, limit=RELATED_PRODUCTS_LIMIT):
+    return f"/products/{product_id}/related?limit={limit}&fields={RELATED_FIELDS}"
 
-        try:
-            response_data = resp.json()
-            return resp.status_code, response_data
-        except ValueError:
-            return resp.status_code, resp.text
 
-    except requests.RequestException as e:
-        print(f"Error en API request: {e}")
-        return 0, {"error": str(e)}
+def related_for_cart(product_ids):
+    """
+    Recomendaciones para un carrito: los vecinos de cada producto (una sola
+    llamada a /batch), sumando sus coincidencias y sin los que ya están en él.
+    """
+    ids = sorted(product_ids)[:BATCH_MAX_REQUESTS]
+    if not ids:
+        return []
+    # Se piden el doble por producto: parte de los vecinos suelen estar ya en el carrito
+    results = api_batch({str(product_id): related_path(product_id, RELATED_PRODUCTS_LIMIT * 2) for product_id in ids})
+    scores = {}
+    products_by_id = {}
+    for status, body in results.values():
+        if status != 200 or not isinstance(body, dict):
+            continue
+        for product in body.get('related', []):
+            product_id = product.get('id')
+            if product_id in product_ids:
+                continue
+            scores[product_id] = scores.get(product_id, 0) + product.get('co_occurrences', 0)
+            products_by_id[product_id] = product
+    ranked = sorted(scores, key=lambda product_id: (-scores[product_id], product_id))
+    return [products_by_id[product_id] for product_id in ranked[:RELATED_PRODUCTS_LIMIT]]
+
+
+def admin_page_path(kind, offset):
+    """Ruta de la API de una página de usuarios o productos del panel"""
+    if kind == 'users':
+        return f"/admin/users?fields={ADMIN_USER_FIELDS}&limit={ADMIN_PAGE_SIZE}&offset={offset}"
+    return f"/admin/products?limit={ADMIN_PAGE_SIZE}&offset={offset}"
+
+
+# Health check para el proxy y el orquestador
+@app.route('/healthz')
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+# Métricas del cliente de la API (estado de los circuit breakers)
+@app.route('/metrics')
+def metrics():
+    response = make_response(render_metrics())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4'
+    return response
 
 
 
@@ -105,8 +353,9 @@ def is_logged_in():
 @app.route("/")
 def index():
     try:
-        status, data = api_request("/products")
-        print(f"DEBUG - Index API Response: Status={status}, Data type: {type(data)}", flush=True)
+        # La portada no muestra el stock
+        status, data = api_request("/products", params={"fields": "id,name,description,price,image_url"})
+        logger.debug("index: respuesta de la API", extra={"fields": {"status": status}})
        
         products = []
         if status == 200:
@@ -120,7 +369,7 @@ def index():
             products = []
            
     except Exception as e:
-        print("Error al consumir API:", e, flush=True)
+        logger.exception("index: error al consumir la API")
         products = []
         flash('Error de conexión con la API', 'danger')
 
@@ -133,25 +382,52 @@ def index():
 @app.route('/admin/dashboard')
 @admin_required
 def admin_dashboard():
-    # Obtener datos de la API para el dashboard de administración
-    users_status, users_data = api_request("/admin/users")
-    products_status, products_data = api_request("/admin/products")
+    # Resumen calculado en la API y solo la primera página de cada tabla, en una llamada;
+    # las demás páginas las pide el navegador al pulsar "Cargar más" (admin_rows)
+    results = api_batch({
+        "summary": "/admin/summary",
+        "users": admin_page_path('users', 0),
+        "products": admin_page_path('products', 0),
+    })
+    summary_status, summary = results["summary"]
+    users_status, users_data = results["users"]
+    products_status, products_data = results["products"]
     
+    summary = summary if summary_status == 200 else None
     users = users_data if users_status == 200 else []
     products = products_data if products_status == 200 else []
     
     # Crear respuesta y evitar caching
-    response = make_response(render_template('admin.html', users=users, products=products))
+    response = make_response(render_template(
+        'admin.html', summary=summary, users=users, products=products, page_size=ADMIN_PAGE_SIZE
+    ))
     response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '0'
     return response
 
 
+# Siguiente página de una tabla del panel, como filas HTML para añadir a la tabla
+@app.route('/admin/rows/<kind>')
+@admin_required
+def admin_rows(kind):
+    if kind not in ('users', 'products'):
+        return make_response('', 404)
+    offset = request.args.get('offset', 0, type=int)
+    status, data = api_request(admin_page_path(kind, max(offset, 0)))
+    if status != 200 or not isinstance(data, list):
+        return make_response('', 502)
+    response = make_response(render_template(f'admin/{kind[:-1]}_rows.html', **{kind: data}))
+    # Página incompleta = no hay más filas
+    response.headers['X-Has-More'] = '1' if len(data) == ADMIN_PAGE_SIZE else '0'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
 @app.route('/products')
 def products():
     status, data = api_request("/products")
-    print(f"DEBUG - Products API Response: Status={status}", flush=True)
+    logger.debug("products: respuesta de la API", extra={"fields": {"status": status}})
    
     productos = []
     if status == 200:
@@ -163,8 +439,29 @@ def products():
         error_msg = data.get('detail', 'Error desconocido') if isinstance(data, dict) else str(data)
         flash(f"Error al cargar productos: {error_msg}", "danger")
 
-
-    return render_template('products.html', products=productos)
+    # Búsqueda enviada desde el buscador sin elegir una sugerencia: mismo criterio
+    # que las sugerencias de la API (textsearch/folding.py)
+    search = request.args.get('q', '').strip()
+    prefix = search_prefix(search)
+    if prefix:
+        productos = [p for p in productos if matches(p.get('name'), prefix)]
+
+    return render_template('products.html', products=productos, search=search)
+
+
+# Productos comprados juntos con uno dado, como HTML para la tarjeta de productos.html
+@app.route('/products/<int:product_id>/related')
+def related_products(product_id):
+    status, data = api_request(related_path(product_id))
+    if status == 404:
+        return make_response('', 404)
+    if status != 200 or not isinstance(data, dict):
+        return make_response('', 502)
+    response = make_response(render_template('related_products.html', related=data.get('related', [])))
+    # Los formularios de añadir al carrito llevan una Idempotency-Key nueva en cada
+    # render: reutilizar el HTML repetiría la clave (como en las demás páginas con formularios)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -185,7 +482,8 @@ def login():
         })
 
 
-        print(f"DEBUG - Login API Response: Status={status}, Data={data}", flush=True)
+        # No registrar el payload: contiene el access token
+        logger.debug("login: respuesta de la API", extra={"fields": {"status": status}})
        
         if status == 200:
             # Verificar que data es un diccionario antes de acceder a sus propiedades
@@ -210,7 +508,7 @@ def login():
             else:
                 # Si data es una cadena (como HTML de error), mostrar un mensaje genérico
                 error_msg = 'Error en el servidor. Por favor, intente más tarde.'
-                print(f"Error detallado del servidor: {data}", flush=True)
+                logger.warning("login: respuesta no JSON del servidor", extra={"fields": {"status": status, "body": str(data)[:200]}})
            
             flash(f'Error: {error_msg}', 'danger')
 
@@ -269,7 +567,7 @@ def cart():
    
     # Obtener carrito del usuario
     status, data = api_request("/carts", params={"user_id": session['user_id']})
-    print(f"DEBUG - Cart API Response: Status={status}, Data={data}", flush=True)
+    logger.debug("cart: respuesta de la API", extra={"fields": {"status": status}})
    
     cart_items = []
     total = 0
@@ -283,13 +581,16 @@ def cart():
         else:
             raw_items = []
        
-        # Para cada item, obtener la información completa del producto
+        # Obtener la información de todos los productos del carrito en un solo lote
+        products_by_id = fetch_products_batch(
+            {item.get('product_id') for item in raw_items if item.get('product_id')}
+        )
+
         for item in raw_items:
             product_id = item.get('product_id')
             if product_id:
-                # Obtener información del producto
-                product_status, product_data = api_request(f"/products/{product_id}")
-                if product_status == 200:
+                product_data = products_by_id.get(product_id)
+                if product_data is not None:
                     # Combinar la información del item del carrito con la del producto
                     combined_item = {
                         'id': item.get('id'),
@@ -327,10 +628,11 @@ def cart():
         error_msg = data.get('detail', 'Error al cargar el carrito') if isinstance(data, dict) else str(data)
         flash(f'Error: {error_msg}', 'danger')
    
-    print(f"DEBUG - Final cart items: {cart_items}", flush=True)
-    print(f"DEBUG - Final total: {total}", flush=True)
+    logger.debug("cart: carrito construido", extra={"fields": {"items": len(cart_items), "total": total}})
+
+    related = related_for_cart({item['product_id'] for item in cart_items if item.get('product_id')})
    
-    return render_template('cart.html', cart_items=cart_items, total=total)
+    return render_template('cart.html', cart_items=cart_items, total=total, related=related)
 
 # Ruta para agregar un producto al carrito
 @app.route('/add-to-cart/<int:product_id>', methods=['POST'])
@@ -346,9 +648,9 @@ def add_to_cart(product_id):
         "user_id": session['user_id'],
         "product_id": product_id,
         "quantity": quantity
-    })
+    }, headers=idempotency_headers())
    
-    print(f"DEBUG - Add to cart API Response: Status={status}, Data={data}", flush=True)
+    logger.debug("add_to_cart: respuesta de la API", extra={"fields": {"status": status, "product_id": product_id}})
    
     # Tanto 200 (OK) como 201 (Created) son respuestas exitosas
     if status in [200, 201]:
@@ -357,6 +659,9 @@ def add_to_cart(product_id):
         error_msg = data.get('detail', 'Error al agregar al carrito') if isinstance(data, dict) else str(data)
         flash(f'Error: {error_msg}', 'danger')
    
+    # Las recomendaciones del carrito vuelven al carrito
+    if request.form.get('next') == 'cart':
+        return redirect(url_for('cart'))
     return redirect(url_for('products'))
 
 # Ruta para actualizar la cantidad de un item del carrito
@@ -379,11 +684,11 @@ def update_cart_item(item_id):
             return jsonify({"success": True})
         else:
             # Log detallado del error
-            print(f"DEBUG - Error updating cart item: Status={status}, Data={data}")
+            logger.warning("update_cart_item: error de la API", extra={"fields": {"status": status, "item_id": item_id}})
             error_msg = data.get('detail', 'Error al actualizar') if isinstance(data, dict) else str(data)
             return jsonify({"success": False, "message": error_msg})
     except Exception as e:
-        print(f"Exception in update_cart_item: {e}")
+        logger.exception("update_cart_item: excepción")
         return jsonify({"success": False, "message": f"Error interno: {str(e)}"})
 
 # Ruta para eliminar un item del carrito
@@ -437,16 +742,20 @@ def perfil():
         email = request.form.get('email')
         current_password = request.form.get('current_password')
         
-        # Llamar a la API para actualizar el perfil
+        version = request.form.get('version')
+        
+        # Llamar a la API para actualizar el perfil (If-Match: 409 si cambió desde que se mostró)
         status, data = api_request(f"/users/{session['user_id']}", method='PUT', data={
             "username": username,
             "email": email,
             "current_password": current_password
-        })
+        }, headers={'If-Match': f'"{version}"'} if version else None)
         
         if status == 200:
             session['username'] = username
             flash('Perfil actualizado correctamente', 'success')
+        elif status == 409:
+            flash('Tu perfil cambió desde otra sesión. Revisa los datos y vuelve a guardar.', 'warning')
         else:
             error_msg = data.get('detail', 'Error al actualizar el perfil')
             flash(f'Error: {error_msg}', 'danger')
@@ -512,7 +821,8 @@ def create_product():
             "image_url": request.form.get('image_url', '')
         }
         
-        status, response_data = api_request("/admin/products", method='POST', data=data)
+        status, response_data = api_request("/admin/products", method='POST', data=data,
+                                            headers=idempotency_headers())
        
         if status == 201:
             flash('Producto creado exitosamente', 'success')
@@ -549,27 +859,51 @@ def update_product_admin():
         
         image_url = request.form.get('image_url', '')
         
-        # Usar data en lugar de params para enviar como JSON
-        data = {
-            "name": name,
-            "description": description,
-            "price": price,
-            "stock": stock,
-            "image_url": image_url
-        }
+        # Solo se envían los campos que cambiaron respecto a los que se mostraron
+        # (sin el valor original se dan por cambiados)
+        data = {}
+        for field, value in (("name", name), ("description", description), ("image_url", image_url)):
+            if request.form.get(f'original_{field}') != value:
+                data[field] = value
+        try:
+            price_changed = float(request.form.get('original_price')) != price
+        except (TypeError, ValueError):
+            price_changed = True
+        if price_changed:
+            data["price"] = price
+
+        # El stock se envía como diferencia respecto al que se mostró: así no se pierden
+        # las ventas ni las reposiciones que ocurrieron mientras el formulario estaba abierto
+        original_stock = request.form.get('original_stock', '')
+        if original_stock.lstrip('-').isdigit():
+            if stock != int(original_stock):
+                data["stock_delta"] = stock - int(original_stock)
+        else:
+            data["stock"] = stock
+
+        # Versión leída: la API responde 409 si otro administrador editó el producto
+        # entretanto. Un delta de stock solo no la necesita (se suma a lo que haya)
+        version = request.form.get('version')
+        headers = {'If-Match': f'"{version}"'} if version and set(data) - {"stock_delta"} else None
+
+        if not data:
+            flash('No hay cambios que guardar', 'info')
+            return redirect(url_for('admin_dashboard'))
         
-        print(f"DEBUG - Updating product {product_id} with data: {data}")
+        logger.debug("update_product_admin: actualizando producto", extra={"fields": {"product_id": product_id}})
         
-        status, response_data = api_request(f"/admin/products/{product_id}", method='PUT', data=data)
+        status, response_data = api_request(f"/admin/products/{product_id}", method='PUT', data=data, headers=headers)
        
         if status == 200:
             flash('Producto actualizado exitosamente', 'success')
+        elif status == 409:
+            flash('El producto fue modificado por otro administrador. Revisa los valores actuales y vuelve a guardar.', 'warning')
         else:
             error_msg = response_data.get('detail', 'Error al actualizar el producto')
             flash(f'Error: {error_msg}', 'danger')
    
     except Exception as e:
-        print(f"Error updating product: {e}")
+        logger.exception("update_product_admin: error al actualizar producto")
         flash(f'Error al actualizar el producto: {str(e)}', 'danger')
    
     return redirect(url_for('admin_dashboard'))
@@ -631,6 +965,105 @@ def remove_admin(user_id):
     return redirect(url_for('admin_dashboard'))
 
 
+# --- Operaciones masivas del panel (una sola llamada a la API por operación) ---
+def parse_bulk_rows(text):
+    """
+    Líneas "id,precio,stock" -> (items, líneas inválidas). Un campo vacío no se
+    cambia; un stock con signo (+5, -3) se envía como stock_delta.
+    """
+    items = []
+    bad_lines = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        parts = [part.strip() for part in line.split(',')]
+        if len(parts) > 3:
+            bad_lines.append(number)
+            continue
+        parts += [''] * (3 - len(parts))
+        try:
+            item = {"id": int(parts[0])}
+            if parts[1]:
+                item["price"] = float(parts[1])
+            if parts[2]:
+                key = "stock_delta" if parts[2][0] in '+-' else "stock"
+                item[key] = int(parts[2])
+        except ValueError:
+            bad_lines.append(number)
+            continue
+        items.append(item)
+    return items, bad_lines
+
+
+def flash_bulk_result(status, data, done_message):
+    """Resume el resultado por fila de una operación masiva en mensajes flash"""
+    if status != 200 or not isinstance(data, dict):
+        error_msg = data.get('detail', 'Error en la operación masiva') if isinstance(data, dict) else str(data)
+        flash(f'Error: {error_msg}', 'danger')
+        return
+    results = data.get('results', [])
+    failed = [r for r in results if r['status'] >= 400 and r['status'] != 424]
+    if data.get('committed') is False:
+        flash('No se aplicó ningún cambio porque algunas filas fallaron', 'warning')
+    else:
+        done = sum(1 for r in results if r['status'] < 400)
+        flash(f'{done} {done_message}', 'success' if done else 'warning')
+    if failed:
+        sample = ', '.join(f"#{r['id']}: {r.get('detail', r['status'])}" for r in failed[:10])
+        more = f' (y {len(failed) - 10} más)' if len(failed) > 10 else ''
+        flash(f'{len(failed)} con errores: {sample}{more}', 'danger')
+
+
+# Actualizar precio/stock de muchos productos
+@app.route('/admin/bulk-update-products', methods=['POST'])
+@admin_required
+def bulk_update_products():
+    items, bad_lines = parse_bulk_rows(request.form.get('rows', ''))
+    if bad_lines:
+        flash(f'Líneas con formato inválido: {", ".join(map(str, bad_lines))}', 'danger')
+        return redirect(url_for('admin_dashboard'))
+    if not items:
+        flash('No hay líneas para aplicar', 'warning')
+        return redirect(url_for('admin_dashboard'))
+
+    status, data = api_request("/admin/products/bulk", method='POST', data={
+        "items": items,
+        "atomic": bool(request.form.get('atomic'))
+    }, headers=idempotency_headers())
+    flash_bulk_result(status, data, 'productos actualizados')
+    return redirect(url_for('admin_dashboard'))
+
+
+# Eliminar los productos seleccionados
+@app.route('/admin/bulk-delete-products', methods=['POST'])
+@admin_required
+def bulk_delete_products():
+    ids = [int(value) for value in request.form.getlist('product_ids') if value.isdigit()]
+    if not ids:
+        flash('No hay productos seleccionados', 'warning')
+        return redirect(url_for('admin_dashboard'))
+
+    status, data = api_request("/admin/products/bulk-delete", method='POST', data={"ids": ids})
+    flash_bulk_result(status, data, 'productos eliminados')
+    return redirect(url_for('admin_dashboard'))
+
+
+# Dar o quitar privilegios de administrador a los usuarios seleccionados
+@app.route('/admin/bulk-admin', methods=['POST'])
+@admin_required
+def bulk_admin():
+    ids = [int(value) for value in request.form.getlist('user_ids') if value.isdigit()]
+    if not ids:
+        flash('No hay usuarios seleccionados', 'warning')
+        return redirect(url_for('admin_dashboard'))
+
+    make_admin = request.form.get('action') == 'make'
+    status, data = api_request("/admin/users/bulk-admin", method='POST', data={"ids": ids, "is_admin": make_admin})
+    flash_bulk_result(status, data, 'usuarios actualizados')
+    return redirect(url_for('admin_dashboard'))
+
+
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,140 @@
+"""
+Build de los archivos estáticos: agrupa, minifica y añade un hash de contenido
+al nombre de cada bundle, generando además variantes .gz precomprimidas.
+
+Escribe los bundles en static/dist/ junto con manifest.json, que la webapp
+usa (asset_url en app.py) para resolver las URLs en las plantillas y que nginx
+sirve directamente desde disco con caché inmutable.
+
+Uso: python build_assets.py [--static-dir static]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+# Bundle lógico -> archivos fuente (rutas relativas a static/)
+BUNDLES = {
+    'css/style.css': ['css/style.css'],
+    'js/main.js': ['js/main.js'],
+    'js/cart.js': ['js/cart.js'],
+    'js/live.js': ['js/live.js'],
+    'js/autocomplete.js': ['js/autocomplete.js'],
+}
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 10
+
+# Caracteres tras los que una "/" inicia una expresión regular y no una división
+_REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^')
+
+
+def minify_css(source):
+    """Elimina comentarios y espacios innecesarios del CSS"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    source = source.replace(';}', '}')
+    return source.strip()
+
+
+def minify_js(source):
+    """
+    Minificación conservadora de JavaScript: elimina comentarios y la
+    indentación respetando cadenas, plantillas y expresiones regulares.
+    Los saltos de línea se conservan para no depender de la inserción
+    automática de punto y coma.
+    """
+    out = []
+    i = 0
+    n = len(source)
+    last_significant = ''
+    while i < n:
+        ch = source[i]
+        nxt = source[i + 1] if i + 1 < n else ''
+
+        if ch in '"\'`':
+            j = i + 1
+            while j < n and source[j] != ch:
+                j += 2 if source[j] == '\\' else 1
+            out.append(source[i:j + 1])
+            last_significant = ch
+            i = j + 1
+        elif ch == '/' and nxt == '/':
+            while i < n and source[i] != '\n':
+                i += 1
+        elif ch == '/' and nxt == '*':
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+        elif ch == '/' and (last_significant in _REGEX_PREFIX or last_significant == ''):
+            j = i + 1
+            in_class = False
+            while j < n and (in_class or source[j] != '/'):
+                if source[j] == '\\':
+                    j += 1
+                elif source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                j += 1
+            out.append(source[i:j + 1])
+            last_significant = '/'
+            i = j + 1
+        else:
+            out.append(ch)
+            if not ch.isspace():
+                last_significant = ch
+            i += 1
+
+    lines = (line.strip() for line in ''.join(out).splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def build(static_dir):
+    """Genera los bundles en static/dist y devuelve el manifest"""
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+
+    manifest = {}
+    for bundle, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_dir, source), encoding='utf-8') as f:
+                parts.append(f.read())
+        joined = '\n'.join(parts)
+        minified = minify_css(joined) if bundle.endswith('.css') else minify_js(joined)
+        data = minified.encode('utf-8')
+
+        base, ext = os.path.splitext(bundle)
+        hashed_name = f"{DIST_DIR}/{base}.{content_hash(data)}{ext}"
+        target = os.path.join(static_dir, hashed_name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        # mtime=0 para que el .gz sea reproducible entre builds
+        with open(target + '.gz', 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+
+        manifest[bundle] = hashed_name
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build de archivos estáticos con hash de contenido')
+    parser.add_argument('--static-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+    for bundle, hashed in build(args.static_dir).items():
+        print(f"{bundle} -> {hashed}")
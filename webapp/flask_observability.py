@@ -0,0 +1,201 @@
+import logging
+import time
+import uuid
+from flask import Response, g, jsonify, request, session
+from observability import profiling
+from observability.logs import request_id_var, setup_logging
+from observability.tracing import current_span, setup_tracing, start_trace
+from utils import admin_required
+
+
+def init_logging(app):
+    """Registra los hooks de Flask que asignan el request id y registran el acceso"""
+    setup_logging("webapp")
+    access_logger = logging.getLogger("webapp.access")
+
+    @app.before_request
+    def _start_request_context():
+        g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        g.request_start = time.perf_counter()
+        g.request_id_token = request_id_var.set(g.request_id)
+
+    @app.after_request
+    def _log_request(response):
+        response.headers["X-Request-ID"] = g.request_id
+        access_logger.info("request", extra={"fields": {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - g.request_start) * 1000, 2),
+        }})
+        return response
+
+    @app.teardown_request
+    def _end_request_context(exc):
+        token = g.pop("request_id_token", None)
+        if token is not None:
+            request_id_var.reset(token)
+
+
+def init_tracing(app):
+    """Abre un span raíz por petición de Flask y lo cierra al terminar"""
+    setup_tracing("webapp")
+
+    @app.before_request
+    def _start_trace():
+        g.trace_span = start_trace(
+            f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+            traceparent=request.headers.get("traceparent"),
+            request_id=request.headers.get("X-Request-ID"),
+            attributes={"http.path": request.path},
+        )
+        g.trace_token = current_span.set(g.trace_span)
+
+    @app.after_request
+    def _record_status(response):
+        if "trace_span" in g:
+            g.trace_span.attributes["http.status_code"] = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_trace(exc):
+        root = g.pop("trace_span", None)
+        token = g.pop("trace_token", None)
+        if root is None:
+            return
+        if exc is not None:
+            root.attributes["error"] = str(exc)[:200]
+        root.finish()
+        if token is not None:
+            current_span.reset(token)
+
+
+def init_profiling(app):
+    """Rutas de perfilado bajo /admin/profiling y perfil por petición con la cabecera X-Profile"""
+    def attachment(filename):
+        return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    def int_arg(name, default, minimum=1, maximum=500):
+        try:
+            return max(minimum, min(maximum, int(request.args.get(name, default))))
+        except ValueError:
+            return default
+
+    def group_by_arg():
+        group_by = request.args.get("group_by", "lineno")
+        return group_by if group_by in ("lineno", "filename", "traceback") else "lineno"
+
+    @app.before_request
+    def _start_request_profile():
+        if request.headers.get(profiling.PROFILE_HEADER) != "1" or not session.get("is_admin", False):
+            return
+        g.request_profiler = profiling.request_profiles.start()
+        g.request_profile_busy = g.request_profiler is None
+
+    @app.after_request
+    def _finish_request_profile(response):
+        profiler = g.pop("request_profiler", None)
+        if profiler is not None:
+            profile_id = getattr(g, "request_id", None) or f"{time.time():.6f}"
+            profiling.request_profiles.finish(profiler, profile_id, f"{request.method} {request.path}")
+            response.headers["X-Profile-ID"] = profile_id
+        elif g.pop("request_profile_busy", False):
+            response.headers["X-Profile-Status"] = "busy"
+        return response
+
+    @app.teardown_request
+    def _discard_request_profile(exc):
+        # Si la petición falló antes de after_request, liberar el perfilador igualmente
+        profiler = g.pop("request_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            profiling.request_profiles.active.release()
+
+    # Perfil de CPU por muestreo de todos los hilos (formato plegado para flamegraph)
+    @app.route('/admin/profiling/cpu')
+    @admin_required
+    def profiling_cpu():
+        try:
+            seconds = max(0.1, min(profiling.PROFILE_MAX_SECONDS, float(request.args.get('seconds', 10))))
+            interval_ms = max(1.0, min(1000.0, float(request.args.get('interval_ms', 5))))
+        except ValueError:
+            return jsonify({"detail": "Parámetros inválidos"}), 400
+        try:
+            folded, samples = profiling.sample_cpu(seconds, interval_ms / 1000)
+        except profiling.ProfilerBusy as exc:
+            return jsonify({"detail": str(exc)}), 409
+        headers = attachment(f"webapp-cpu-{int(time.time())}.folded")
+        headers["X-Profile-Samples"] = str(samples)
+        return Response(folded, mimetype="text/plain", headers=headers)
+
+    # Estado de tracemalloc y snapshots disponibles
+    @app.route('/admin/profiling/memory')
+    @admin_required
+    def profiling_memory():
+        return jsonify(profiling.memory_summary())
+
+    # Tomar una snapshot de memoria (activa tracemalloc la primera vez)
+    @app.route('/admin/profiling/memory/snapshots', methods=['POST'])
+    @admin_required
+    def profiling_take_snapshot():
+        snapshot_id = profiling.snapshots.take()
+        snapshot = profiling.snapshots.get(snapshot_id)
+        return jsonify({"id": snapshot_id, "top": profiling.top_allocators(snapshot, int_arg('limit', 20))}), 201
+
+    # Principales asignaciones de una snapshot
+    @app.route('/admin/profiling/memory/snapshots/<int:snapshot_id>')
+    @admin_required
+    def profiling_get_snapshot(snapshot_id):
+        snapshot = profiling.snapshots.get(snapshot_id)
+        if snapshot is None:
+            return jsonify({"detail": "Snapshot no encontrada"}), 404
+        return jsonify({"id": snapshot_id, "top": profiling.top_allocators(snapshot, int_arg('limit', 20), group_by_arg())})
+
+    # Diferencia entre dos snapshots (qué creció entre base y target)
+    @app.route('/admin/profiling/memory/diff')
+    @admin_required
+    def profiling_diff_snapshots():
+        base = profiling.snapshots.get(request.args.get('base', type=int))
+        target = profiling.snapshots.get(request.args.get('target', type=int))
+        if base is None or target is None:
+            return jsonify({"detail": "Snapshot no encontrada"}), 404
+        return jsonify({
+            "base": request.args.get('base', type=int),
+            "target": request.args.get('target', type=int),
+            "diff": profiling.diff_snapshots(base, target, int_arg('limit', 20), group_by_arg()),
+        })
+
+    # Descartar snapshots y detener tracemalloc
+    @app.route('/admin/profiling/memory', methods=['DELETE'])
+    @admin_required
+    def profiling_stop_memory():
+        profiling.snapshots.clear()
+        return '', 204
+
+    # Perfiles de peticiones individuales (cabecera X-Profile: 1)
+    @app.route('/admin/profiling/requests')
+    @admin_required
+    def profiling_requests():
+        return jsonify(profiling.request_profiles.list())
+
+    # Resumen legible de un perfil de petición
+    @app.route('/admin/profiling/requests/<profile_id>')
+    @admin_required
+    def profiling_request_text(profile_id):
+        entry = profiling.request_profiles.get(profile_id)
+        if entry is None:
+            return jsonify({"detail": "Perfil no encontrado"}), 404
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ("cumulative", "tottime", "calls", "ncalls"):
+            sort = "cumulative"
+        return Response(profiling.pstats_text(entry, sort, int_arg('limit', 40)), mimetype="text/plain")
+
+    # Descarga del perfil en formato pstats (snakeviz, pstats, gprof2dot)
+    @app.route('/admin/profiling/requests/<profile_id>/pstats')
+    @admin_required
+    def profiling_request_pstats(profile_id):
+        entry = profiling.request_profiles.get(profile_id)
+        if entry is None:
+            return jsonify({"detail": "Perfil no encontrado"}), 404
+        return Response(profiling.pstats_bytes(entry), mimetype="application/octet-stream",
+                        headers=attachment(f"webapp-{profile_id}.pstats"))
@@ -0,0 +1,168 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+# Configuración del circuit breaker y de los reintentos (variables de entorno)
+BREAKER_WINDOW_SECONDS = float(os.getenv('BREAKER_WINDOW_SECONDS', '30'))
+BREAKER_MIN_REQUESTS = int(os.getenv('BREAKER_MIN_REQUESTS', '10'))
+BREAKER_FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', '0.5'))
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '15'))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv('BREAKER_HALF_OPEN_PROBES', '3'))
+
+RETRY_MAX_ATTEMPTS = int(os.getenv('API_RETRY_MAX_ATTEMPTS', '2'))
+RETRY_BASE_DELAY = float(os.getenv('API_RETRY_BASE_DELAY', '0.05'))
+RETRY_MAX_DELAY = float(os.getenv('API_RETRY_MAX_DELAY', '0.5'))
+# Fracción máxima de peticiones que pueden ser reintentos dentro de la ventana
+RETRY_BUDGET_RATIO = float(os.getenv('API_RETRY_BUDGET_RATIO', '0.1'))
+RETRY_BUDGET_MIN = int(os.getenv('API_RETRY_BUDGET_MIN', '5'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Valor numérico de cada estado para las métricas
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por tasa de fallos en una ventana deslizante.
+    - closed: deja pasar todo y registra resultados
+    - open: rechaza sin llamar a la API hasta que pase BREAKER_OPEN_SECONDS
+    - half_open: deja pasar unas pocas sondas; si todas van bien se cierra
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.outcomes = deque()  # (timestamp, ok)
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.counters = {'success': 0, 'failure': 0, 'rejected': 0, 'opened': 0}
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Indica si se puede hacer la llamada ahora mismo"""
+        with self.lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now - self.opened_at < BREAKER_OPEN_SECONDS:
+                    self.counters['rejected'] += 1
+                    return False
+                self.state = HALF_OPEN
+                self.probes_in_flight = 0
+                self.probe_successes = 0
+            if self.state == HALF_OPEN:
+                if self.probes_in_flight >= BREAKER_HALF_OPEN_PROBES:
+                    self.counters['rejected'] += 1
+                    return False
+                self.probes_in_flight += 1
+            return True
+
+    def record(self, ok):
+        """Registra el resultado de una llamada permitida"""
+        with self.lock:
+            now = time.monotonic()
+            self.counters['success' if ok else 'failure'] += 1
+
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                if not ok:
+                    self._open(now)
+                    return
+                self.probe_successes += 1
+                if self.probe_successes >= BREAKER_HALF_OPEN_PROBES:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                return
+
+            self.outcomes.append((now, ok))
+            while self.outcomes and now - self.outcomes[0][0] > BREAKER_WINDOW_SECONDS:
+                self.outcomes.popleft()
+
+            total = len(self.outcomes)
+            if total >= BREAKER_MIN_REQUESTS:
+                failures = sum(1 for _, success in self.outcomes if not success)
+                if failures / total >= BREAKER_FAILURE_RATE:
+                    self._open(now)
+
+    def _open(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        self.outcomes.clear()
+        self.counters['opened'] += 1
+
+
+class RetryBudget:
+    """Limita los reintentos a una fracción de las peticiones recientes para no amplificar una caída"""
+
+    def __init__(self):
+        self.requests = deque()
+        self.retries = deque()
+        self.lock = threading.Lock()
+
+    def _trim(self, now):
+        for events in (self.requests, self.retries):
+            while events and now - events[0] > BREAKER_WINDOW_SECONDS:
+                events.popleft()
+
+    def record_request(self):
+        with self.lock:
+            now = time.monotonic()
+            self.requests.append(now)
+            self._trim(now)
+
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self._trim(now)
+            allowed = RETRY_BUDGET_MIN + RETRY_BUDGET_RATIO * len(self.requests)
+            if len(self.retries) >= allowed:
+                return False
+            self.retries.append(now)
+            return True
+
+
+def backoff_delay(attempt):
+    """Backoff exponencial con jitter completo"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+# Un breaker por grupo de endpoints de la API
+ENDPOINT_GROUPS = ('products', 'carts', 'users', 'admin')
+breakers = {group: CircuitBreaker(group) for group in ENDPOINT_GROUPS + ('other',)}
+retry_budget = RetryBudget()
+retry_counters = {'attempted': 0, 'budget_exhausted': 0}
+
+
+def breaker_for(endpoint):
+    """Devuelve el breaker del grupo al que pertenece el endpoint ("carts/items/3" -> carts)"""
+    group = endpoint.lstrip('/').split('/', 1)[0]
+    return breakers.get(group, breakers['other'])
+
+
+def render_metrics():
+    """Estado de los breakers y reintentos en formato de texto de Prometheus"""
+    lines = [
+        '# HELP webapp_api_breaker_state Estado del circuit breaker (0=closed, 1=half_open, 2=open)',
+        '# TYPE webapp_api_breaker_state gauge',
+    ]
+    for name, breaker in breakers.items():
+        lines.append(f'webapp_api_breaker_state{{group="{name}"}} {STATE_VALUES[breaker.state]}')
+    lines += [
+        '# HELP webapp_api_calls_total Llamadas a la API por grupo y resultado',
+        '# TYPE webapp_api_calls_total counter',
+    ]
+    for name, breaker in breakers.items():
+        for outcome, value in breaker.counters.items():
+            lines.append(f'webapp_api_calls_total{{group="{name}",outcome="{outcome}"}} {value}')
+    lines += [
+        '# HELP webapp_api_retries_total Reintentos de peticiones GET',
+        '# TYPE webapp_api_retries_total counter',
+    ]
+    for outcome, value in retry_counters.items():
+        lines.append(f'webapp_api_retries_total{{outcome="{outcome}"}} {value}')
+    return '\n'.join(lines) + '\n'
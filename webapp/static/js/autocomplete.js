@@ -0,0 +1,110 @@
+// Sugerencias del buscador de la barra de navegación (GET /products/autocomplete de la API)
+//
+// El formulario lleva data-autocomplete y data-autocomplete-url; cada tecla pide las
+// sugerencias con un pequeño retardo, cancelando la petición anterior si sigue en
+// curso. Las respuestas se guardan por texto buscado para no repetirlas al borrar.
+// Elegir una sugerencia lleva a su tarjeta en /products; Enter sin elegir envía
+// el formulario y la página filtra el catálogo.
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.querySelector('[data-autocomplete]');
+    if (!form || !window.fetch) {
+        return;
+    }
+
+    const url = form.getAttribute('data-autocomplete-url');
+    const input = form.querySelector('input[name="q"]');
+    const menu = form.querySelector('[data-autocomplete-menu]');
+    const productsPath = form.getAttribute('action');
+    const cache = new Map();
+    let timer = null;
+    let controller = null;
+    let active = -1;
+
+    function items() {
+        return menu.querySelectorAll('.dropdown-item');
+    }
+
+    function hide() {
+        menu.classList.remove('show');
+        active = -1;
+    }
+
+    function render(results) {
+        menu.innerHTML = '';
+        active = -1;
+        results.forEach(function(result) {
+            const link = document.createElement('a');
+            link.className = 'dropdown-item';
+            link.href = productsPath + '#product-' + result.id;
+            link.textContent = result.name;
+            menu.appendChild(link);
+        });
+        menu.classList.toggle('show', results.length > 0);
+    }
+
+    function highlight(position) {
+        const links = items();
+        if (!links.length) {
+            return;
+        }
+        active = (position + links.length) % links.length;
+        links.forEach(function(link, i) {
+            link.classList.toggle('active', i === active);
+        });
+    }
+
+    function suggest() {
+        const query = input.value.trim();
+        if (!query) {
+            hide();
+            return;
+        }
+        if (cache.has(query)) {
+            render(cache.get(query));
+            return;
+        }
+        if (controller) {
+            controller.abort();
+        }
+        controller = window.AbortController ? new AbortController() : null;
+        fetch(url + '?q=' + encodeURIComponent(query), controller ? { signal: controller.signal } : {})
+            .then(function(response) {
+                return response.ok ? response.json() : { results: [] };
+            })
+            .then(function(data) {
+                cache.set(query, data.results);
+                // Solo se pinta si el texto no cambió mientras llegaba la respuesta
+                if (input.value.trim() === query) {
+                    render(data.results);
+                }
+            })
+            .catch(function() {
+                // Cancelada por una tecla posterior o API no disponible: el buscador sigue funcionando
+            });
+    }
+
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(suggest, 150);
+    });
+
+    input.addEventListener('keydown', function(event) {
+        if (event.key === 'ArrowDown') {
+            event.preventDefault();
+            highlight(active + 1);
+        } else if (event.key === 'ArrowUp') {
+            event.preventDefault();
+            highlight(active - 1);
+        } else if (event.key === 'Escape') {
+            hide();
+        } else if (event.key === 'Enter' && active >= 0) {
+            event.preventDefault();
+            window.location.href = items()[active].href;
+        }
+    });
+
+    input.addEventListener('blur', function() {
+        // Retardo para que el clic en una sugerencia llegue antes de ocultar el menú
+        setTimeout(hide, 150);
+    });
+});
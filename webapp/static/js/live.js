@@ -0,0 +1,84 @@
+// Actualización en tiempo real de precio y stock (Server-Sent Events de la API)
+//
+// La página marca el contenedor con data-live-products y cada producto con
+// data-product-id; dentro, los elementos data-field="price|stock|stock-badge|stock-max"
+// se actualizan sin recargar. EventSource reconecta solo y reenvía Last-Event-ID,
+// así que los cambios ocurridos durante un corte se reciben al volver.
+document.addEventListener('DOMContentLoaded', function() {
+    const container = document.querySelector('[data-live-products]');
+    if (!container || !window.EventSource) {
+        return;
+    }
+
+    const eventsUrl = container.getAttribute('data-events-url');
+    const notice = document.querySelector('[data-live-notice]');
+    const source = new EventSource(eventsUrl);
+
+    function formatPrice(value) {
+        const number = Number(value);
+        return isNaN(number) ? value : number.toFixed(2);
+    }
+
+    function showNotice() {
+        if (notice) {
+            notice.classList.remove('d-none');
+        }
+    }
+
+    function updateProduct(product) {
+        const elements = container.querySelectorAll('[data-product-id="' + product.id + '"]');
+        elements.forEach(function(element) {
+            element.querySelectorAll('[data-field="price"]').forEach(function(field) {
+                field.textContent = formatPrice(product.price);
+            });
+            element.querySelectorAll('[data-field="stock"]').forEach(function(field) {
+                field.textContent = product.stock;
+            });
+            element.querySelectorAll('[data-field="stock-badge"]').forEach(function(badge) {
+                badge.classList.toggle('bg-success', product.stock > 10);
+                badge.classList.toggle('bg-warning', product.stock <= 10);
+            });
+            element.querySelectorAll('[data-field="stock-max"]').forEach(function(input) {
+                input.max = Math.max(product.stock, 1);
+            });
+            element.querySelectorAll('[data-field="name"]').forEach(function(field) {
+                field.textContent = product.name;
+            });
+            // Botones de edición del panel: el modal se rellena desde estos atributos
+            element.querySelectorAll('[data-price]').forEach(function(button) {
+                button.setAttribute('data-price', product.price);
+                button.setAttribute('data-stock', product.stock);
+                button.setAttribute('data-version', product.version);
+            });
+            element.querySelectorAll('[data-name]').forEach(function(button) {
+                button.setAttribute('data-name', product.name);
+            });
+            element.classList.add('live-updated');
+            setTimeout(function() { element.classList.remove('live-updated'); }, 1500);
+        });
+    }
+
+    function removeProduct(product) {
+        container.querySelectorAll('[data-product-id="' + product.id + '"]').forEach(function(element) {
+            element.remove();
+        });
+    }
+
+    source.addEventListener('product.updated', function(event) {
+        updateProduct(JSON.parse(event.data));
+    });
+
+    source.addEventListener('product.deleted', function(event) {
+        removeProduct(JSON.parse(event.data));
+    });
+
+    // Un producto nuevo necesita el HTML completo de la fila: se avisa para recargar
+    source.addEventListener('product.created', showNotice);
+
+    // La API perdió el hilo de los cambios (réplica distinta, corte largo o cambio masivo)
+    source.addEventListener('reset', showNotice);
+
+    window.addEventListener('beforeunload', function() {
+        source.close();
+    });
+});